@@ -0,0 +1,89 @@
+"""Synthetic but realistic Assist traces shared by the benchmarks."""
+
+from __future__ import annotations
+
+import random
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterator
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+MODELS = ["llama3-8b", "qwen2-7b", "mistral-7b", "phi3-mini"]
+RESULTS = ["success", "success", "success", "partial", "fail", "unknown"]
+ROOMS = ["kitchen", "living room", "bedroom", "office", "garage", "hallway"]
+DOMAINS = ["light", "switch", "cover", "climate", "media_player"]
+PROMPT_HEADER = (
+    "You are a voice assistant for Home Assistant. Answer questions about the "
+    "world truthfully and control the devices listed below. Current time: {ts}.\n"
+)
+
+
+def make_trace(i: int, rng: random.Random, start: datetime) -> Dict[str, Any]:
+    """Return a trace shaped like ``AssistTrace.model_dump(mode="json")``."""
+    ts = start + timedelta(seconds=i * 7)
+    room = rng.choice(ROOMS)
+    domain = rng.choice(DOMAINS)
+    entity_id = f"{domain}.{room.replace(' ', '_')}_{i % 7}"
+    devices = "\n".join(
+        f"{d}.{r.replace(' ', '_')}_{n} '{r.title()} {d} {n}' = on"
+        for d in DOMAINS
+        for r in ROOMS
+        for n in range(3)
+    )
+    return {
+        "trace_id": f"{i:032x}",
+        "ts": ts.isoformat(),
+        "user_id": f"user-{i % 4}",
+        "session_id": f"session-{i // 5}",
+        "user_text": f"turn {'on' if i % 2 else 'off'} the {room} {domain}",
+        "audio_sha256": None,
+        "context": {
+            "area": room,
+            "entity_count": 90,
+            "language": "en",
+            "device_id": f"satellite-{i % 3}",
+        },
+        "entities": {entity_id: {"state": "on", "friendly_name": room.title()}},
+        "prompt_template_id": "default",
+        "prompt_rendered": PROMPT_HEADER.format(ts=ts.isoformat()) + devices,
+        "truncation": {
+            "was_truncated": False,
+            "prompt_tokens_before": 0,
+            "prompt_tokens_after": 0,
+        },
+        "model": rng.choice(MODELS),
+        "params": {"temperature": 0.1, "top_p": 0.95, "max_tokens": 256},
+        "response_text": f"Turned {'on' if i % 2 else 'off'} the {room} {domain}.",
+        "tool_calls": [
+            {
+                "name": "HassTurnOn" if i % 2 else "HassTurnOff",
+                "arguments": {"name": room, "domain": domain},
+                "response": {"success": True},
+                "success": True,
+                "error": None,
+            }
+        ],
+        "parsed_action": {
+            "service": f"{domain}.turn_{'on' if i % 2 else 'off'}",
+            "target": {"entity_id": [entity_id]},
+            "data": {},
+        },
+        "latency_ms": int(rng.lognormvariate(6.5, 0.5)),
+        "input_tokens": 1800 + rng.randint(0, 200),
+        "output_tokens": rng.randint(10, 60),
+        "result": rng.choice(RESULTS),
+        "ha_events": [],
+        "user_feedback": None,
+        "repair_text": None,
+        "gold_action": None,
+    }
+
+
+def make_traces(count: int, seed: int = 0) -> Iterator[Dict[str, Any]]:
+    """Yield ``count`` deterministic traces."""
+    rng = random.Random(seed)
+    start = datetime(2024, 6, 1)
+    for i in range(count):
+        yield make_trace(i, rng, start)
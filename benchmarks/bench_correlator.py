@@ -0,0 +1,82 @@
+"""Drive a state_changed storm through the correlator with many pending traces.
+
+Run with ``python benchmarks/bench_correlator.py [pending] [events]``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import sys
+import tempfile
+import time
+
+from _traces import make_traces
+
+from homeassistant.core import HomeAssistant
+
+from custom_components.assist_traces.const import DATA_TRACES
+from custom_components.assist_traces.correlator import Correlator
+from custom_components.assist_traces.helpers import target_entity_ids
+from custom_components.assist_traces.store import TraceStore
+
+
+def _linear_scan(pending, entity_id):
+    """Return the traces a state change matches by scanning every pending trace."""
+    return [
+        trace_id for trace_id, info in pending.items() if entity_id in info["entities"]
+    ]
+
+
+async def main(pending: int = 5000, events: int = 100_000) -> None:
+    """Run the benchmark and print per-event cost for each strategy."""
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass = HomeAssistant(config_dir)
+        store = hass.data[DATA_TRACES] = TraceStore(max_traces=pending)
+        correlator = Correlator(hass, window=3600)
+        targets = {}
+        actions = {}
+        for trace in make_traces(pending):
+            store[trace["trace_id"]] = trace
+            targets[trace["trace_id"]] = target_entity_ids(trace["parsed_action"])
+            actions[trace["trace_id"]] = trace["parsed_action"]
+
+        start = time.perf_counter()
+        for trace_id, entity_ids in targets.items():
+            await correlator.add_trace(trace_id, entity_ids, action=actions[trace_id])
+        add_us = (time.perf_counter() - start) * 1e6 / pending
+        print(f"{'add_trace':>14}: {add_us:8.2f} us/trace")
+
+        noise = [f"sensor.power_{i % 500}" for i in range(events)]
+        start = time.perf_counter()
+        for entity_id in noise[: events // 100]:
+            _linear_scan(correlator.pending, entity_id)
+        scan_us = (time.perf_counter() - start) * 1e6 / (events // 100)
+        print(f"{'linear scan':>14}: {scan_us:8.2f} us/event")
+
+        start = time.perf_counter()
+        for i, entity_id in enumerate(noise):
+            hass.states.async_set(entity_id, str(i))
+        await hass.async_block_till_done()
+        storm_us = (time.perf_counter() - start) * 1e6 / events
+        print(f"{'state storm':>14}: {storm_us:8.2f} us/event (set + dispatch)")
+
+        # Turning each target on and then off satisfies every trace.
+        entity_ids = {e for ids in targets.values() for e in ids}
+        start = time.perf_counter()
+        for state in ("on", "off"):
+            for entity_id in entity_ids:
+                hass.states.async_set(entity_id, state)
+            await hass.async_block_till_done()
+        elapsed = (time.perf_counter() - start) * 1000
+        changes = 2 * len(entity_ids)
+        print(
+            f"{'resolve all':>14}: {elapsed:8.2f} ms for {changes} changes, "
+            f"{len(correlator.pending)} traces left pending"
+        )
+        correlator.stop()
+        await hass.async_stop(force=True)
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:3]]
+    asyncio.run(main(*args))
@@ -0,0 +1,95 @@
+"""Export a large on-disk history and watch resident memory while it streams.
+
+Run with ``python benchmarks/bench_export.py [count]``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from _traces import make_traces
+
+from custom_components.assist_traces.cold import ColdIndex
+from custom_components.assist_traces.const import COLD_INDEX_NAME
+from custom_components.assist_traces.export import (
+    ExportProgress,
+    history_traces,
+    write_export,
+)
+from custom_components.assist_traces.reader import TraceReader
+from custom_components.assist_traces.writer import TraceWriter, WriterConfig
+
+PAGE = os.sysconf("SC_PAGE_SIZE")
+
+
+def _rss_mb() -> float:
+    """Return the resident set size of this process in MB."""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * PAGE / 1e6
+
+
+async def _write_history(directory: str, cold: ColdIndex, count: int) -> None:
+    """Write count traces to partitions the way the integration does."""
+    writer = TraceWriter(
+        WriterConfig(directory=directory, batch_size=1024), cold_index=cold
+    )
+    await writer.start()
+    for trace in make_traces(count):
+        await writer.enqueue(trace)
+    await writer.flush()
+    await writer.stop()
+
+
+def main(count: int = 1_000_000) -> None:
+    """Write the history, export it and print RSS at each tenth of the rows."""
+    with tempfile.TemporaryDirectory() as directory:
+        cold = ColdIndex(Path(directory) / COLD_INDEX_NAME)
+        cold.open()
+        start = time.perf_counter()
+        asyncio.run(_write_history(directory, cold, count))
+        print(f"   write: {time.perf_counter() - start:8.1f} s for {count} traces")
+
+        progress = ExportProgress("bench", "sft", "")
+        samples = []
+        done = threading.Event()
+
+        def sample() -> None:
+            """Record RSS whenever another tenth of the rows was written."""
+            step = max(count // 10, 1)
+            while not done.wait(0.05):
+                if progress.rows >= step * (len(samples) + 1):
+                    samples.append((progress.rows, _rss_mb()))
+
+        sampler = threading.Thread(target=sample)
+        baseline = _rss_mb()
+        sampler.start()
+        start = time.perf_counter()
+        reader = TraceReader(directory)
+        write_export(
+            Path(directory) / "sft.jsonl.gz",
+            "sft",
+            history_traces(reader, cold, set(), progress),
+            {},
+            None,
+            progress,
+        )
+        elapsed = time.perf_counter() - start
+        done.set()
+        sampler.join()
+        cold.close()
+    print(
+        f"  export: {elapsed:8.1f} s, {progress.rows / elapsed:,.0f} rows/s, "
+        f"RSS before {baseline:.0f} MB"
+    )
+    for rows, rss in samples:
+        print(f"    {rows:>9} rows: RSS {rss:6.0f} MB")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
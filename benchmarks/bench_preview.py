@@ -0,0 +1,76 @@
+"""Measure preview_recent latency and response size for dashboard queries.
+
+Run with ``python benchmarks/bench_preview.py [count]``.
+"""
+
+from __future__ import annotations
+
+import sys
+import time
+
+from _traces import make_traces
+
+from custom_components.assist_traces.serialize import dumps
+from custom_components.assist_traces.store import TraceStore
+from custom_components.assist_traces.websocket import preview_page
+
+COLUMNS = ["ts", "model", "result", "user_text", "latency_ms"]
+QUERIES = {
+    "full page": {"limit": 25},
+    "projected page": {"limit": 25, "fields": COLUMNS},
+    "filtered": {"limit": 25, "fields": COLUMNS, "model": "qwen2-7b", "result": "fail"},
+    "text search": {"limit": 25, "fields": COLUMNS, "text": "garage light"},
+    "time range": {
+        "limit": 25,
+        "fields": COLUMNS,
+        "start": "2024-06-01T02:00:00",
+        "end": "2024-06-01T03:00:00",
+    },
+}
+
+
+def _timed(func, rounds: int):
+    """Return (result, mean milliseconds) of calling func repeatedly."""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        result = func()
+    return result, (time.perf_counter() - start) * 1000 / rounds
+
+
+def main(count: int = 5000, rounds: int = 50) -> None:
+    """Run the benchmark and print latency and payload size per query."""
+    store = TraceStore(max_traces=count, max_bytes=1 << 40)
+    for trace in make_traces(count):
+        store[trace["trace_id"]] = trace
+
+    def previous():
+        """Materialize every trace and return the newest 25 in full."""
+        traces = sorted(
+            (record.to_dict() for record in list(store.values())),
+            key=lambda tr: tr["ts"],
+        )
+        return dumps(traces[-25:])
+
+    payload, ms = _timed(previous, 5)
+    print(f"{'materialize all':>16}: {ms:8.2f} ms {len(payload) / 1024:8.1f} KB")
+    for name, msg in QUERIES.items():
+        page, ms = _timed(lambda: dumps(preview_page(store, msg)), rounds)
+        print(f"{name:>16}: {ms:8.2f} ms {len(page) / 1024:8.1f} KB")
+
+    cursor, pages = None, 0
+    start = time.perf_counter()
+    while True:
+        msg = {"limit": 100, "fields": COLUMNS}
+        if cursor is not None:
+            msg["before"] = cursor
+        page = preview_page(store, msg)
+        pages += 1
+        if not page["more"]:
+            break
+        cursor = page["before"]
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"{'walk all pages':>16}: {elapsed:8.2f} ms for {pages} pages of 100")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
@@ -0,0 +1,49 @@
+"""Compare the per-trace memory footprint of trace dicts and TraceRecords.
+
+Run with ``python benchmarks/bench_record_memory.py [count]``.
+"""
+
+from __future__ import annotations
+
+import gc
+import sys
+import time
+import tracemalloc
+
+from _traces import make_traces
+
+from custom_components.assist_traces.record import TraceRecord
+from custom_components.assist_traces.serialize import dumps, loads
+
+
+def _measure(build):
+    """Return (bytes allocated, seconds) for building and holding a collection."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    held = build()
+    elapsed = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del held
+    return size, elapsed
+
+
+def main(count: int = 5000) -> None:
+    """Run the benchmark and print bytes per trace for each representation."""
+    # Round-trip through JSON so every trace owns its strings, as it does
+    # after AssistTrace.model_dump or pipeline capture.
+    encoded = [dumps(trace) for trace in make_traces(count)]
+    for name, build in (
+        ("dict", lambda: [loads(raw) for raw in encoded]),
+        ("record", lambda: [TraceRecord.from_dict(loads(raw)) for raw in encoded]),
+    ):
+        size, elapsed = _measure(build)
+        print(
+            f"{name:>8}: {size / count:8.0f} B/trace "
+            f"{size / 1e6:8.1f} MB total {count / elapsed:10.0f} traces/s built"
+        )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
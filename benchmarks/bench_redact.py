@@ -0,0 +1,94 @@
+"""Compare per-pattern redaction passes with the hinted and cached redactor.
+
+Run with ``python benchmarks/bench_redact.py [count]``.
+"""
+
+from __future__ import annotations
+
+import re
+import sys
+import time
+
+from _traces import make_traces
+
+from custom_components.assist_traces.redact import (
+    BASIC_PATTERNS,
+    KEEP_KEYS,
+    STRICT_KEYS,
+    RedactionCache,
+    Redactor,
+)
+
+NAMES = ["Teagan", "Kitchen", "Living Room", "satellite-1", "Alex", "Sam"]
+PII = (
+    " Reach me at alex@example.com or +1 555-123-4567, the hub is 10.0.0.12 "
+    "(00:11:22:33:44:55) on ssid-Home, see https://example.com/x, 42 Main Street."
+    " Room 12 at 192.168.1.20, see 3 https://foo.com/u?q=1, 10 john.doe@gmail.com."
+)
+
+
+def _legacy_string(text, patterns):
+    """Apply each pattern as its own pass, as redaction used to."""
+    for token, pattern in patterns.items():
+        text = pattern.sub(token, text)
+    return text
+
+
+def _legacy(data, patterns, names):
+    """Rebuild every container and re-lower strings per known name."""
+    if isinstance(data, str):
+        red = _legacy_string(data, patterns)
+        for idx, name in enumerate(names):
+            if name and name.lower() in red.lower():
+                red = re.sub(re.escape(name), f"<NAME_{idx}>", red, flags=re.IGNORECASE)
+        return red
+    if isinstance(data, list):
+        return [_legacy(v, patterns, names) for v in data]
+    if isinstance(data, dict):
+        new = {}
+        for k, v in data.items():
+            if k in KEEP_KEYS:
+                new[_legacy_string(k, patterns)] = v
+                continue
+            names_for_field = names
+            if k in STRICT_KEYS and isinstance(v, str):
+                names_for_field = list(names) + [v]
+            new[_legacy_string(k, patterns)] = _legacy(v, patterns, names_for_field)
+        return new
+    return data
+
+
+def main(count: int = 2000) -> None:
+    """Run the benchmark and print traces per second for each level."""
+    traces = list(make_traces(count))
+    for trace in traces[::4]:
+        trace["user_text"] += PII
+        trace["response_text"] += PII
+    for level, names in (("basic", []), ("strict", NAMES)):
+        patterns = BASIC_PATTERNS
+        start = time.perf_counter()
+        expected = [_legacy(trace, patterns, names) for trace in traces]
+        legacy = time.perf_counter() - start
+
+        redactor = Redactor(level, tuple(names), cache=None)
+        start = time.perf_counter()
+        actual = [redactor(trace) for trace in traces]
+        hinted = time.perf_counter() - start
+        assert actual == expected
+
+        cache = RedactionCache()
+        redactor = Redactor(level, tuple(names), cache=cache)
+        start = time.perf_counter()
+        actual = [redactor(trace) for trace in traces]
+        cached = time.perf_counter() - start
+        assert actual == expected
+        print(
+            f"{level:>7}: per-pattern {count / legacy:6.0f}/s, "
+            f"hinted {count / hinted:6.0f}/s ({legacy / hinted:.1f}x), "
+            f"cached {count / cached:6.0f}/s ({legacy / cached:.1f}x, "
+            f"hit rate {cache.diagnostics()['hit_rate']:.0%})"
+        )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,36 @@
+"""Compare stdlib json against the integration serializer on realistic traces.
+
+Run with ``python benchmarks/bench_serialize.py [count]``.
+"""
+
+from __future__ import annotations
+
+import json
+import sys
+import time
+
+from _traces import make_traces
+
+from custom_components.assist_traces.serialize import BACKEND, dumps_line
+
+
+def _stdlib_line(trace):
+    """Encode a trace the way the writer did before the serializer existed."""
+    return json.dumps(trace, ensure_ascii=False).encode("utf-8") + b"\n"
+
+
+def main(count: int = 20000) -> None:
+    """Run the benchmark and print traces/s and MB/s per encoder."""
+    traces = list(make_traces(count))
+    for name, encode in (("json", _stdlib_line), (BACKEND, dumps_line)):
+        start = time.perf_counter()
+        size = sum(len(encode(trace)) for trace in traces)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{name:>8}: {count / elapsed:10.0f} traces/s "
+            f"{size / elapsed / 1e6:8.1f} MB/s ({size / count:.0f} B/trace)"
+        )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
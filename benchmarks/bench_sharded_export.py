@@ -0,0 +1,117 @@
+"""Time a single-file SFT export against sharded exports in worker processes.
+
+Run with ``python benchmarks/bench_sharded_export.py [count]``. Sharded runs
+use the same tasks, pool and index as ``ExportManager`` with one worker
+process per shard, capped at the CPU count.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from _traces import make_traces
+
+from custom_components.assist_traces.cold import ColdIndex
+from custom_components.assist_traces.const import COLD_INDEX_NAME
+from custom_components.assist_traces.export import (
+    ExportProgress,
+    ShardTask,
+    _init_shard_worker,
+    assign_partitions,
+    export_shard,
+    finish_shards,
+    history_traces,
+    write_export,
+)
+from custom_components.assist_traces.reader import TraceReader
+from custom_components.assist_traces.writer import TraceWriter, WriterConfig
+
+
+async def _write_history(directory: str, cold: ColdIndex, count: int) -> None:
+    """Write count traces to partitions the way the integration does."""
+    writer = TraceWriter(
+        WriterConfig(directory=directory, batch_size=1024), cold_index=cold
+    )
+    await writer.start()
+    for trace in make_traces(count):
+        await writer.enqueue(trace)
+    await writer.flush()
+    await writer.stop()
+
+
+def _sharded(reader: TraceReader, cold: ColdIndex, out: Path, shards: int) -> int:
+    """Export to shards with a 5% validation split and return the row count."""
+    ctx = multiprocessing.get_context("spawn")
+    cancel = ctx.Event()
+    groups = assign_partitions(list(reader.partitions()), shards)
+    tasks = [
+        ShardTask(
+            kind="sft",
+            index=index,
+            shards=shards,
+            output_dir=str(out),
+            sink=str(reader.directory),
+            partitioning=reader.partitioning,
+            partitions=[p.relative_to(reader.directory).as_posix() for p in group],
+            cold_path=str(cold.path),
+            skip=set(),
+            store=[],
+            level="basic",
+            dedup_distance=None,
+            validation=0.05,
+        )
+        for index, group in enumerate(groups)
+    ]
+    with ProcessPoolExecutor(
+        min(shards, os.cpu_count() or 1),
+        mp_context=ctx,
+        initializer=_init_shard_worker,
+        initargs=(cancel,),
+    ) as pool:
+        results = list(pool.map(export_shard, tasks))
+    finish_shards(out, {"kind": "sft", "shards": shards}, results)
+    return sum(result["rows"] for result in results)
+
+
+def main(count: int = 200_000) -> None:
+    """Write the history, then export it as one file and as 1-8 shards."""
+    with tempfile.TemporaryDirectory() as directory:
+        cold = ColdIndex(Path(directory) / COLD_INDEX_NAME)
+        cold.open()
+        asyncio.run(_write_history(directory, cold, count))
+        reader = TraceReader(directory)
+        partitions = len(list(reader.partitions()))
+        print(f"{count} traces in {partitions} partitions, {os.cpu_count()} CPUs")
+
+        progress = ExportProgress("bench", "sft", "")
+        start = time.perf_counter()
+        write_export(
+            Path(directory) / "sft.jsonl.gz",
+            "sft",
+            history_traces(reader, cold, set(), progress),
+            cold.feedback(),
+            None,
+            progress,
+        )
+        single = time.perf_counter() - start
+        print(f"  single file: {single:6.1f} s, {progress.rows / single:9,.0f} rows/s")
+        for shards in (1, 2, 4, 8):
+            start = time.perf_counter()
+            rows = _sharded(reader, cold, Path(directory) / f"sft-{shards}", shards)
+            elapsed = time.perf_counter() - start
+            print(
+                f"  {shards} shards:    {elapsed:6.1f} s, {rows / elapsed:9,.0f} "
+                f"rows/s, {single / elapsed:4.1f}x"
+            )
+        cold.close()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
@@ -0,0 +1,115 @@
+"""Measure SimHash dedup throughput and recall on a synthetic paraphrase corpus.
+
+Run with ``python benchmarks/bench_simhash.py [bases] [variants]``.
+"""
+
+from __future__ import annotations
+
+import random
+import sys
+import time
+
+from _traces import ROOMS
+
+from custom_components.assist_traces.simhash import NearDuplicateFilter
+
+DEVICES = ["light", "lamp", "fan", "heater", "speaker", "blinds", "tv"]
+TEMPLATES = [
+    "turn on the {area} {device}",
+    "turn off the {area} {device}",
+    "set the {area} {device} to {n} percent",
+    "is the {area} {device} on",
+    "dim the {area} {device} to {n} percent",
+    "set the {area} thermostat to {n} degrees",
+    "what is the temperature in the {area}",
+    "open the {area} {device} halfway and then close it in {n} minutes",
+]
+PREFIXES = [
+    "please ",
+    "hey assistant, ",
+    "can you ",
+    "could you please ",
+    "go ahead and ",
+]
+SUFFIXES = [" please", " now", " for me", " thanks", "?", "!"]
+
+
+def _paraphrase(text: str, rng: random.Random) -> str:
+    """Return a variant of a command a user might phrase differently."""
+    for _ in range(rng.randint(1, 2)):
+        kind = rng.randrange(5)
+        if kind == 0:
+            text = rng.choice(PREFIXES) + text
+        elif kind == 1:
+            text = text + rng.choice(SUFFIXES)
+        elif kind == 2:
+            text = text.replace("the ", "", 1)
+        elif kind == 3:
+            text = text.upper() if rng.random() < 0.5 else text.capitalize() + "."
+        else:
+            text = text.replace(" ", "  ", 1).replace("turn", "switch", 1)
+    return text
+
+
+def corpus(bases: int, variants: int, seed: int = 0):
+    """Return shuffled rows tagged with the base command they paraphrase."""
+    rng = random.Random(seed)
+    texts = set()
+    for _ in range(bases * 100):
+        if len(texts) == bases:
+            break
+        template = rng.choice(TEMPLATES)
+        texts.add(
+            template.format(
+                area=rng.choice(ROOMS), device=rng.choice(DEVICES), n=rng.randint(1, 99)
+            )
+        )
+    if len(texts) < bases:
+        raise ValueError(f"the templates yield fewer than {bases} commands")
+    rows = []
+    for base, text in enumerate(sorted(texts)):
+        for v in range(variants):
+            rows.append(
+                {
+                    "instruction": text if v == 0 else _paraphrase(text, rng),
+                    "context": {"language": "en"},
+                    "output": None,
+                    "source": "gold" if rng.random() < 0.1 else "implicit_success",
+                    "base": base,
+                }
+            )
+    rng.shuffle(rows)
+    return rows
+
+
+def main(bases: int = 5000, variants: int = 5) -> None:
+    """Run the filter at several distances and print speed, recall and loss."""
+    rows = corpus(bases, variants)
+    gold = {row["base"] for row in rows if row["source"] == "gold"}
+    print(f"{len(rows)} rows, {bases} distinct commands")
+    for distance in (0, 3, 6, 9):
+        dedup = NearDuplicateFilter(max_distance=distance)
+        start = time.perf_counter()
+        kept = list(dedup.filter(rows))
+        elapsed = time.perf_counter() - start
+        per_base = {}
+        gold_kept = set()
+        for row in kept:
+            per_base[row["base"]] = per_base.get(row["base"], 0) + 1
+            if row["source"] == "gold":
+                gold_kept.add(row["base"])
+        removed = sum(
+            variants - count for count in per_base.values() if count <= variants
+        )
+        lost = bases - len(per_base)
+        print(
+            f"  distance {distance:2}: {len(rows) / elapsed:7,.0f} rows/s, "
+            f"recall {removed / (len(rows) - bases):6.1%}, "
+            f"commands lost {lost / bases:6.2%}, "
+            f"gold kept {len(gold_kept & gold) / len(gold):6.1%}"
+        )
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:3]]
+    main(*args)
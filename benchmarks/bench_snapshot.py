@@ -0,0 +1,54 @@
+"""Measure snapshot size, save time and warm-start load time of the trace store.
+
+Run with ``python benchmarks/bench_snapshot.py [count]``.
+"""
+
+from __future__ import annotations
+
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from _traces import make_traces
+
+from custom_components.assist_traces.snapshot import read_snapshot, write_snapshot
+from custom_components.assist_traces.store import TraceStore
+
+
+def main(count: int = 100000) -> None:
+    """Snapshot a store of ``count`` traces and reload it into an empty store."""
+    store = TraceStore(max_traces=count, max_bytes=1 << 40)
+    start = time.perf_counter()
+    for trace in make_traces(count):
+        store[trace["trace_id"]] = trace
+    print(f"   build: {time.perf_counter() - start:8.2f} s for {count} traces")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "store.snapshot"
+        start = time.perf_counter()
+        rows = [(trace_id, *record.pack()) for trace_id, record in store.items()]
+        packed = time.perf_counter() - start
+        size = write_snapshot(path, rows, {})
+        written = time.perf_counter() - start
+        print(
+            f"    save: {written:8.2f} s ({packed * 1000:.0f} ms on the event loop), "
+            f"{size / 1e6:.1f} MB, {size / count:.0f} B/trace"
+        )
+
+        start = time.perf_counter()
+        records, _ = read_snapshot(path)
+        read = time.perf_counter() - start
+        restored = TraceStore(max_traces=count, max_bytes=1 << 40)
+        records.reverse()
+        restored.restore(records)
+        total = time.perf_counter() - start
+        print(
+            f"    load: {total:8.2f} s ({read:.2f} s in the executor, "
+            f"{(total - read) * 1000:.0f} ms restoring on the event loop)"
+        )
+        assert len(restored) == count
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
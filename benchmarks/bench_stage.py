@@ -0,0 +1,74 @@
+"""Measure event loop stalls while large traces are redacted inline or staged.
+
+Run with ``python benchmarks/bench_stage.py [count]``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import sys
+import tempfile
+import time
+
+from _traces import make_traces
+
+from custom_components.assist_traces.redact import redact
+from custom_components.assist_traces.stage import RedactionStage
+from custom_components.assist_traces.writer import TraceWriter, WriterConfig
+
+
+async def _ticker(stop: asyncio.Event, lags: list) -> None:
+    """Record how late a 1 ms sleep wakes up until stopped."""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lags.append(time.perf_counter() - start - 0.001)
+
+
+async def _run(traces, processes) -> None:
+    """Capture every trace and print the worst and total loop lag."""
+    with tempfile.TemporaryDirectory() as directory:
+        writer = TraceWriter(WriterConfig(directory=directory))
+        await writer.start()
+        stage = RedactionStage(writer, "basic", processes=processes or 0)
+        if processes is not None:
+            await stage.start()
+            # Start pool workers before measuring.
+            await stage.enqueue(dict(traces[0]))
+            await stage.flush()
+        stop, lags = asyncio.Event(), []
+        ticker = asyncio.create_task(_ticker(stop, lags))
+        await asyncio.sleep(0.01)
+        start = time.perf_counter()
+        for trace in traces:
+            if processes is None:
+                await writer.enqueue(redact(trace, "basic"))
+            else:
+                await stage.enqueue(trace)
+            await asyncio.sleep(0)
+        await stage.flush()
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await ticker
+        await stage.stop()
+        await writer.stop()
+    name = "inline" if processes is None else f"stage, {processes} processes"
+    lags.sort()
+    print(
+        f"{name:>20}: {elapsed:6.2f}s, loop lag p99 "
+        f"{lags[int(len(lags) * 0.99)] * 1000:6.1f} ms, max {lags[-1] * 1000:6.1f} ms"
+    )
+
+
+async def main(count: int = 200) -> None:
+    """Run the benchmark for inline redaction and each stage executor."""
+    traces = list(make_traces(count))
+    for trace in traces:
+        # Long rendered prompts are what stall the loop in practice.
+        trace["prompt_rendered"] *= 20
+    for processes in (None, 0, 2):
+        await _run(traces, processes)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200))
@@ -2,44 +2,167 @@
 
 from __future__ import annotations
 
+from pathlib import Path
+
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant
 
 from .const import (
+    COLD_INDEX_NAME,
+    CONF_BATCH_MS,
+    CONF_BATCH_SIZE,
+    CONF_BLOCK_KB,
+    CONF_BLOCK_ROWS,
+    CONF_EXPORT_PROCESSES,
+    CONF_IDLE_CLOSE_S,
+    CONF_MAX_AGE_H,
+    CONF_MAX_OPEN_FILES,
+    CONF_MAX_STORE_MB,
+    CONF_MAX_TRACES,
+    CONF_OVERFLOW,
+    CONF_QUEUE_SIZE,
     CONF_REDACTION_LEVEL,
+    CONF_REDACTION_PROCESSES,
     CONF_SINK_DIR,
+    CONF_SNAPSHOT_INTERVAL_S,
+    CONF_WAL,
+    CONF_WAL_FSYNC_MS,
     CONF_PARTITIONING,
+    CONF_QUERY_WORKERS,
+    DATA_COLD,
+    DATA_READER,
     DATA_TRACES,
     DATA_WRITER,
     DOMAIN,
+    SNAPSHOT_NAME,
+    DEFAULT_BATCH_MS,
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_BLOCK_KB,
+    DEFAULT_BLOCK_ROWS,
+    DEFAULT_EXPORT_PROCESSES,
+    DEFAULT_IDLE_CLOSE_S,
+    DEFAULT_MAX_AGE_H,
+    DEFAULT_MAX_OPEN_FILES,
+    DEFAULT_MAX_STORE_MB,
+    DEFAULT_MAX_TRACES,
+    DEFAULT_OVERFLOW,
     DEFAULT_PARTITIONING,
+    DEFAULT_QUERY_WORKERS,
+    DEFAULT_QUEUE_SIZE,
     DEFAULT_REDACTION,
+    DEFAULT_REDACTION_PROCESSES,
     DEFAULT_SINK_DIR,
+    DEFAULT_SNAPSHOT_INTERVAL_S,
+    DEFAULT_WAL_FSYNC_MS,
 )
 
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Set up assist_traces from a config entry."""
+    from .aggregates import RollingAggregates
+    from .cold import ColdIndex
     from .correlator import Correlator
+    from .export import ExportManager
+    from .history import HistoryEngine
     from .pipeline import async_setup_pipeline_tracing
+    from .quantiles import LatencyQuantiles
+    from .reader import TraceReader
     from .services import async_setup_services
+    from .snapshot import StoreSnapshotter
+    from .stage import RedactionStage
+    from .store import TraceStore
     from .websocket import async_setup_ws
     from .writer import TraceWriter, WriterConfig
 
     hass.data.setdefault(DOMAIN, {})
-    hass.data.setdefault(DATA_TRACES, {})
+    max_age_h = entry.options.get(CONF_MAX_AGE_H, DEFAULT_MAX_AGE_H)
+    store = hass.data.setdefault(
+        DATA_TRACES,
+        TraceStore(
+            max_traces=entry.options.get(CONF_MAX_TRACES, DEFAULT_MAX_TRACES),
+            max_bytes=int(
+                entry.options.get(CONF_MAX_STORE_MB, DEFAULT_MAX_STORE_MB) * 1024 * 1024
+            ),
+            max_age_s=max_age_h * 3600 if max_age_h else None,
+        ),
+    )
+
+    aggregates = RollingAggregates()
+    quantiles = LatencyQuantiles()
+    for trace_id, record in store.items():
+        aggregates.update(trace_id, record)
+        quantiles.update(trace_id, record)
+    hass.data[DOMAIN]["aggregates"] = aggregates
+    hass.data[DOMAIN]["quantiles"] = quantiles
+    hass.data[DOMAIN]["unsubs"] = [
+        store.add_listener(aggregates.update),
+        store.add_listener(quantiles.update),
+    ]
 
     sink_dir = entry.options.get(CONF_SINK_DIR, DEFAULT_SINK_DIR)
     partitioning = entry.options.get(CONF_PARTITIONING, DEFAULT_PARTITIONING)
-    writer = TraceWriter(WriterConfig(directory=sink_dir, partitioning=partitioning))
+    cold = ColdIndex(Path(sink_dir) / COLD_INDEX_NAME)
+    await hass.async_add_executor_job(cold.open)
+    hass.data[DATA_COLD] = cold
+    writer = TraceWriter(
+        WriterConfig(
+            directory=sink_dir,
+            partitioning=partitioning,
+            queue_size=entry.options.get(CONF_QUEUE_SIZE, DEFAULT_QUEUE_SIZE),
+            batch_size=entry.options.get(CONF_BATCH_SIZE, DEFAULT_BATCH_SIZE),
+            batch_ms=entry.options.get(CONF_BATCH_MS, DEFAULT_BATCH_MS),
+            overflow=entry.options.get(CONF_OVERFLOW, DEFAULT_OVERFLOW),
+            max_open_files=entry.options.get(
+                CONF_MAX_OPEN_FILES, DEFAULT_MAX_OPEN_FILES
+            ),
+            idle_close_s=entry.options.get(CONF_IDLE_CLOSE_S, DEFAULT_IDLE_CLOSE_S),
+            block_rows=entry.options.get(CONF_BLOCK_ROWS, DEFAULT_BLOCK_ROWS),
+            block_kb=entry.options.get(CONF_BLOCK_KB, DEFAULT_BLOCK_KB),
+            wal=entry.options.get(CONF_WAL, False),
+            wal_fsync_ms=entry.options.get(CONF_WAL_FSYNC_MS, DEFAULT_WAL_FSYNC_MS),
+        ),
+        cold_index=cold,
+    )
     await writer.start()
     hass.data[DATA_WRITER] = writer
+    redaction_level = entry.options.get(CONF_REDACTION_LEVEL, DEFAULT_REDACTION)
+    redaction = RedactionStage(
+        writer,
+        redaction_level,
+        processes=entry.options.get(
+            CONF_REDACTION_PROCESSES, DEFAULT_REDACTION_PROCESSES
+        ),
+        queue_size=writer.config.queue_size,
+        batch_size=writer.config.batch_size,
+        batch_ms=writer.config.batch_ms,
+    )
+    await redaction.start()
+    hass.data[DOMAIN]["redaction"] = redaction
+    reader = TraceReader(sink_dir, partitioning)
+    hass.data[DATA_READER] = reader
+    hass.data[DOMAIN]["history"] = HistoryEngine(
+        hass,
+        reader,
+        entry.options.get(CONF_QUERY_WORKERS, DEFAULT_QUERY_WORKERS),
+        cold,
+    )
 
     correlator = Correlator(hass)
     hass.data[DOMAIN]["correlator"] = correlator
-    hass.data[DOMAIN]["redaction_level"] = entry.options.get(
-        CONF_REDACTION_LEVEL, DEFAULT_REDACTION
+    hass.data[DOMAIN]["redaction_level"] = redaction_level
+    hass.data[DOMAIN]["exports"] = ExportManager(
+        hass,
+        reader,
+        redaction_level,
+        entry.options.get(CONF_EXPORT_PROCESSES, DEFAULT_EXPORT_PROCESSES),
+    )
+    snapshotter = StoreSnapshotter(
+        hass,
+        Path(sink_dir) / SNAPSHOT_NAME,
+        entry.options.get(CONF_SNAPSHOT_INTERVAL_S, DEFAULT_SNAPSHOT_INTERVAL_S),
     )
+    hass.data[DOMAIN]["snapshotter"] = snapshotter
+    snapshotter.start()
 
     await async_setup_pipeline_tracing(hass)
     await async_setup_services(hass)
@@ -50,5 +173,12 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
 
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload assist_traces config entry."""
+    hass.data[DOMAIN]["exports"].cancel()
+    await hass.data[DOMAIN]["snapshotter"].stop()
+    hass.data[DOMAIN]["correlator"].stop()
+    for unsub in hass.data[DOMAIN].pop("unsubs"):
+        unsub()
+    await hass.data[DOMAIN]["redaction"].stop()
     await hass.data[DATA_WRITER].stop()
+    await hass.async_add_executor_job(hass.data[DATA_COLD].close)
     return await hass.config_entries.async_unload_platforms(entry, ["sensor"])
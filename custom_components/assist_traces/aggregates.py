@@ -0,0 +1,133 @@
+"""Rolling-window aggregates backing the 24h sensors."""
+
+from __future__ import annotations
+
+import heapq
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Tuple
+
+from .record import TraceRecord
+
+# (bucket, failed, latency_ms) a trace currently contributes.
+Contribution = Tuple[int, bool, float]
+
+
+@dataclass
+class Bucket:
+    """Totals for the traces whose timestamp falls in one bucket."""
+
+    count: int = 0
+    fails: int = 0
+    latency_sum: float = 0
+
+
+class RollingAggregates:
+    """Count, failures and latency sum over a sliding window of fixed buckets.
+
+    Traces are bucketed by their own timestamp and each trace's contribution
+    is remembered, so a later result change or merge moves it instead of
+    counting it twice. Totals are kept alongside the buckets and expired
+    buckets are subtracted as the window slides, so every read is O(1)
+    amortized and independent of what the store has evicted.
+    """
+
+    def __init__(
+        self,
+        window_s: int = 24 * 3600,
+        bucket_s: int = 60,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        """Initialize empty aggregates."""
+        self.window_s = window_s
+        self.bucket_s = bucket_s
+        self._clock = clock
+        self._total = Bucket()
+        self._buckets: Dict[int, Bucket] = {}
+        self._heap: List[int] = []
+        self._members: Dict[int, List[str]] = {}
+        self._contrib: Dict[str, Contribution] = {}
+
+    def update(self, trace_id: str, record: TraceRecord) -> None:
+        """Account for an inserted or updated trace."""
+        if record.ts_us is None:
+            return
+        bucket = record.ts_us // (self.bucket_s * 1_000_000)
+        cutoff = self.expire()
+        old = self._contrib.get(trace_id)
+        if bucket <= cutoff:
+            if old is not None:
+                self._apply(old, -1)
+                del self._contrib[trace_id]
+            return
+        new = (bucket, record.get("result") == "fail", record.get("latency_ms") or 0)
+        if new == old:
+            return
+        if old is not None:
+            self._apply(old, -1)
+        if old is None or old[0] != bucket:
+            self._members.setdefault(bucket, []).append(trace_id)
+        self._apply(new, 1)
+        self._contrib[trace_id] = new
+
+    def expire(self) -> int:
+        """Drop buckets that slid out of the window and return the cutoff bucket."""
+        now = int(self._clock() // self.bucket_s)
+        cutoff = now - self.window_s // self.bucket_s
+        while self._heap and self._heap[0] <= cutoff:
+            bucket = heapq.heappop(self._heap)
+            totals = self._buckets.pop(bucket)
+            self._total.count -= totals.count
+            self._total.fails -= totals.fails
+            self._total.latency_sum -= totals.latency_sum
+            for trace_id in self._members.pop(bucket, []):
+                contrib = self._contrib.get(trace_id)
+                if contrib is not None and contrib[0] == bucket:
+                    del self._contrib[trace_id]
+        return cutoff
+
+    @property
+    def count(self) -> int:
+        """Return the number of traces in the window."""
+        self.expire()
+        return self._total.count
+
+    @property
+    def fails(self) -> int:
+        """Return the number of failed traces in the window."""
+        self.expire()
+        return self._total.fails
+
+    @property
+    def fail_rate(self) -> float:
+        """Return the share of traces in the window that failed."""
+        count = self.count
+        return self._total.fails / max(count, 1)
+
+    @property
+    def mean_latency_ms(self) -> float:
+        """Return the mean latency of traces in the window."""
+        count = self.count
+        return self._total.latency_sum / max(count, 1)
+
+    def diagnostics(self) -> Dict[str, Any]:
+        """Return window totals and bucket usage."""
+        self.expire()
+        return {
+            "count": self._total.count,
+            "fails": self._total.fails,
+            "latency_sum": self._total.latency_sum,
+            "buckets": len(self._buckets),
+        }
+
+    def _apply(self, contrib: Contribution, sign: int) -> None:
+        """Add or subtract one trace's contribution."""
+        bucket, failed, latency = contrib
+        totals = self._buckets.get(bucket)
+        if totals is None:
+            totals = self._buckets[bucket] = Bucket()
+            heapq.heappush(self._heap, bucket)
+        for target in (totals, self._total):
+            target.count += sign
+            target.fails += sign * failed
+            target.latency_sum += sign * latency
@@ -0,0 +1,176 @@
+"""SQLite index locating traces that have left the in-memory store."""
+
+from __future__ import annotations
+
+import sqlite3
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .segments import BlockInfo
+from .serialize import dumps, loads
+
+FEEDBACK_FIELDS = ("user_feedback", "repair_text", "gold_action")
+# Stay below SQLite's default limit on bound parameters per statement.
+_MAX_PARAMS = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS traces (
+    trace_id TEXT PRIMARY KEY,
+    ts TEXT NOT NULL,
+    model TEXT,
+    result TEXT,
+    partition TEXT NOT NULL,
+    segment TEXT NOT NULL,
+    block_offset INTEGER NOT NULL,
+    block_length INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS traces_ts ON traces (ts);
+CREATE TABLE IF NOT EXISTS feedback (
+    trace_id TEXT PRIMARY KEY,
+    user_feedback TEXT,
+    repair_text TEXT,
+    gold_action TEXT
+);
+"""
+
+
+@dataclass
+class ColdEntry:
+    """Location of a trace inside the partitioned segment files."""
+
+    trace_id: str
+    ts: str
+    model: Optional[str]
+    result: Optional[str]
+    partition: str
+    segment: str
+    block_offset: int
+    block_length: int
+
+    @property
+    def block(self) -> BlockInfo:
+        """Return the block holding the trace."""
+        return BlockInfo(offset=self.block_offset, length=self.block_length)
+
+
+class ColdIndex:
+    """Trace ID to block pointer index plus a feedback side table.
+
+    Rows are added by the writer when a block is closed, so every trace on
+    disk can be found without scanning partitions. Feedback for traces that
+    may no longer be in memory is kept separately and merged at export.
+    Calls are blocking and may come from any executor thread.
+    """
+
+    def __init__(self, path: Path) -> None:
+        """Initialize the index at a database path."""
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def open(self) -> None:
+        """Open the database and create the schema if needed."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        self._conn = conn
+
+    def close(self) -> None:
+        """Close the database."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def add_block(
+        self,
+        partition: str,
+        segment: str,
+        block: BlockInfo,
+        rows: Iterable[Tuple[str, str, Optional[str], Optional[str]]],
+    ) -> None:
+        """Index the (trace_id, ts, model, result) rows of a closed block."""
+        with self._lock:
+            assert self._conn is not None
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO traces VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (trace_id, ts, model, result, partition, segment)
+                        + (block.offset, block.length)
+                        for trace_id, ts, model, result in rows
+                    ],
+                )
+
+    def lookup(self, trace_id: str) -> Optional[ColdEntry]:
+        """Return the location of a trace, if it has been written."""
+        with self._lock:
+            assert self._conn is not None
+            row = self._conn.execute(
+                "SELECT * FROM traces WHERE trace_id = ?", (trace_id,)
+            ).fetchone()
+        return ColdEntry(*row) if row else None
+
+    def locations(self, trace_ids: List[str]) -> Dict[str, Tuple[str, str, int]]:
+        """Return the (partition, segment, block offset) of each indexed trace."""
+        rows = []
+        with self._lock:
+            assert self._conn is not None
+            for i in range(0, len(trace_ids), _MAX_PARAMS):
+                chunk = trace_ids[i : i + _MAX_PARAMS]
+                rows += self._conn.execute(
+                    "SELECT trace_id, partition, segment, block_offset FROM traces "
+                    f"WHERE trace_id IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+        return {trace_id: tuple(location) for trace_id, *location in rows}
+
+    def set_feedback(self, trace_id: str, fields: Dict[str, Any]) -> None:
+        """Record user feedback for a trace."""
+        values = [fields.get(name) for name in FEEDBACK_FIELDS]
+        values[2] = dumps(values[2]).decode() if values[2] is not None else None
+        with self._lock:
+            assert self._conn is not None
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO feedback VALUES (?, ?, ?, ?)",
+                    (trace_id, *values),
+                )
+
+    def feedback(
+        self, trace_ids: Optional[List[str]] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """Return recorded feedback by trace ID, optionally for given traces."""
+        rows = []
+        with self._lock:
+            assert self._conn is not None
+            if trace_ids is None:
+                rows = self._conn.execute("SELECT * FROM feedback").fetchall()
+            for i in range(0, len(trace_ids or []), _MAX_PARAMS):
+                chunk = trace_ids[i : i + _MAX_PARAMS]  # type: ignore[index]
+                rows += self._conn.execute(
+                    "SELECT * FROM feedback WHERE trace_id IN "
+                    f"({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+        out = {}
+        for trace_id, user_feedback, repair_text, gold_action in rows:
+            out[trace_id] = {
+                "user_feedback": user_feedback,
+                "repair_text": repair_text,
+                "gold_action": loads(gold_action) if gold_action else None,
+            }
+        return out
+
+    def diagnostics(self) -> Dict[str, Any]:
+        """Return row counts of the index."""
+        with self._lock:
+            if self._conn is None:
+                return {}
+            traces = self._conn.execute("SELECT COUNT(*) FROM traces").fetchone()[0]
+            feedback = self._conn.execute("SELECT COUNT(*) FROM feedback").fetchone()[0]
+        return {"traces": traces, "feedback": feedback}
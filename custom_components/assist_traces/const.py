@@ -7,16 +7,61 @@ DATA_TRACES = "traces"
 DATA_WRITER = "writer"
 DATA_CORRELATOR = "correlator"
 DATA_QUEUE = "queue"
+DATA_READER = "reader"
+DATA_COLD = "cold"
 
 CONF_ENABLED = "enabled"
 CONF_REDACTION_LEVEL = "redaction_level"
 CONF_SINK_DIR = "sink_dir"
 CONF_PARTITIONING = "partitioning"
+CONF_QUEUE_SIZE = "queue_size"
+CONF_BATCH_SIZE = "batch_size"
+CONF_BATCH_MS = "batch_ms"
+CONF_OVERFLOW = "overflow"
+CONF_MAX_OPEN_FILES = "max_open_files"
+CONF_IDLE_CLOSE_S = "idle_close_s"
+CONF_BLOCK_ROWS = "block_rows"
+CONF_BLOCK_KB = "block_kb"
+CONF_WAL = "wal"
+CONF_WAL_FSYNC_MS = "wal_fsync_ms"
+CONF_MAX_TRACES = "max_traces"
+CONF_MAX_STORE_MB = "max_store_mb"
+CONF_MAX_AGE_H = "max_age_h"
+CONF_SNAPSHOT_INTERVAL_S = "snapshot_interval_s"
+CONF_SENSOR_DEBOUNCE_S = "sensor_debounce_s"
+CONF_QUERY_WORKERS = "query_workers"
+CONF_REDACTION_PROCESSES = "redaction_processes"
+CONF_EXPORT_PROCESSES = "export_processes"
 PARTITION_DAILY = "daily"
 PARTITION_HOURLY = "hourly"
+OVERFLOW_BLOCK = "block"
+OVERFLOW_DROP_OLDEST = "drop_oldest"
+OVERFLOW_DROP_NEWEST = "drop_newest"
+OVERFLOW_SPILL = "spill"
+SPILL_DIR = "_spill"
+WAL_DIR = "_wal"
+COLD_INDEX_NAME = "index.sqlite3"
+SNAPSHOT_NAME = "store.snapshot"
 
 DEFAULT_SINK_DIR = "/config/assist_traces/ndjson"
 DEFAULT_PARTITIONING = PARTITION_DAILY
 DEFAULT_REDACTION = "basic"
 DEFAULT_QUEUE_SIZE = 4096
+DEFAULT_BATCH_SIZE = 256
+DEFAULT_BATCH_MS = 50
+DEFAULT_OVERFLOW = OVERFLOW_BLOCK
 DEFAULT_MAX_FILE_MB = 64
+DEFAULT_MAX_OPEN_FILES = 16
+DEFAULT_IDLE_CLOSE_S = 60
+DEFAULT_BLOCK_ROWS = 512
+DEFAULT_BLOCK_KB = 1024
+DEFAULT_WAL_FSYNC_MS = 200
+DEFAULT_MAX_TRACES = 5000
+DEFAULT_MAX_STORE_MB = 64
+DEFAULT_MAX_AGE_H = 48
+DEFAULT_SNAPSHOT_INTERVAL_S = 300
+DEFAULT_SENSOR_DEBOUNCE_S = 5
+DEFAULT_QUERY_WORKERS = 4
+DEFAULT_REDACTION_PROCESSES = 0
+# Worker processes of sharded exports; 0 uses one per CPU core.
+DEFAULT_EXPORT_PROCESSES = 0
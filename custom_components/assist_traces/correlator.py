@@ -3,51 +3,181 @@
 from __future__ import annotations
 
 import asyncio
-from typing import Any, Dict, List
+import heapq
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
 
 from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.event import async_track_state_change_event
 
 from .const import DATA_TRACES
+from .expectations import expectation_for
 
 
 class Correlator:
-    """Correlate traces with HA state changes."""
+    """Correlate traces with HA state changes.
+
+    Only entities targeted by a pending trace are tracked, and pending
+    traces are indexed by those entities, so unrelated state changes never
+    reach the correlator. Each target is checked against the outcome its
+    ``parsed_action`` should produce: a trace succeeds once every target
+    matches and is ``partial`` or ``fail`` at its deadline otherwise.
+    Deadlines sit in a single heap served by one loop timer armed for the
+    earliest of them; entries of traces resolved early are skipped when
+    they come due.
+    """
 
     def __init__(self, hass: HomeAssistant, window: int = 30) -> None:
         """Initialize the correlator."""
         self.hass = hass
         self.window = window
         self.pending: Dict[str, Dict[str, Any]] = {}
-        self._listener = hass.bus.async_listen("state_changed", self._on_state)
-
-    async def add_trace(self, trace_id: str, entity_ids: List[str]) -> None:
-        """Register a trace to watch for state changes."""
-        task = asyncio.create_task(self._timeout(trace_id))
-        self.pending[trace_id] = {"entities": entity_ids, "task": task}
-
-    async def _timeout(self, trace_id: str) -> None:
-        """Mark a trace as failed if no matching state change occurs."""
-        try:
-            await asyncio.sleep(self.window)
-        except asyncio.CancelledError:
-            return
-
-        if trace_id in self.pending:
-            trace = self.hass.data[DATA_TRACES].get(trace_id)
-            if trace:
-                trace["result"] = "fail"
-            self.pending.pop(trace_id, None)
+        self._watchers: Dict[str, Set[str]] = {}
+        self._tracking: Dict[str, Callable[[], None]] = {}
+        self._deadlines: List[Tuple[float, str]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    async def add_trace(
+        self,
+        trace_id: str,
+        entity_ids: List[str],
+        delay: Optional[float] = None,
+        action: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """Register a trace to watch for the outcome of its action."""
+        delay = self.window if delay is None else delay
+        self._unwatch(trace_id)
+        self.hass.data[DATA_TRACES].protect(trace_id)
+        due = self.hass.loop.time() + delay
+        self.pending[trace_id] = {
+            "entities": entity_ids,
+            "action": action,
+            "deadline": time.time() + delay,
+            "due": due,
+            "expected": {
+                entity_id: expectation_for(action, entity_id)
+                for entity_id in entity_ids
+            },
+            "matched": set(),
+        }
+        for entity_id in entity_ids:
+            watchers = self._watchers.setdefault(entity_id, set())
+            watchers.add(trace_id)
+            if entity_id not in self._tracking:
+                self._tracking[entity_id] = async_track_state_change_event(
+                    self.hass, [entity_id], self._on_state
+                )
+        heapq.heappush(self._deadlines, (due, trace_id))
+        if self._deadlines[0][1] == trace_id:
+            self._schedule()
+
+    @callback
+    def stop(self) -> None:
+        """Stop tracking entities and cancel the deadline timer."""
+        for unsub in self._tracking.values():
+            unsub()
+        self._tracking.clear()
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Return the pending traces with their wall-clock deadlines."""
+        return {
+            trace_id: {
+                "entities": info["entities"],
+                "action": info["action"],
+                "deadline": info["deadline"],
+            }
+            for trace_id, info in self.pending.items()
+        }
+
+    async def restore(self, pending: Dict[str, Dict[str, Any]]) -> None:
+        """Resume watching traces saved by ``snapshot`` before a restart."""
+        traces = self.hass.data[DATA_TRACES]
+        now = time.time()
+        for trace_id, info in pending.items():
+            if trace_id in self.pending or trace_id not in traces:
+                continue
+            remaining = info["deadline"] - now
+            if remaining <= 0:
+                self._resolve(trace_id, "fail")
+            else:
+                await self.add_trace(
+                    trace_id, info["entities"], remaining, info.get("action")
+                )
+
+    def _schedule(self) -> None:
+        """Arm the timer for the earliest deadline."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._deadlines:
+            self._timer = self.hass.loop.call_at(self._deadlines[0][0], self._expire)
+
+    @callback
+    def _expire(self) -> None:
+        """Resolve every trace whose deadline passed.
+
+        Targets that never changed but already show the expected outcome,
+        such as turning on a light that was on, count as matched.
+        """
+        self._timer = None
+        now = self.hass.loop.time()
+        while self._deadlines and self._deadlines[0][0] <= now:
+            due, trace_id = heapq.heappop(self._deadlines)
+            info = self.pending.get(trace_id)
+            if info is None or info["due"] != due:
+                continue
+            matched = info["matched"]
+            for entity_id, expected in info["expected"].items():
+                if entity_id not in matched and expected.satisfied(
+                    self.hass.states.get(entity_id)
+                ):
+                    matched.add(entity_id)
+            if len(matched) == len(info["expected"]):
+                self._resolve(trace_id, "success")
+            else:
+                self._resolve(trace_id, "partial" if matched else "fail")
+        self._schedule()
 
     @callback
     def _on_state(self, event) -> None:
-        """Handle state change events and mark traces as successful."""
+        """Match a state change of a tracked entity against pending traces."""
         entity_id = event.data.get("entity_id")
-        for trace_id, info in list(self.pending.items()):
-            if entity_id in info["entities"]:
-                trace = self.hass.data[DATA_TRACES].get(trace_id)
-                if trace:
-                    trace["result"] = "success"
-                task = info.get("task")
-                if task:
-                    task.cancel()
-                del self.pending[trace_id]
+        old_state = event.data.get("old_state")
+        new_state = event.data.get("new_state")
+        for trace_id in list(self._watchers.get(entity_id, ())):
+            info = self.pending[trace_id]
+            if not info["expected"][entity_id].matches(old_state, new_state):
+                continue
+            info["matched"].add(entity_id)
+            if len(info["matched"]) == len(info["expected"]):
+                self._resolve(trace_id, "success")
+
+    def _unwatch(self, trace_id: str) -> Optional[Dict[str, Any]]:
+        """Drop a trace from the entity index and return its pending info.
+
+        Entities no longer watched by any trace stop being tracked.
+        """
+        info = self.pending.pop(trace_id, None)
+        if info is None:
+            return None
+        for entity_id in info["entities"]:
+            watchers = self._watchers.get(entity_id)
+            if watchers is None:
+                continue
+            watchers.discard(trace_id)
+            if not watchers:
+                del self._watchers[entity_id]
+                unsub = self._tracking.pop(entity_id, None)
+                if unsub is not None:
+                    unsub()
+        return info
+
+    def _resolve(self, trace_id: str, result: str) -> None:
+        """Record the result of a pending trace and make it evictable."""
+        traces = self.hass.data[DATA_TRACES]
+        traces.set_fields(trace_id, {"result": result})
+        traces.release(trace_id)
+        self._unwatch(trace_id)
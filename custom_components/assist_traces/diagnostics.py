@@ -6,7 +6,7 @@ from typing import Any, Dict
 
 from homeassistant.core import HomeAssistant
 
-from .const import DATA_WRITER
+from .const import DATA_COLD, DATA_TRACES, DATA_WRITER, DOMAIN
 
 
 async def async_get_config_entry_diagnostics(
@@ -14,7 +14,22 @@ async def async_get_config_entry_diagnostics(
 ) -> Dict[str, Any]:
     """Return diagnostics for a config entry."""
     writer = hass.data.get(DATA_WRITER)
+    store = hass.data.get(DATA_TRACES)
+    cold = hass.data.get(DATA_COLD)
+    snapshotter = hass.data.get(DOMAIN, {}).get("snapshotter")
+    aggregates = hass.data.get(DOMAIN, {}).get("aggregates")
+    quantiles = hass.data.get(DOMAIN, {}).get("quantiles")
+    redaction = hass.data.get(DOMAIN, {}).get("redaction")
+    exports = hass.data.get(DOMAIN, {}).get("exports")
     return {
         "options": entry.options,
         "queue_size": writer.queue.qsize() if writer else 0,
+        "redaction": redaction.diagnostics() if redaction else {},
+        "writer": writer.diagnostics() if writer else {},
+        "store": store.diagnostics() if store is not None else {},
+        "cold": await hass.async_add_executor_job(cold.diagnostics) if cold else {},
+        "snapshot": snapshotter.diagnostics() if snapshotter else {},
+        "aggregates": aggregates.diagnostics() if aggregates else {},
+        "latency_quantiles": quantiles.summary() if quantiles else {},
+        "exports": exports.diagnostics() if exports else {},
     }
@@ -0,0 +1,135 @@
+"""Expected entity states derived from parsed Assist actions."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, FrozenSet, Optional
+
+UNAVAILABLE = frozenset({"unavailable", "unknown"})
+# Service name -> states an entity may reach once the service took effect.
+SERVICE_STATES = {
+    "turn_off": frozenset({"off"}),
+    "lock": frozenset({"locked", "locking"}),
+    "unlock": frozenset({"unlocked", "unlocking"}),
+    "open": frozenset({"open", "opening", "unlocked"}),
+    "open_cover": frozenset({"open", "opening"}),
+    "close_cover": frozenset({"closed", "closing"}),
+    "open_valve": frozenset({"open", "opening"}),
+    "close_valve": frozenset({"closed", "closing"}),
+    "media_play": frozenset({"playing"}),
+    "media_pause": frozenset({"paused"}),
+    "media_stop": frozenset({"idle", "off", "standby"}),
+    "start": frozenset({"cleaning"}),
+    "return_to_base": frozenset({"returning", "docked"}),
+}
+# Service name -> states the entity must leave.
+SERVICE_NOT_STATES = {"turn_on": frozenset({"off"})}
+# Service data key -> attribute holding the requested value.
+DATA_ATTRIBUTES = {
+    "brightness": "brightness",
+    "color_temp_kelvin": "color_temp_kelvin",
+    "rgb_color": "rgb_color",
+    "temperature": "temperature",
+    "target_temp_high": "target_temp_high",
+    "target_temp_low": "target_temp_low",
+    "humidity": "humidity",
+    "percentage": "percentage",
+    "preset_mode": "preset_mode",
+    "fan_mode": "fan_mode",
+    "volume_level": "volume_level",
+    "position": "current_position",
+    "tilt_position": "current_tilt_position",
+}
+# Service data key -> the entity state itself.
+DATA_STATES = ("hvac_mode", "option", "value")
+# Entities whose state records when they were last triggered.
+TRIGGER_DOMAINS = frozenset({"scene", "script", "button", "input_button"})
+# Relative tolerance when comparing numeric values.
+TOLERANCE = 0.02
+
+
+def _close(actual: Any, expected: Any) -> bool:
+    """Return True if two values match, allowing rounding of numbers."""
+    if isinstance(expected, (int, float)) and not isinstance(expected, bool):
+        try:
+            actual = float(actual)
+        except (TypeError, ValueError):
+            return False
+        # Integer values such as brightness are often rounded by integrations.
+        slack = 1 if isinstance(expected, int) else 0.01
+        return abs(actual - expected) <= max(abs(expected) * TOLERANCE, slack)
+    if isinstance(expected, (list, tuple)) and isinstance(actual, (list, tuple)):
+        return len(actual) == len(expected) and all(map(_close, actual, expected))
+    return str(actual) == str(expected)
+
+
+@dataclass
+class Expectation:
+    """Outcome a service call should produce on one entity.
+
+    ``states``, ``not_states`` and ``value`` constrain the new state and
+    ``attributes`` the requested attribute values. An expectation with
+    neither (toggles, scenes or unknown services) is met by any change of
+    the state value, so attribute-only updates never count.
+    """
+
+    states: Optional[FrozenSet[str]] = None
+    not_states: FrozenSet[str] = frozenset()
+    value: Any = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def specific(self) -> bool:
+        """Return True if the expectation names a target state or attributes."""
+        return bool(
+            self.states or self.not_states or self.value is not None or self.attributes
+        )
+
+    def satisfied(self, state) -> bool:
+        """Return True if a state object already shows the expected outcome."""
+        if state is None or state.state in UNAVAILABLE or not self.specific:
+            return False
+        if self.states is not None and state.state not in self.states:
+            return False
+        if state.state in self.not_states:
+            return False
+        if self.value is not None and not _close(state.state, self.value):
+            return False
+        return all(
+            _close(state.attributes.get(name), value)
+            for name, value in self.attributes.items()
+        )
+
+    def matches(self, old_state, new_state) -> bool:
+        """Return True if a state change shows the expected outcome."""
+        if self.specific:
+            return self.satisfied(new_state)
+        if new_state is None or new_state.state in UNAVAILABLE:
+            return False
+        return old_state is None or old_state.state != new_state.state
+
+
+def expectation_for(
+    parsed_action: Optional[Dict[str, Any]], entity_id: str
+) -> Expectation:
+    """Return the outcome a parsed action should have on a target entity."""
+    service = str((parsed_action or {}).get("service") or "")
+    name = service.rpartition(".")[2]
+    data = (parsed_action or {}).get("data") or {}
+    if entity_id.partition(".")[0] in TRIGGER_DOMAINS:
+        return Expectation()
+    expectation = Expectation(
+        states=SERVICE_STATES.get(name),
+        not_states=SERVICE_NOT_STATES.get(name, frozenset()),
+    )
+    if not isinstance(data, dict):
+        return expectation
+    for key in DATA_STATES:
+        if key in data and name.startswith(("set_", "select_")):
+            expectation.value = data[key]
+    for key, attribute in DATA_ATTRIBUTES.items():
+        if key in data:
+            expectation.attributes[attribute] = data[key]
+    if "brightness_pct" in data:
+        expectation.attributes["brightness"] = round(data["brightness_pct"] * 2.55)
+    return expectation
@@ -0,0 +1,640 @@
+"""Streaming dataset exports from the trace store and on-disk history."""
+
+from __future__ import annotations
+
+import asyncio
+import gzip
+import hashlib
+import heapq
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import ExitStack
+from dataclasses import dataclass, field, fields
+from itertools import chain
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set
+
+from homeassistant.core import HomeAssistant
+
+from .cold import ColdIndex
+from .const import DATA_COLD, DATA_TRACES, DOMAIN
+from .helpers import summarize_context
+from .reader import TraceReader, read_block
+from .record import TraceRecord
+from .redact import redact
+from .simhash import NearDuplicateFilter
+from .serialize import dumps, dumps_line
+from .snapshot import CHUNK, SnapshotRow
+
+EVENT_EXPORT = f"{DOMAIN}_export"
+# Minimum seconds between progress events of one export.
+PROGRESS_S = 1.0
+# Rows buffered per gzip write.
+WRITE_ROWS = 512
+SPLITS = ("train", "validation")
+INDEX_NAME = "index.json"
+# Counters a shard worker reports back to the progress of its export.
+SHARD_COUNTERS = (
+    "partitions_done",
+    "blocks",
+    "scanned",
+    "superseded",
+    "duplicates",
+    "rows",
+)
+
+
+def sft_row(trace: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the supervised fine-tuning row of a trace."""
+    return {
+        "instruction": trace.get("user_text", ""),
+        "context": summarize_context(trace.get("context", {})),
+        "output": trace.get("gold_action") or trace.get("parsed_action"),
+        "source": "gold" if trace.get("gold_action") else "implicit_success",
+        "trace_id": trace.get("trace_id"),
+    }
+
+
+def prefs_row(trace: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the preference pair row of a trace."""
+    return {
+        "prompt": trace.get("user_text", ""),
+        "context": summarize_context(trace.get("context", {})),
+        "chosen": trace.get("gold_action") or trace.get("parsed_action"),
+        "rejected": trace.get("parsed_action"),
+        "trace_id": trace.get("trace_id"),
+    }
+
+
+ROW_BUILDERS: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]] = {
+    "sft": sft_row,
+    "prefs": prefs_row,
+}
+
+
+class ExportCancelled(Exception):
+    """Raised in an export worker once the export was cancelled."""
+
+
+@dataclass
+class ExportProgress:
+    """Progress of one export, reported from its worker thread."""
+
+    export_id: str
+    kind: str
+    output_path: str
+    state: str = "running"
+    shards: int = 0
+    shards_done: int = 0
+    partitions: int = 0
+    partitions_done: int = 0
+    blocks: int = 0
+    scanned: int = 0
+    superseded: int = 0
+    duplicates: int = 0
+    rows: int = 0
+    listener: Optional[Callable[[Dict[str, Any]], None]] = field(
+        default=None, repr=False
+    )
+    cancel: threading.Event = field(default_factory=threading.Event, repr=False)
+    _reported: float = field(default=0.0, repr=False)
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Return the progress counters."""
+        return {f.name: getattr(self, f.name) for f in fields(self) if f.repr}
+
+    def tick(self) -> None:
+        """Raise if cancelled and report progress at most every PROGRESS_S."""
+        if self.cancel.is_set():
+            raise ExportCancelled(self.export_id)
+        now = time.monotonic()
+        if self.listener is not None and now - self._reported >= PROGRESS_S:
+            self._reported = now
+            self.listener(self.as_dict())
+
+
+def history_traces(
+    reader: TraceReader,
+    cold: Optional[ColdIndex],
+    skip: Set[str],
+    progress: ExportProgress,
+    partitions: Optional[List[Path]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Yield the latest on-disk version of every trace not in ``skip``.
+
+    Every update of a trace is appended to its partition, so each block is
+    reduced to its last row per trace and the cold index, which points at
+    the newest block holding a trace, drops versions superseded later on.
+    Only one block is decoded at a time. ``partitions`` restricts the scan
+    to some partitions of the reader.
+    """
+    if partitions is None:
+        partitions = list(reader.partitions())
+    progress.partitions = len(partitions)
+    for partition in partitions:
+        name = partition.relative_to(reader.directory).as_posix()
+        for path, block in reader.blocks(partition):
+            progress.tick()
+            rows = read_block(path, block)
+            latest = {row.get("trace_id"): row for row in rows}
+            trace_ids = [tid for tid in latest if tid not in skip]
+            located = cold.locations(trace_ids) if cold is not None else {}
+            here = (name, path.name, block.offset)
+            for trace_id in trace_ids:
+                if located.get(trace_id, here) == here:
+                    yield latest[trace_id]
+                else:
+                    progress.superseded += 1
+            progress.blocks += 1
+            progress.scanned += len(rows)
+        progress.partitions_done += 1
+
+
+def store_traces(rows: List[SnapshotRow], level: str) -> Iterator[Dict[str, Any]]:
+    """Yield packed store records as redacted trace dicts."""
+    for _, row, heavy in rows:
+        yield redact(TraceRecord.unpack(row, heavy).to_dict(), level)
+
+
+def export_rows(
+    kind: str,
+    traces: Iterable[Dict[str, Any]],
+    feedback: Dict[str, Dict[str, Any]],
+    dedup: Optional[NearDuplicateFilter],
+) -> Iterator[Dict[str, Any]]:
+    """Return the ``kind`` rows of traces with feedback merged, deduplicated."""
+    build = ROW_BUILDERS[kind]
+    rows = (
+        build({**trace, **feedback.get(trace.get("trace_id"), {})}) for trace in traces
+    )
+    return dedup.filter(rows) if dedup is not None else rows
+
+
+def write_export(
+    path: Path,
+    kind: str,
+    traces: Iterable[Dict[str, Any]],
+    feedback: Dict[str, Dict[str, Any]],
+    dedup_distance: Optional[int],
+    progress: ExportProgress,
+) -> None:
+    """Write export rows of traces to a gzip file as they are produced.
+
+    With a ``dedup_distance``, near-duplicate rows are dropped. Rows go to
+    a temporary file renamed into place once complete, so a cancelled or
+    failed export never leaves a truncated dataset behind.
+    """
+    dedup = None
+    if dedup_distance is not None:
+        dedup = NearDuplicateFilter(dedup_distance)
+    lines = map(dumps_line, export_rows(kind, traces, feedback, dedup))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.tmp")
+    try:
+        with gzip.open(tmp, "wb") as f:
+            batch: List[bytes] = []
+            for line in lines:
+                batch.append(line)
+                if len(batch) >= WRITE_ROWS:
+                    f.writelines(batch)
+                    progress.rows += len(batch)
+                    batch = []
+                    if dedup is not None:
+                        progress.duplicates = dedup.stats.duplicates
+                    progress.tick()
+            f.writelines(batch)
+            progress.rows += len(batch)
+            if dedup is not None:
+                progress.duplicates = dedup.stats.duplicates
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def split_of(trace_id: Optional[str], validation: float) -> str:
+    """Return the split of a trace, stable across exports and shard counts."""
+    digest = hashlib.blake2b(str(trace_id).encode(), digest_size=8).digest()
+    if int.from_bytes(digest, "big") < validation * 2**64:
+        return "validation"
+    return "train"
+
+
+def shard_name(kind: str, index: int, shards: int) -> str:
+    """Return the file name of one shard of a split."""
+    return f"{kind}-{index:05d}-of-{shards:05d}.jsonl.gz"
+
+
+def assign_partitions(partitions: List[Path], shards: int) -> List[List[Path]]:
+    """Spread partitions over shards, largest first onto the lightest shard."""
+    sizes = {
+        partition: sum(p.stat().st_size for p in partition.glob("part*.jsonl.gz"))
+        for partition in partitions
+    }
+    loads = [(0, index) for index in range(shards)]
+    groups: List[List[Path]] = [[] for _ in range(shards)]
+    for partition in sorted(partitions, key=lambda p: (-sizes[p], p)):
+        size, index = heapq.heappop(loads)
+        groups[index].append(partition)
+        heapq.heappush(loads, (size + sizes[partition], index))
+    return [sorted(group) for group in groups]
+
+
+@dataclass
+class ShardTask:
+    """Work of one shard of a sharded export, as sent to a worker process."""
+
+    kind: str
+    index: int
+    shards: int
+    output_dir: str
+    sink: str
+    partitioning: str
+    partitions: List[str]
+    cold_path: Optional[str]
+    skip: Set[str]
+    store: List[SnapshotRow]
+    level: str
+    dedup_distance: Optional[int]
+    validation: float
+
+
+def _tmp(path: Path) -> Path:
+    """Return the temporary name a file is written under."""
+    return path.with_name(f"{path.name}.tmp")
+
+
+def _sha256(path: Path) -> str:
+    """Return the hex SHA-256 of a file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_shard(
+    task: ShardTask, rows: Iterable[Dict[str, Any]], progress: ExportProgress
+) -> List[Dict[str, Any]]:
+    """Write rows to the split files of one shard and return their entries.
+
+    Files keep a ``.tmp`` suffix until ``finish_shards`` moves them into
+    place. The gzip header carries no timestamp, so identical rows always
+    give identical files and checksums.
+    """
+    splits = SPLITS if task.validation > 0 else SPLITS[:1]
+    directory = Path(task.output_dir)
+    name = shard_name(task.kind, task.index, task.shards)
+    paths = {split: directory / split / name for split in splits}
+    batches: Dict[str, List[bytes]] = {split: [] for split in splits}
+    counts = dict.fromkeys(splits, 0)
+    try:
+        with ExitStack() as stack:
+            files = {}
+            for split, path in paths.items():
+                path.parent.mkdir(parents=True, exist_ok=True)
+                raw = stack.enter_context(open(_tmp(path), "wb"))
+                files[split] = stack.enter_context(
+                    gzip.GzipFile(name, "wb", fileobj=raw, mtime=0)
+                )
+            for row in rows:
+                split = split_of(row.get("trace_id"), task.validation)
+                batch = batches[split]
+                batch.append(dumps_line(row))
+                if len(batch) >= WRITE_ROWS:
+                    files[split].writelines(batch)
+                    counts[split] += len(batch)
+                    progress.rows += len(batch)
+                    batch.clear()
+                    progress.tick()
+            for split, batch in batches.items():
+                files[split].writelines(batch)
+                counts[split] += len(batch)
+                progress.rows += len(batch)
+    except BaseException:
+        for path in paths.values():
+            _tmp(path).unlink(missing_ok=True)
+        raise
+    return [
+        {
+            "split": split,
+            "path": path.relative_to(directory).as_posix(),
+            "rows": counts[split],
+            "bytes": _tmp(path).stat().st_size,
+            "sha256": _sha256(_tmp(path)),
+        }
+        for split, path in paths.items()
+    ]
+
+
+_CANCEL: Optional[threading.Event] = None
+
+
+def _init_shard_worker(cancel: threading.Event) -> None:
+    """Keep the cancellation event of the export in a worker process."""
+    global _CANCEL
+    _CANCEL = cancel
+
+
+def export_shard(
+    task: ShardTask, cancel: Optional[threading.Event] = None
+) -> Dict[str, Any]:
+    """Export one shard and return its file entries and counters.
+
+    Runs in a worker process, which decodes its partitions, redacts its
+    slice of the store and builds, deduplicates and compresses rows on its
+    own. Only the cancellation event is shared with the export.
+    """
+    progress = ExportProgress(
+        f"{task.kind}-{task.index}",
+        task.kind,
+        task.output_dir,
+        cancel=cancel if cancel is not None else _CANCEL,  # type: ignore[arg-type]
+    )
+    reader = TraceReader(task.sink, task.partitioning)
+    cold = None
+    feedback: Dict[str, Dict[str, Any]] = {}
+    if task.cold_path is not None:
+        cold = ColdIndex(Path(task.cold_path))
+        cold.open()
+        feedback = cold.feedback()
+    dedup = None
+    if task.dedup_distance is not None:
+        dedup = NearDuplicateFilter(task.dedup_distance)
+    try:
+        traces = chain(
+            history_traces(
+                reader,
+                cold,
+                task.skip,
+                progress,
+                [reader.directory / partition for partition in task.partitions],
+            ),
+            store_traces(task.store, task.level),
+        )
+        files = write_shard(
+            task, export_rows(task.kind, traces, feedback, dedup), progress
+        )
+    finally:
+        if cold is not None:
+            cold.close()
+    if dedup is not None:
+        progress.duplicates = dedup.stats.duplicates
+    return {
+        "files": files,
+        **{name: getattr(progress, name) for name in SHARD_COUNTERS},
+    }
+
+
+def finish_shards(
+    output_dir: Path, index: Dict[str, Any], results: List[Dict[str, Any]]
+) -> None:
+    """Move complete shard files into place, then write the export index.
+
+    The index lists every file of each split with its row count, size and
+    SHA-256. It is written last, so its presence marks a complete export.
+    """
+    entries = sorted(
+        (entry for result in results for entry in result["files"]),
+        key=lambda entry: entry["path"],
+    )
+    splits: Dict[str, Dict[str, Any]] = {}
+    for entry in entries:
+        path = output_dir / entry["path"]
+        os.replace(_tmp(path), path)
+        split = splits.setdefault(entry["split"], {"rows": 0, "files": []})
+        split["rows"] += entry["rows"]
+        split["files"].append({k: v for k, v in entry.items() if k != "split"})
+    path = output_dir / INDEX_NAME
+    _tmp(path).write_bytes(dumps({**index, "splits": splits}))
+    os.replace(_tmp(path), path)
+
+
+def discard_shards(output_dir: Path, results: List[Dict[str, Any]]) -> None:
+    """Remove the temporary files of shards of a failed export."""
+    for result in results:
+        for entry in result["files"]:
+            _tmp(output_dir / entry["path"]).unlink(missing_ok=True)
+
+
+class ExportManager:
+    """Run dataset exports in the executor and track them for cancellation.
+
+    The store is packed on the event loop in chunks, like a snapshot, and
+    everything else happens in one executor job streaming from history on
+    disk, then the store, into the output file, or in a pool of
+    ``processes`` worker processes writing shards in parallel. Progress is
+    fired as ``assist_traces_export`` events while an export runs and once
+    when it ends.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        reader: TraceReader,
+        level: str,
+        processes: int = 0,
+    ) -> None:
+        """Initialize the manager."""
+        self.hass = hass
+        self.reader = reader
+        self.level = level
+        self.processes = processes
+        self.running: Dict[str, ExportProgress] = {}
+
+    async def run(
+        self,
+        kind: str,
+        output_path: str,
+        dedup_distance: Optional[int] = None,
+        export_id: Optional[str] = None,
+        shards: int = 0,
+        validation: float = 0.0,
+    ) -> Dict[str, Any]:
+        """Export every trace as ``kind`` rows and return the final progress.
+
+        With a ``dedup_distance``, rows within that many SimHash bits of an
+        earlier row are dropped. With ``shards``, ``output_path`` is a
+        directory receiving that many shards per split plus an index, and a
+        ``validation`` fraction of traces goes to the validation split.
+        Raises ``ValueError`` if an export with ``export_id`` is running.
+        """
+        if export_id is not None and export_id in self.running:
+            raise ValueError(f"export {export_id} is already running")
+        progress = ExportProgress(
+            export_id=export_id or uuid.uuid4().hex,
+            kind=kind,
+            output_path=output_path,
+            shards=shards,
+            listener=self._report_threadsafe,
+        )
+        if shards:
+            progress.cancel = multiprocessing.get_context("spawn").Event()
+        self.running[progress.export_id] = progress
+        self._fire(progress.as_dict())
+        try:
+            rows: List[SnapshotRow] = []
+            items = list(self.hass.data[DATA_TRACES].items())
+            for i in range(0, len(items), CHUNK):
+                for trace_id, record in items[i : i + CHUNK]:
+                    rows.append((trace_id, *record.pack()))
+                await asyncio.sleep(0)
+            cold = self.hass.data.get(DATA_COLD)
+            if shards:
+                await self._run_sharded(
+                    progress, rows, cold, dedup_distance, validation
+                )
+            else:
+                feedback = (
+                    await self.hass.async_add_executor_job(cold.feedback)
+                    if cold
+                    else {}
+                )
+                traces = chain(
+                    history_traces(
+                        self.reader, cold, {row[0] for row in rows}, progress
+                    ),
+                    store_traces(rows, self.level),
+                )
+                await self.hass.async_add_executor_job(
+                    write_export,
+                    Path(output_path),
+                    kind,
+                    traces,
+                    feedback,
+                    dedup_distance,
+                    progress,
+                )
+            progress.state = "done"
+        except ExportCancelled:
+            progress.state = "cancelled"
+        except asyncio.CancelledError:
+            progress.cancel.set()
+            progress.state = "cancelled"
+            raise
+        except Exception:
+            progress.state = "failed"
+            raise
+        finally:
+            if self.running.get(progress.export_id) is progress:
+                del self.running[progress.export_id]
+            self._fire(progress.as_dict())
+        return progress.as_dict()
+
+    async def _run_sharded(
+        self,
+        progress: ExportProgress,
+        store: List[SnapshotRow],
+        cold: Optional[ColdIndex],
+        dedup_distance: Optional[int],
+        validation: float,
+    ) -> None:
+        """Write the shards of an export in worker processes.
+
+        History partitions are spread over shards by size and store traces
+        round-robin. Counters are merged as shards finish, and
+        near-duplicates are only dropped within a shard.
+        """
+        shards = progress.shards
+        output_dir = Path(progress.output_path)
+        groups = await self.hass.async_add_executor_job(
+            lambda: assign_partitions(list(self.reader.partitions()), shards)
+        )
+        progress.partitions = sum(map(len, groups))
+        skip = {row[0] for row in store}
+        tasks = [
+            ShardTask(
+                kind=progress.kind,
+                index=index,
+                shards=shards,
+                output_dir=str(output_dir),
+                sink=str(self.reader.directory),
+                partitioning=self.reader.partitioning,
+                partitions=[
+                    partition.relative_to(self.reader.directory).as_posix()
+                    for partition in group
+                ],
+                cold_path=str(cold.path) if cold is not None else None,
+                skip=skip,
+                store=store[index::shards],
+                level=self.level,
+                dedup_distance=dedup_distance,
+                validation=validation,
+            )
+            for index, group in enumerate(groups)
+        ]
+        pool = ProcessPoolExecutor(
+            min(shards, self.processes or os.cpu_count() or 1),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_shard_worker,
+            initargs=(progress.cancel,),
+        )
+        loop = asyncio.get_running_loop()
+
+        async def shard(task: ShardTask) -> Dict[str, Any]:
+            try:
+                try:
+                    result = await loop.run_in_executor(pool, export_shard, task)
+                except BrokenProcessPool:
+                    # A killed worker breaks the pool for good; finish the
+                    # remaining shards in threads.
+                    result = await self.hass.async_add_executor_job(
+                        export_shard, task, progress.cancel
+                    )
+            except Exception:
+                progress.cancel.set()
+                raise
+            for name in SHARD_COUNTERS:
+                setattr(progress, name, getattr(progress, name) + result[name])
+            progress.shards_done += 1
+            self._fire(progress.as_dict())
+            return result
+
+        try:
+            results = await asyncio.gather(*map(shard, tasks), return_exceptions=True)
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+        done = [result for result in results if isinstance(result, dict)]
+        errors = [error for error in results if isinstance(error, BaseException)]
+        if errors:
+            await self.hass.async_add_executor_job(discard_shards, output_dir, done)
+            raise next(
+                (e for e in errors if not isinstance(e, ExportCancelled)), errors[0]
+            )
+        index = {
+            "export_id": progress.export_id,
+            "kind": progress.kind,
+            "shards": shards,
+            "validation": validation,
+            "dedup_distance": dedup_distance,
+        }
+        await self.hass.async_add_executor_job(finish_shards, output_dir, index, done)
+
+    def cancel(self, export_id: Optional[str] = None) -> int:
+        """Cancel one export, or all of them, and return how many were running."""
+        cancelled = 0
+        for progress in list(self.running.values()):
+            if export_id is None or progress.export_id == export_id:
+                progress.cancel.set()
+                cancelled += 1
+        return cancelled
+
+    def diagnostics(self) -> Dict[str, Any]:
+        """Return the progress of running exports."""
+        return {
+            export_id: progress.as_dict()
+            for export_id, progress in self.running.items()
+        }
+
+    def _fire(self, info: Dict[str, Any]) -> None:
+        """Fire a progress event."""
+        self.hass.bus.async_fire(EVENT_EXPORT, info)
+
+    def _report_threadsafe(self, info: Dict[str, Any]) -> None:
+        """Fire a progress event from the worker thread."""
+        self.hass.loop.call_soon_threadsafe(self._fire, info)
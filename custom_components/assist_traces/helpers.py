@@ -2,8 +2,7 @@
 
 from __future__ import annotations
 
-import hashlib
-from typing import Dict, Iterable, List
+from typing import Any, Dict, List, Optional
 
 
 def summarize_context(ctx: Dict[str, object]) -> Dict[str, object]:
@@ -11,13 +10,10 @@ def summarize_context(ctx: Dict[str, object]) -> Dict[str, object]:
     return {k: v for k, v in ctx.items() if isinstance(v, (int, float, str))}
 
 
-def dedup_simhash(texts: Iterable[str]) -> List[str]:
-    """Very small placeholder for simhash dedup."""
-    seen = set()
-    out: List[str] = []
-    for text in texts:
-        h = hashlib.sha1(text.encode()).hexdigest()
-        if h not in seen:
-            seen.add(h)
-            out.append(text)
-    return out
+def target_entity_ids(parsed_action: Optional[Dict[str, Any]]) -> List[str]:
+    """Return the entity IDs targeted by a parsed action."""
+    target = (parsed_action or {}).get("target") or {}
+    if not isinstance(target, dict) or not target.get("entity_id"):
+        return []
+    eids = target["entity_id"]
+    return list(eids) if isinstance(eids, list) else [eids]
@@ -0,0 +1,309 @@
+"""Queries over the partitioned NDJSON history on disk."""
+
+from __future__ import annotations
+
+import asyncio
+import gzip
+import re
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import (
+    Any,
+    AsyncIterator,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+from homeassistant.core import HomeAssistant
+
+from .cold import ColdIndex
+from .quantiles import QUANTILES, DDSketch
+from .reader import TraceReader
+from .segments import BlockInfo
+from .serialize import dumps, loads
+
+# Trace fields a history query can require to equal a value.
+EQUALITY_FIELDS = ("model", "result", "user_id")
+TEXT_FIELDS = ("user_text", "response_text")
+# Trace ID of a serialized row, read without decoding the line.
+_TRACE_ID = re.compile(rb'"trace_id":("(?:[^"\\]|\\.)*")')
+
+
+@dataclass
+class HistoryQuery:
+    """Predicate and projection of a history scan.
+
+    Times are naive UTC like the partition layout. Equality filters are
+    first checked against the raw JSON line, so most non-matching rows are
+    skipped without being decoded.
+    """
+
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+    model: Optional[str] = None
+    result: Optional[str] = None
+    user_id: Optional[str] = None
+    text: Optional[str] = None
+    fields: Optional[List[str]] = None
+    _needles: List[bytes] = field(default_factory=list, init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        """Precompute the byte patterns of the equality filters.
+
+        Only the serialized value is searched for: legacy files were written
+        with spaces after separators, so the key and value may be apart.
+        """
+        self._needles = [dumps(value) for value in self.equality().values()]
+
+    def equality(self) -> Dict[str, str]:
+        """Return the equality filters that are set."""
+        return {
+            name: getattr(self, name)
+            for name in EQUALITY_FIELDS
+            if getattr(self, name) is not None
+        }
+
+    def bounds(self) -> Tuple[Optional[str], Optional[str]]:
+        """Return the time range as ISO strings for block pruning."""
+        return (
+            self.start.isoformat() if self.start else None,
+            self.end.isoformat() if self.end else None,
+        )
+
+    def prefilter(self, line: bytes) -> bool:
+        """Return False if a raw line certainly does not match."""
+        return all(needle in line for needle in self._needles)
+
+    def matches(self, row: Dict[str, Any]) -> bool:
+        """Return True if a decoded row matches every filter."""
+        if any(row.get(name) != value for name, value in self.equality().items()):
+            return False
+        if self.start is not None or self.end is not None:
+            try:
+                ts = datetime.fromisoformat(row["ts"]).replace(tzinfo=None)
+            except (KeyError, TypeError, ValueError):
+                return False
+            if self.start is not None and ts < self.start:
+                return False
+            if self.end is not None and ts >= self.end:
+                return False
+        if self.text:
+            needle = self.text.casefold()
+            return any(
+                needle in str(row.get(name) or "").casefold() for name in TEXT_FIELDS
+            )
+        return True
+
+    def project(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        """Return the projected fields of a row."""
+        if not self.fields:
+            return row
+        names = [
+            "trace_id",
+            "ts",
+            *(f for f in self.fields if f not in ("trace_id", "ts")),
+        ]
+        return {name: row[name] for name in names if name in row}
+
+
+def latest_lines(
+    path: Path, block: BlockInfo, partition: str, cold: Optional[ColdIndex]
+) -> List[bytes]:
+    """Return the raw lines of a block holding the latest version of a trace.
+
+    Every update of a trace is appended again, so only its last line in a
+    block counts, and none if the cold index points at a newer block.
+    """
+    with open(path, "rb") as f:
+        f.seek(block.offset)
+        data = f.read(block.length)
+    lines = [line for line in gzip.decompress(data).splitlines() if line]
+    last: Dict[Any, int] = {}
+    for i, line in enumerate(lines):
+        match = _TRACE_ID.search(line)
+        last[loads(match.group(1)) if match else i] = i
+    if cold is not None:
+        located = cold.locations([key for key in last if isinstance(key, str)])
+        here = (partition, path.name, block.offset)
+        last = {
+            key: i
+            for key, i in last.items()
+            if not isinstance(key, str) or located.get(key, here) == here
+        }
+    return [lines[i] for i in sorted(last.values())]
+
+
+def _matching_rows(
+    path: Path,
+    block: BlockInfo,
+    query: HistoryQuery,
+    partition: str,
+    cold: Optional[ColdIndex],
+) -> Iterator[Dict[str, Any]]:
+    """Decode one block, yielding only the latest rows matching the query."""
+    for line in latest_lines(path, block, partition, cold):
+        if query.prefilter(line):
+            row = loads(line)
+            if query.matches(row):
+                yield row
+
+
+def scan_block(
+    path: Path,
+    block: BlockInfo,
+    query: HistoryQuery,
+    partition: str = "",
+    cold: Optional[ColdIndex] = None,
+) -> List[Dict[str, Any]]:
+    """Return the projected rows of a block that match the query."""
+    return [
+        query.project(row)
+        for row in _matching_rows(path, block, query, partition, cold)
+    ]
+
+
+@dataclass
+class HistoryAggregate:
+    """Mergeable result counts and latency sketch of a set of rows."""
+
+    count: int = 0
+    counts: Dict[str, int] = field(default_factory=dict)
+    latency: DDSketch = field(default_factory=DDSketch)
+
+    def add(self, row: Dict[str, Any]) -> None:
+        """Account for one row."""
+        self.count += 1
+        result = row.get("result") or "unknown"
+        self.counts[result] = self.counts.get(result, 0) + 1
+        if row.get("latency_ms"):
+            self.latency.add(row["latency_ms"])
+
+    def merge(self, other: HistoryAggregate) -> None:
+        """Fold another aggregate into this one."""
+        self.count += other.count
+        for result, count in other.counts.items():
+            self.counts[result] = self.counts.get(result, 0) + count
+        self.latency.merge(other.latency)
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Return counts by result and latency quantiles."""
+        latency: Dict[str, Any] = {"count": self.latency.count}
+        for q in QUANTILES:
+            value = self.latency.quantile(q)
+            latency[f"p{round(q * 100)}"] = (
+                round(value, 1) if value is not None else None
+            )
+        return {"count": self.count, "counts": self.counts, "latency_ms": latency}
+
+
+def aggregate_block(
+    path: Path,
+    block: BlockInfo,
+    query: HistoryQuery,
+    partition: str = "",
+    cold: Optional[ColdIndex] = None,
+) -> HistoryAggregate:
+    """Return the aggregate of the rows of a block that match the query."""
+    aggregate = HistoryAggregate()
+    for row in _matching_rows(path, block, query, partition, cold):
+        aggregate.add(row)
+    return aggregate
+
+
+class HistoryEngine:
+    """Run history queries block by block on a bounded set of executor jobs.
+
+    Partitions are pruned by time and model from the directory layout and
+    blocks by their indexed time range. At most ``workers`` blocks are
+    decoded concurrently and results are consumed in partition order, so
+    memory stays bounded by a few blocks however much history matches.
+    Only the latest version of each trace is returned or counted; the cold
+    index tells which block holds it.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        reader: TraceReader,
+        workers: int,
+        cold: Optional[ColdIndex] = None,
+    ) -> None:
+        """Initialize the engine for a reader."""
+        self.hass = hass
+        self.reader = reader
+        self.workers = workers
+        self.cold = cold
+
+    def _blocks(
+        self, query: HistoryQuery, partition: Path
+    ) -> List[Tuple[Path, BlockInfo]]:
+        """Return the blocks of a partition overlapping the query range."""
+        lo, hi = query.bounds()
+        return [
+            (path, block)
+            for path, block in self.reader.blocks(partition)
+            if block.overlaps(lo, hi)
+        ]
+
+    async def _run(self, func, query: HistoryQuery) -> AsyncIterator[Any]:
+        """Yield func(path, block, query, ...) for every candidate block in order."""
+        partitions = await self.hass.async_add_executor_job(
+            lambda: list(self.reader.partitions(query.start, query.end, query.model))
+        )
+        pending: Deque[asyncio.Future] = deque()
+        try:
+            for partition in partitions:
+                blocks = await self.hass.async_add_executor_job(
+                    self._blocks, query, partition
+                )
+                name = partition.relative_to(self.reader.directory).as_posix()
+                for path, block in blocks:
+                    pending.append(
+                        self.hass.async_add_executor_job(
+                            func, path, block, query, name, self.cold
+                        )
+                    )
+                    if len(pending) >= self.workers:
+                        yield await pending.popleft()
+            while pending:
+                yield await pending.popleft()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    async def scan(
+        self, query: HistoryQuery, limit: int, chunk_size: int
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Yield chunks of matching rows, oldest partition first, up to limit rows."""
+        chunk: List[Dict[str, Any]] = []
+        remaining = limit
+        blocks = self._run(scan_block, query)
+        try:
+            async for rows in blocks:
+                for row in rows[:remaining]:
+                    chunk.append(row)
+                    if len(chunk) >= chunk_size:
+                        yield chunk
+                        chunk = []
+                remaining -= min(len(rows), remaining)
+                if not remaining:
+                    break
+        finally:
+            # Cancel blocks still queued when the limit is hit or the
+            # client goes away.
+            await blocks.aclose()
+        if chunk:
+            yield chunk
+
+    async def aggregate(self, query: HistoryQuery) -> Dict[str, Any]:
+        """Return counts by result and latency quantiles of matching rows."""
+        total = HistoryAggregate()
+        async for partial in self._run(aggregate_block, query):
+            total.merge(partial)
+        return total.as_dict()
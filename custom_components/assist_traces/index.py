@@ -0,0 +1,171 @@
+"""Secondary indexes over the in-memory trace store."""
+
+from __future__ import annotations
+
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .helpers import target_entity_ids
+from .record import TraceRecord
+
+INDEXED_FIELDS = ("result", "model", "user_id", "session_id")
+FIELD_ENTITY_ID = "entity_id"
+
+# (ts_us, {field: value}, entity_ids, latency_ms) captured when a record
+# was indexed.
+IndexKeys = Tuple[Optional[int], Dict[str, str], Tuple[str, ...], float]
+# (ts_us, trace_id) position of a trace in time order, used as a page cursor.
+Cursor = Tuple[int, str]
+
+
+class TraceIndex:
+    """Time-ordered index plus posting lists by result, model, user and entity.
+
+    The store calls ``add`` and ``remove`` on every insert, update and
+    eviction; the keys a record was indexed under are remembered so an
+    in-place update can be unindexed without knowing the old values. The
+    latency of every indexed record is summed along the way.
+    """
+
+    def __init__(self) -> None:
+        """Initialize empty indexes."""
+        self._by_time: List[Tuple[int, str]] = []
+        self._postings: Dict[str, Dict[str, Set[str]]] = {
+            field: {} for field in (*INDEXED_FIELDS, FIELD_ENTITY_ID)
+        }
+        self._keys: Dict[str, IndexKeys] = {}
+        self.latency_sum = 0.0
+
+    def add(self, trace_id: str, record: TraceRecord, ordered: bool = True) -> None:
+        """Index a record, replacing any entries from a previous version.
+
+        Bulk loaders pass ``ordered=False`` and call ``sort`` once at the end
+        instead of paying for a sorted insert per record.
+        """
+        self.remove(trace_id)
+        values = {}
+        for field in INDEXED_FIELDS:
+            value = record.get(field)
+            if isinstance(value, str):
+                values[field] = value
+                self._postings[field].setdefault(value, set()).add(trace_id)
+        entity_ids = tuple(target_entity_ids(record.get("parsed_action")))
+        for entity_id in entity_ids:
+            self._postings[FIELD_ENTITY_ID].setdefault(entity_id, set()).add(trace_id)
+        if record.ts_us is not None and ordered:
+            insort(self._by_time, (record.ts_us, trace_id))
+        elif record.ts_us is not None:
+            self._by_time.append((record.ts_us, trace_id))
+        latency = record.get("latency_ms")
+        if not isinstance(latency, (int, float)) or isinstance(latency, bool):
+            latency = 0.0
+        self.latency_sum += latency
+        self._keys[trace_id] = (record.ts_us, values, entity_ids, latency)
+
+    def remove(self, trace_id: str) -> None:
+        """Drop every index entry of a trace."""
+        keys = self._keys.pop(trace_id, None)
+        if keys is None:
+            return
+        ts_us, values, entity_ids, latency = keys
+        self.latency_sum -= latency
+        for field, value in values.items():
+            self._discard(field, value, trace_id)
+        for entity_id in entity_ids:
+            self._discard(FIELD_ENTITY_ID, entity_id, trace_id)
+        if ts_us is not None:
+            pos = bisect_left(self._by_time, (ts_us, trace_id))
+            if pos < len(self._by_time) and self._by_time[pos][1] == trace_id:
+                del self._by_time[pos]
+
+    def sort(self) -> None:
+        """Restore time order after unordered adds."""
+        self._by_time.sort()
+
+    def _discard(self, field: str, value: str, trace_id: str) -> None:
+        """Remove a trace from one posting list, dropping the list when empty."""
+        ids = self._postings[field].get(value)
+        if ids is None:
+            return
+        ids.discard(trace_id)
+        if not ids:
+            del self._postings[field][value]
+
+    def lookup(self, field: str, value: str) -> Set[str]:
+        """Return the IDs of traces whose field equals value."""
+        return self._postings[field].get(value, set())
+
+    def counts(self, field: str) -> Dict[str, int]:
+        """Return the number of traces per value of a field."""
+        return {value: len(ids) for value, ids in self._postings[field].items()}
+
+    def range(
+        self,
+        start_us: Optional[int] = None,
+        end_us: Optional[int] = None,
+        newest_first: bool = False,
+        after: Optional[Cursor] = None,
+        before: Optional[Cursor] = None,
+    ) -> Iterable[str]:
+        """Yield IDs of traces with start_us <= ts < end_us in time order.
+
+        ``after`` and ``before`` are exclusive cursors further narrowing the
+        range, so a page can resume exactly where the previous one ended.
+        """
+        lo, hi = self._bounds(start_us, end_us)
+        if after is not None:
+            lo = max(lo, bisect_right(self._by_time, after))
+        if before is not None:
+            hi = min(hi, bisect_left(self._by_time, before))
+        if newest_first:
+            return (self._by_time[i][1] for i in range(hi - 1, lo - 1, -1))
+        return (self._by_time[i][1] for i in range(lo, hi))
+
+    def count(
+        self, start_us: Optional[int] = None, end_us: Optional[int] = None
+    ) -> int:
+        """Return the number of traces with start_us <= ts < end_us."""
+        lo, hi = self._bounds(start_us, end_us)
+        return hi - lo
+
+    def _bounds(
+        self, start_us: Optional[int], end_us: Optional[int]
+    ) -> Tuple[int, int]:
+        """Return the slice of the time index covering [start_us, end_us)."""
+        lo = 0 if start_us is None else bisect_left(self._by_time, (start_us, ""))
+        hi = (
+            len(self._by_time)
+            if end_us is None
+            else bisect_left(self._by_time, (end_us, ""))
+        )
+        return lo, hi
+
+    def query(
+        self,
+        start_us: Optional[int] = None,
+        end_us: Optional[int] = None,
+        filters: Optional[Dict[str, str]] = None,
+        newest_first: bool = False,
+        after: Optional[Cursor] = None,
+        before: Optional[Cursor] = None,
+    ) -> List[str]:
+        """Return IDs in a time range matching every field filter, in time order."""
+        if not filters:
+            return list(self.range(start_us, end_us, newest_first, after, before))
+        postings = sorted(
+            (self.lookup(field, value) for field, value in filters.items()), key=len
+        )
+        ids = set(postings[0]).intersection(*postings[1:])
+        hits = []
+        for trace_id in ids:
+            ts_us = self._keys[trace_id][0]
+            if ts_us is None:
+                continue
+            if (start_us is None or ts_us >= start_us) and (
+                end_us is None or ts_us < end_us
+            ):
+                key = (ts_us, trace_id)
+                if (after is None or key > after) and (before is None or key < before):
+                    hits.append(key)
+        hits.sort(reverse=newest_first)
+        return [trace_id for _, trace_id in hits]
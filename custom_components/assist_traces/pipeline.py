@@ -8,7 +8,7 @@ from typing import Any, Dict
 from homeassistant.components import assist_pipeline
 from homeassistant.core import HomeAssistant
 
-from .const import DATA_TRACES, DATA_WRITER
+from .const import DATA_TRACES, DOMAIN
 
 
 async def async_setup_pipeline_tracing(hass: HomeAssistant) -> None:
@@ -43,11 +43,16 @@ async def async_setup_pipeline_tracing(hass: HomeAssistant) -> None:
                     trace["trace_id"] = trace_id
                     trace.setdefault("model", "assist-pipeline")
                     hass.data[DATA_TRACES][trace_id] = trace
-                    writer = hass.data.get(DATA_WRITER)
-                    if writer is not None:
-                        hass.async_create_task(writer.enqueue(trace))
 
-            return await original(*args, event_callback=_capture, **kwargs)
+            try:
+                return await original(*args, event_callback=_capture, **kwargs)
+            finally:
+                # Queued here rather than in a task per trace, so a full
+                # queue with the block policy holds up this pipeline run
+                # instead of piling up pending tasks.
+                redaction = hass.data.get(DOMAIN, {}).get("redaction")
+                if "trace_id" in trace and redaction is not None:
+                    await redaction.enqueue(trace)
 
         traced._assist_traces_wrapped = True
         return traced
@@ -0,0 +1,240 @@
+"""Streaming latency quantiles for end-to-end and per-stage timings."""
+
+from __future__ import annotations
+
+import math
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from .record import TraceRecord
+
+METRIC_LATENCY = "latency_ms"
+# Pipeline event stage prefix -> metric name.
+STAGES = {
+    "wake_word": "wake_ms",
+    "stt": "stt_ms",
+    "intent": "intent_ms",
+    "tts": "tts_ms",
+}
+METRICS = (METRIC_LATENCY, *STAGES.values())
+LABEL_ALL = "all"
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+class DDSketch:
+    """Mergeable quantile sketch with bounded relative error.
+
+    Values are counted in logarithmic buckets so every quantile is within
+    ``alpha`` relative error of an actual value. When more than
+    ``max_buckets`` are in use the lowest buckets are collapsed, which keeps
+    memory bounded and only costs accuracy at the bottom of the
+    distribution rather than in the tail.
+    """
+
+    def __init__(self, alpha: float = 0.01, max_buckets: int = 2048) -> None:
+        """Initialize an empty sketch."""
+        self.alpha = alpha
+        self.max_buckets = max_buckets
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self._log_gamma = math.log(self.gamma)
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, value: float, weight: int = 1) -> None:
+        """Record a non-negative value."""
+        self.count += weight
+        if value <= 0:
+            self.zero_count += weight
+            return
+        key = math.ceil(math.log(value) / self._log_gamma)
+        self.bins[key] = self.bins.get(key, 0) + weight
+        if len(self.bins) > self.max_buckets:
+            self._collapse()
+
+    def merge(self, other: DDSketch) -> None:
+        """Fold another sketch with the same accuracy into this one."""
+        self.count += other.count
+        self.zero_count += other.zero_count
+        for key, weight in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + weight
+        if len(self.bins) > self.max_buckets:
+            self._collapse()
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Return the approximate q-quantile, or None if the sketch is empty."""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if rank < seen:
+                return 2 * self.gamma**key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.bins) / (self.gamma + 1)
+
+    def _collapse(self) -> None:
+        """Merge the lowest buckets until the bucket limit is met."""
+        keys = sorted(self.bins)
+        excess = len(keys) - self.max_buckets
+        target = keys[excess]
+        for key in keys[:excess]:
+            self.bins[target] += self.bins.pop(key)
+
+
+def _parse_ts(value: Any) -> Optional[datetime]:
+    """Parse an event timestamp."""
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def stage_durations(events: Iterable[Dict[str, Any]]) -> Dict[str, float]:
+    """Return stage durations in ms from captured Assist pipeline events."""
+    starts: Dict[str, datetime] = {}
+    durations: Dict[str, float] = {}
+    for event in events:
+        stage, _, edge = str(event.get("type", "")).rpartition("-")
+        if stage not in STAGES:
+            continue
+        ts = _parse_ts(event.get("timestamp"))
+        if ts is None:
+            continue
+        if edge == "start":
+            starts[stage] = ts
+        elif edge == "end" and stage in starts:
+            elapsed = (ts - starts.pop(stage)).total_seconds() * 1000
+            durations[STAGES[stage]] = max(elapsed, 0.0)
+    return durations
+
+
+def _pipeline_id(events: Iterable[Dict[str, Any]]) -> Optional[str]:
+    """Return the pipeline ID announced by the run-start event."""
+    for event in events:
+        if event.get("type") == "run-start":
+            pipeline = (event.get("data") or {}).get("pipeline")
+            return str(pipeline) if pipeline else None
+    return None
+
+
+class LatencyQuantiles:
+    """DDSketches per metric and label over a sliding window of hourly slots.
+
+    Labels are ``all``, ``model:<model>`` and ``pipeline:<pipeline id>``.
+    Each trace is observed once, as soon as it carries a latency or stage
+    timings. Reads merge the slots still in the window; memory is bounded
+    by slots x metrics x labels x ``max_buckets``.
+    """
+
+    def __init__(
+        self,
+        window_s: int = 24 * 3600,
+        slot_s: int = 3600,
+        alpha: float = 0.01,
+        max_buckets: int = 2048,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        """Initialize empty sketches."""
+        self.window_s = window_s
+        self.slot_s = slot_s
+        self.alpha = alpha
+        self.max_buckets = max_buckets
+        self._clock = clock
+        self._slots: Dict[int, Dict[Tuple[str, str], DDSketch]] = {}
+        self._seen: Dict[int, Set[str]] = {}
+        self._merged: Dict[Tuple[str, str], DDSketch] = {}
+
+    def update(self, trace_id: str, record: TraceRecord) -> None:
+        """Observe the timings of an inserted or updated trace."""
+        if record.ts_us is None:
+            return
+        slot = record.ts_us // (self.slot_s * 1_000_000)
+        if slot <= self._expire() or trace_id in self._seen.get(slot, ()):
+            return
+        values: Dict[str, float] = {}
+        latency = record.get(METRIC_LATENCY)
+        if latency:
+            values[METRIC_LATENCY] = latency
+        labels = [LABEL_ALL]
+        model = record.get("model")
+        if model:
+            labels.append(f"model:{model}")
+        events = record.get("events")
+        if events:
+            values.update(stage_durations(events))
+            pipeline = _pipeline_id(events)
+            if pipeline:
+                labels.append(f"pipeline:{pipeline}")
+        if not values:
+            return
+        self._seen.setdefault(slot, set()).add(trace_id)
+        sketches = self._slots.setdefault(slot, {})
+        for metric, value in values.items():
+            for label in labels:
+                sketch = sketches.get((metric, label))
+                if sketch is None:
+                    sketch = sketches[(metric, label)] = DDSketch(
+                        self.alpha, self.max_buckets
+                    )
+                sketch.add(value)
+                self._merged.pop((metric, label), None)
+
+    def quantile(
+        self, metric: str, q: float, label: str = LABEL_ALL
+    ) -> Optional[float]:
+        """Return the q-quantile of a metric over the window."""
+        sketch = self._sketch(metric, label)
+        value = sketch.quantile(q) if sketch is not None else None
+        return round(value, 1) if value is not None else None
+
+    def summary(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """Return count and p50/p90/p99 for every metric and label."""
+        self._expire()
+        keys = sorted({key for sketches in self._slots.values() for key in sketches})
+        out: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for metric, label in keys:
+            sketch = self._sketch(metric, label)
+            if sketch is None:
+                continue
+            entry: Dict[str, Any] = {"count": sketch.count}
+            for q in QUANTILES:
+                value = sketch.quantile(q)
+                entry[f"p{round(q * 100)}"] = (
+                    round(value, 1) if value is not None else None
+                )
+            out.setdefault(metric, {})[label] = entry
+        return out
+
+    def _sketch(self, metric: str, label: str) -> Optional[DDSketch]:
+        """Return the sketch of a metric and label merged across the window."""
+        self._expire()
+        key = (metric, label)
+        merged = self._merged.get(key)
+        if merged is None:
+            parts: List[DDSketch] = [
+                sketches[key] for sketches in self._slots.values() if key in sketches
+            ]
+            if not parts:
+                return None
+            merged = DDSketch(self.alpha, self.max_buckets)
+            for part in parts:
+                merged.merge(part)
+            self._merged[key] = merged
+        return merged
+
+    def _expire(self) -> int:
+        """Drop slots that slid out of the window and return the cutoff slot."""
+        cutoff = int(self._clock() // self.slot_s) - self.window_s // self.slot_s
+        expired = [slot for slot in self._slots if slot <= cutoff]
+        for slot in expired:
+            del self._slots[slot]
+            self._seen.pop(slot, None)
+        if expired:
+            self._merged.clear()
+        return cutoff
@@ -0,0 +1,166 @@
+"""Random-access reads from partitioned NDJSON trace segments."""
+
+from __future__ import annotations
+
+import gzip
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .cold import ColdEntry
+from .const import DEFAULT_PARTITIONING, PARTITION_HOURLY
+from .segments import (
+    LEGACY_SEGMENT,
+    BlockInfo,
+    PartitionManifest,
+    index_legacy_segment,
+    read_block_index,
+)
+from .serialize import loads
+
+
+def read_block(path: Path, block: BlockInfo) -> List[Dict[str, Any]]:
+    """Decode the rows of a single gzip member without reading its neighbours."""
+    with open(path, "rb") as f:
+        f.seek(block.offset)
+        data = f.read(block.length)
+    return [loads(line) for line in gzip.decompress(data).splitlines() if line]
+
+
+def _bounds(parts: List[int]) -> Optional[Tuple[datetime, datetime]]:
+    """Return the time window covered by a year/month/day/hour path prefix."""
+    try:
+        if len(parts) == 1:
+            return datetime(parts[0], 1, 1), datetime(parts[0] + 1, 1, 1)
+        if len(parts) == 2:
+            start = datetime(parts[0], parts[1], 1)
+            return start, (start + timedelta(days=32)).replace(day=1)
+        start = datetime(*parts)
+    except ValueError:
+        return None
+    if len(parts) == 3:
+        return start, start + timedelta(days=1)
+    return start, start + timedelta(hours=1)
+
+
+def _children(path: Path, reverse: bool) -> List[Path]:
+    """Return the numeric subdirectories of a path in chronological order."""
+    if not path.is_dir():
+        return []
+    return sorted(
+        (p for p in path.iterdir() if p.is_dir() and p.name.isdigit()),
+        key=lambda p: int(p.name),
+        reverse=reverse,
+    )
+
+
+class TraceReader:
+    """Locate and decode traces written by TraceWriter."""
+
+    def __init__(self, directory: str, partitioning: str = DEFAULT_PARTITIONING):
+        """Initialize the reader for a sink directory."""
+        self.directory = Path(directory)
+        self.partitioning = partitioning
+
+    def partitions(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        model: Optional[str] = None,
+        newest_first: bool = False,
+    ) -> Iterator[Path]:
+        """Yield partition directories overlapping [start, end) for a model."""
+        levels = 4 if self.partitioning == PARTITION_HOURLY else 3
+
+        def walk(path: Path, parts: List[int]) -> Iterator[Path]:
+            if len(parts) == levels:
+                models = sorted(path.glob("model=*"), reverse=newest_first)
+                for partition in models:
+                    if model is None or partition.name == f"model={model}":
+                        yield partition
+                return
+            for child in _children(path, newest_first):
+                bounds = _bounds(parts + [int(child.name)])
+                if bounds is None:
+                    continue
+                if start is not None and bounds[1] <= start:
+                    continue
+                if end is not None and bounds[0] >= end:
+                    continue
+                yield from walk(child, parts + [int(child.name)])
+
+        yield from walk(self.directory, [])
+
+    def blocks(
+        self, partition: Path, newest_first: bool = False
+    ) -> Iterator[Tuple[Path, BlockInfo]]:
+        """Yield every indexed block of a partition with its segment path.
+
+        A legacy ``part.jsonl.gz`` from before segments is read as the
+        oldest segment and indexed on first use.
+        """
+        names = [seg.name for seg in PartitionManifest.load(partition).segments]
+        if not names:
+            names = sorted(p.name for p in partition.glob("part-*.jsonl.gz"))
+        if (partition / LEGACY_SEGMENT).exists():
+            names.insert(0, LEGACY_SEGMENT)
+        if newest_first:
+            names.reverse()
+        for name in names:
+            if name == LEGACY_SEGMENT:
+                blocks = index_legacy_segment(partition)
+            else:
+                blocks = list(read_block_index(partition, name))
+            if newest_first:
+                blocks.reverse()
+            for block in blocks:
+                yield partition / name, block
+
+    def read_entry(self, entry: ColdEntry) -> Optional[Dict[str, Any]]:
+        """Return the trace a cold index entry points at."""
+        path = self.directory / entry.partition / entry.segment
+        if not path.exists():
+            return None
+        for row in reversed(read_block(path, entry.block)):
+            if row.get("trace_id") == entry.trace_id:
+                return row
+        return None
+
+    def find_trace(
+        self, trace_id: str, ts: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Return a trace by ID, decoding only the block that contains it.
+
+        A timestamp hint restricts the search to the partition holding it;
+        otherwise partitions are searched newest first.
+        """
+        start = end = None
+        if ts:
+            start = datetime.fromisoformat(ts).replace(tzinfo=None)
+            end = start + timedelta(microseconds=1)
+        for partition in self.partitions(start, end, newest_first=True):
+            for path, block in self.blocks(partition, newest_first=True):
+                if trace_id not in block.trace_ids:
+                    continue
+                for row in reversed(read_block(path, block)):
+                    if row.get("trace_id") == trace_id:
+                        return row
+        return None
+
+    def read_range(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        model: Optional[str] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """Yield traces with start <= ts < end, skipping non-overlapping blocks."""
+        lo = start.isoformat() if start else None
+        hi = end.isoformat() if end else None
+        for partition in self.partitions(start, end, model):
+            for path, block in self.blocks(partition):
+                if not block.overlaps(lo, hi):
+                    continue
+                for row in read_block(path, block):
+                    ts = datetime.fromisoformat(row["ts"]).replace(tzinfo=None)
+                    if (start is None or ts >= start) and (end is None or ts < end):
+                        yield row
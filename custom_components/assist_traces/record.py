@@ -0,0 +1,220 @@
+"""Compact in-memory representation of a stored trace."""
+
+from __future__ import annotations
+
+import sys
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .serialize import dumps, loads
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+HOT_FIELDS = ("trace_id", "model", "result", "user_id", "session_id", "latency_ms")
+HEAVY_FIELDS = frozenset(
+    {"prompt_rendered", "events", "context", "entities", "tool_calls", "ha_events"}
+)
+INTERNED_FIELDS = frozenset({"model", "result", "user_id"})
+_MISSING = object()
+
+
+def to_epoch_us(ts: Any) -> Optional[int]:
+    """Return a datetime or ISO timestamp as integer microseconds since the epoch."""
+    if isinstance(ts, str):
+        try:
+            ts = datetime.fromisoformat(ts)
+        except ValueError:
+            return None
+    if not isinstance(ts, datetime):
+        return None
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return (ts - EPOCH) // timedelta(microseconds=1)
+
+
+def from_epoch_us(ts_us: int, naive: bool = False) -> str:
+    """Return epoch microseconds as an ISO timestamp in UTC."""
+    ts = EPOCH + timedelta(microseconds=ts_us)
+    return (ts.replace(tzinfo=None) if naive else ts).isoformat()
+
+
+def _sizeof(value: Any) -> int:
+    """Return the approximate footprint of a field value in bytes."""
+    if value is None or isinstance(value, (str, bytes, int, float)):
+        return sys.getsizeof(value)
+    return len(dumps(value))
+
+
+class TraceRecord:
+    """Slotted trace with interned labels, epoch timestamps and packed heavy fields.
+
+    Fields that every query touches live in slots. Rarely read, bulky fields
+    are kept as a single compressed JSON blob and decoded on access; the rest stay
+    in a small dict. Records read like the trace dicts they replace and are
+    converted back with ``to_dict`` where traces leave the store.
+    """
+
+    __slots__ = (*HOT_FIELDS, "ts_us", "_naive", "_extra", "_heavy", "_size")
+
+    def __init__(self) -> None:
+        """Initialize an empty record."""
+        for name in HOT_FIELDS:
+            setattr(self, name, _MISSING)
+        self.ts_us: Optional[int] = None
+        self._naive = False
+        self._extra: Dict[str, Any] = {}
+        self._heavy: Optional[bytes] = None
+        self._size: Optional[int] = None
+
+    @classmethod
+    def from_dict(cls, trace: Dict[str, Any]) -> TraceRecord:
+        """Build a record from a trace dict."""
+        record = cls()
+        record.update(trace)
+        return record
+
+    @property
+    def epoch(self) -> Optional[float]:
+        """Return the trace timestamp in seconds since the epoch."""
+        return None if self.ts_us is None else self.ts_us / 1_000_000
+
+    def update(self, fields: Dict[str, Any]) -> None:
+        """Set top-level fields, repacking heavy fields only when they change."""
+        self._size = None
+        heavy = {}
+        for key, value in fields.items():
+            if key in HEAVY_FIELDS:
+                heavy[key] = value
+            elif key == "ts":
+                self._set_ts(value)
+            elif key in INTERNED_FIELDS and isinstance(value, str):
+                setattr(self, key, sys.intern(value))
+            elif key in HOT_FIELDS:
+                setattr(self, key, value)
+            else:
+                self._extra[key] = value
+        if heavy:
+            if self._heavy is not None:
+                heavy = {**self.heavy(), **heavy}
+            self._heavy = zlib.compress(dumps(heavy), 1)
+
+    def _set_ts(self, value: Any) -> None:
+        """Store a timestamp as epoch microseconds, keeping unparseable values as-is."""
+        ts = value
+        if isinstance(ts, str):
+            try:
+                ts = datetime.fromisoformat(ts)
+            except ValueError:
+                ts = None
+        if not isinstance(ts, datetime):
+            self.ts_us = None
+            self._extra["ts"] = value
+            return
+        self._extra.pop("ts", None)
+        self._naive = ts.tzinfo is None
+        self.ts_us = to_epoch_us(ts)
+
+    def heavy(self) -> Dict[str, Any]:
+        """Decode and return the packed heavy fields."""
+        if self._heavy is None:
+            return {}
+        return loads(zlib.decompress(self._heavy))
+
+    def __getitem__(self, key: str) -> Any:
+        """Return a field the same way the trace dict would."""
+        if key in HOT_FIELDS:
+            value = getattr(self, key)
+            if value is _MISSING:
+                raise KeyError(key)
+            return value
+        if key == "ts" and self.ts_us is not None:
+            return from_epoch_us(self.ts_us, self._naive)
+        if key in HEAVY_FIELDS:
+            return self.heavy()[key]
+        return self._extra[key]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Return a field, or default if it is not set."""
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key: object) -> bool:
+        """Return True if the field is set."""
+        if key in HOT_FIELDS:
+            return getattr(self, key) is not _MISSING  # type: ignore[arg-type]
+        if key == "ts" and self.ts_us is not None:
+            return True
+        if key in HEAVY_FIELDS:
+            return self._heavy is not None and key in self.heavy()
+        return key in self._extra
+
+    def keys(self) -> Iterator[str]:
+        """Yield the names of the fields that are set."""
+        yield from self.to_dict()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Materialize the record as a plain trace dict."""
+        trace: Dict[str, Any] = {}
+        for name in HOT_FIELDS:
+            value = getattr(self, name)
+            if value is not _MISSING:
+                trace[name] = value
+        if self.ts_us is not None:
+            trace["ts"] = from_epoch_us(self.ts_us, self._naive)
+        trace.update(self._extra)
+        trace.update(self.heavy())
+        return trace
+
+    def project(self, fields: Iterable[str]) -> Dict[str, Any]:
+        """Return only the given fields, decoding heavy fields at most once."""
+        heavy: Optional[Dict[str, Any]] = None
+        trace: Dict[str, Any] = {}
+        for name in fields:
+            if name in HEAVY_FIELDS:
+                if heavy is None:
+                    heavy = self.heavy()
+                if name in heavy:
+                    trace[name] = heavy[name]
+            elif name in self:
+                trace[name] = self[name]
+        return trace
+
+    def pack(self) -> Tuple[List[Any], bytes]:
+        """Return the record as a JSON-encodable row plus its heavy blob."""
+        hot = {}
+        for name in HOT_FIELDS:
+            value = getattr(self, name)
+            if value is not _MISSING:
+                hot[name] = value
+        row = [hot, self.ts_us, self._naive, dict(self._extra), self.nbytes()]
+        return row, self._heavy or b""
+
+    @classmethod
+    def unpack(cls, row: List[Any], heavy: bytes) -> TraceRecord:
+        """Rebuild a record from the output of ``pack``."""
+        record = cls()
+        hot, record.ts_us, record._naive, record._extra, record._size = row
+        for name, value in hot.items():
+            if name in INTERNED_FIELDS and isinstance(value, str):
+                value = sys.intern(value)
+            setattr(record, name, value)
+        record._heavy = heavy or None
+        return record
+
+    def nbytes(self) -> int:
+        """Return the approximate memory footprint of the record in bytes."""
+        if self._size is not None:
+            return self._size
+        size = sys.getsizeof(self) + sys.getsizeof(self._extra)
+        size += sys.getsizeof(self.trace_id) + sys.getsizeof(self.session_id)
+        size += sum(_sizeof(v) for v in self._extra.values())
+        if self._heavy is not None:
+            size += sys.getsizeof(self._heavy)
+        self._size = size
+        return size
+
+    def __repr__(self) -> str:
+        """Return a short description of the record."""
+        return f"TraceRecord(trace_id={self.get('trace_id')!r}, ts={self.get('ts')!r})"
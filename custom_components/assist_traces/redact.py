@@ -2,8 +2,14 @@
 
 from __future__ import annotations
 
+import hashlib
 import re
-from typing import Any, Dict, Iterable
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 BASIC_PATTERNS = {
     "<EMAIL>": re.compile(r"[\w.%-]+@[\w.-]+"),
@@ -15,38 +21,338 @@ BASIC_PATTERNS = {
     "<ADDR>": re.compile(r"\d{1,4} [A-Za-z0-9 .]{3,}"),
 }
 
-STRICT_KEYS = {"user", "owner", "household_members", "user_id"}
+STRICT_KEYS = {"user", "owner", "household_members"}
+# Identifiers replaced by a stable pseudonym, so history stays filterable.
+PSEUDONYM_KEYS = {"user_id"}
+# Identifiers and timestamps the writer partitions by; dates look like phones.
+KEEP_KEYS = {"trace_id", "ts", "timestamp", "model"}
+
+# Text every match of a basic pattern contains, checked before scanning.
+HINTS = {
+    "<EMAIL>": "@",
+    "<PHONE>": r"\d",
+    "<IP>": r"\d",
+    "<MAC>": "[:-]",
+    "<URL>": "://",
+    "<SSID>": "(?i)ssid-",
+    "<ADDR>": r"\d",
+}
+_HINTS = [
+    (re.compile(hint), tuple(t for t in BASIC_PATTERNS if HINTS[t] == hint))
+    for hint in dict.fromkeys(HINTS.values())
+]
 
 
-def _redact_string(text: str, patterns: Dict[str, re.Pattern]) -> str:
-    """Replace occurrences of patterns in a string with tokens."""
-    for token, pattern in patterns.items():
-        text = pattern.sub(token, text)
+def scan(text: str) -> str:
+    """Replace every basic pattern in text with its token.
+
+    Patterns run one after another in their listed order, so a URL, e-mail
+    or IP is replaced before the address pattern can claim its leading
+    digits. Only patterns whose hint occurs in the text are run; tokens
+    contain no hint text, so skipping the others never changes the result.
+    """
+    tokens = set()
+    for hint, hinted in _HINTS:
+        if hint.search(text):
+            tokens.update(hinted)
+    for token, pattern in BASIC_PATTERNS.items():
+        if token in tokens:
+            text = pattern.sub(token, text)
     return text
 
 
-def _redact_recursive(
-    data: Any, patterns: Dict[str, re.Pattern], names: Iterable[str]
-) -> Any:
-    """Recursively redact strings within nested structures."""
-    if isinstance(data, str):
-        red = _redact_string(data, patterns)
-        for idx, name in enumerate(names):
-            if name and name.lower() in red.lower():
-                red = re.sub(re.escape(name), f"<NAME_{idx}>", red, flags=re.IGNORECASE)
-        return red
-    if isinstance(data, list):
-        return [_redact_recursive(v, patterns, names) for v in data]
-    if isinstance(data, dict):
-        new = {}
-        for k, v in data.items():
-            new_key = _redact_string(k, patterns)
-            names_for_field = names
-            if k in STRICT_KEYS and isinstance(v, str):
-                names_for_field = list(names) + [v]
-            new[new_key] = _redact_recursive(v, patterns, names_for_field)
-        return new
-    return data
+@lru_cache(maxsize=1024)
+def pseudonym(value: str) -> str:
+    """Return the stable stand-in written to disk for an identifier.
+
+    Values that already are pseudonyms are returned unchanged, so a filter
+    can be given either the identifier or a value read back from history.
+    """
+    if value.startswith("<USER_") and value.endswith(">"):
+        return value
+    return f"<USER_{hashlib.sha256(value.encode()).hexdigest()[:16]}>"
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """Return a regex matching any of the words, built from their prefix trie.
+
+    Shared prefixes are matched once instead of retrying every word at
+    every position, and the longest word wins where several match.
+    """
+    trie: Dict[str, Any] = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: Dict[str, Any]) -> str:
+        alternatives = [
+            re.escape(char) + build(child)
+            for char, child in sorted(node.items())
+            if char
+        ]
+        if not alternatives:
+            return ""
+        end = "" in node
+        if len(alternatives) == 1 and not end:
+            return alternatives[0]
+        return f"(?:{'|'.join(alternatives)}){'?' if end else ''}"
+
+    return build(trie)
+
+
+@lru_cache(maxsize=64)
+def name_matcher(
+    names: Tuple[str, ...],
+) -> Optional[Tuple[re.Pattern, Dict[str, int]]]:
+    """Return a case-insensitive matcher for names and each name's index."""
+    index: Dict[str, int] = {}
+    for idx, name in enumerate(names):
+        if name:
+            index.setdefault(name.lower(), idx)
+    if not index:
+        return None
+    return re.compile(_trie_pattern(index), re.IGNORECASE), index
+
+
+# Bounds of the shared cache of redacted strings.
+CACHE_ENTRIES = 8192
+CACHE_CHARS = 4_000_000
+# Longer multi-line strings are cached line by line.
+SPLIT_CHARS = 512
+# Newlines no pattern match can span: phone numbers may run across
+# whitespace, but only between digits, spaces and dashes.
+_SPLIT = re.compile(r"(?<![\d\s-])\n|\n(?![\d\s-])")
+_UNCHANGED = object()
+
+CacheKey = Tuple[str, Tuple[str, ...], str]
+
+
+@dataclass
+class CacheStats:
+    """Counters describing redaction cache use."""
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+
+class RedactionCache:
+    """Bounded LRU of redacted strings shared by every redactor.
+
+    Entries are keyed by level, known names and the text itself, so the
+    rendered prompt, entity names and keys that recur in every trace are
+    redacted once per process. The cache is bounded by entry count and by
+    the characters it holds, and may be used from several executor threads.
+    """
+
+    def __init__(
+        self, max_entries: int = CACHE_ENTRIES, max_chars: int = CACHE_CHARS
+    ) -> None:
+        """Initialize an empty cache."""
+        self.max_entries = max_entries
+        self.max_chars = max_chars
+        self.chars = 0
+        self.stats = CacheStats()
+        self._entries: OrderedDict[CacheKey, Any] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: CacheKey) -> Any:
+        """Return the cached result for a key, or None."""
+        with self._lock:
+            result = self._entries.get(key)
+            if result is None:
+                self.stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            return result
+
+    def put(self, key: CacheKey, result: Any) -> None:
+        """Store a result, evicting the least recently used entries."""
+        size = _size(key, result)
+        if size > self.max_chars:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.chars -= _size(key, old)
+            self._entries[key] = result
+            self.chars += size
+            while len(self._entries) > self.max_entries or self.chars > self.max_chars:
+                evicted_key, evicted = self._entries.popitem(last=False)
+                self.chars -= _size(evicted_key, evicted)
+                self.stats.evictions += 1
+
+    def clear(self) -> None:
+        """Drop every entry."""
+        with self._lock:
+            self._entries.clear()
+            self.chars = 0
+
+    def diagnostics(self) -> Dict[str, Any]:
+        """Return size, counters and hit rate."""
+        lookups = self.stats.hits + self.stats.misses
+        return {
+            "entries": len(self._entries),
+            "chars": self.chars,
+            **asdict(self.stats),
+            "hit_rate": round(self.stats.hits / lookups, 3) if lookups else None,
+        }
+
+
+def _size(key: CacheKey, result: Any) -> int:
+    """Return the characters an entry holds."""
+    return len(key[2]) + (len(result) if isinstance(result, str) else 0)
+
+
+CACHE = RedactionCache()
+
+
+class Redactor:
+    """Compiled redaction for one level and set of known names.
+
+    Strings are scanned once for every basic pattern and once for every
+    known name, and results are memoized in ``cache``. Structures are
+    walked with an explicit stack and copied on write: a container is only
+    rebuilt when something inside it changed.
+    """
+
+    def __init__(
+        self,
+        level: str,
+        names: Tuple[str, ...] = (),
+        cache: Optional[RedactionCache] = CACHE,
+    ) -> None:
+        """Initialize the redactor."""
+        self.level = level
+        self.names = names
+        self.patterns = level in {"basic", "strict"}
+        self.cache = cache
+
+    def string(self, text: str, names: Tuple[str, ...]) -> str:
+        """Redact patterns and then known names in a string.
+
+        Long multi-line strings such as rendered prompts differ between
+        runs in a line or two (the current time, a changed state), so they
+        are redacted and cached per line wherever a line break cannot be
+        part of a match.
+        """
+        if self.cache is None:
+            return self._string(text, names)
+        if (
+            len(text) > SPLIT_CHARS
+            and "\n" in text
+            and not any("\n" in name for name in names)
+        ):
+            ends = [m.end() for m in _SPLIT.finditer(text)]
+            if ends:
+                lines = [text[i:j] for i, j in zip([0, *ends], [*ends, len(text)])]
+                out = [self._cached(line, names) for line in lines]
+                if all(new is old for new, old in zip(out, lines)):
+                    return text
+                return "".join(out)
+        return self._cached(text, names)
+
+    def _cached(self, text: str, names: Tuple[str, ...]) -> str:
+        """Return the redacted string from the cache, redacting on a miss."""
+        assert self.cache is not None
+        key = (self.level, names, text)
+        result = self.cache.get(key)
+        if result is None:
+            result = self._string(text, names)
+            # Unchanged text is returned as the caller's object so that
+            # copy-on-write keeps its container.
+            self.cache.put(key, _UNCHANGED if result == text else result)
+            return result
+        return text if result is _UNCHANGED else result
+
+    def _string(self, text: str, names: Tuple[str, ...]) -> str:
+        """Redact patterns and then known names in a string, uncached."""
+        if self.patterns:
+            text = scan(text)
+        matcher = name_matcher(names) if names else None
+        if matcher is not None:
+            pattern, index = matcher
+            lowered = text.lower()
+            if not any(name in lowered for name in index):
+                return text
+            text = pattern.sub(lambda m: f"<NAME_{index[m.group().lower()]}>", text)
+        return text
+
+    def key(self, key: Any) -> Any:
+        """Redact patterns in a mapping key."""
+        if not self.patterns or not isinstance(key, str):
+            return key
+        return self.string(key, ())
+
+    def __call__(self, data: Any) -> Any:
+        """Return data with every string redacted."""
+        if isinstance(data, str):
+            return self.string(data, self.names)
+        if not isinstance(data, (dict, list)):
+            return data
+        stack = [_Frame(data)]
+        while True:
+            frame = stack[-1]
+            if frame.pos == len(frame.items):
+                stack.pop()
+                done = frame.src if frame.out is None else frame.out
+                if not stack:
+                    return done
+                stack[-1].put(self, done)
+                continue
+            key, value = frame.items[frame.pos]
+            if frame.is_dict and key in KEEP_KEYS:
+                frame.put(self, value)
+            elif isinstance(value, (dict, list)):
+                stack.append(_Frame(value))
+            elif isinstance(value, str) and key in PSEUDONYM_KEYS and frame.is_dict:
+                frame.put(self, pseudonym(value))
+            elif isinstance(value, str):
+                names = self.names
+                if key in STRICT_KEYS and frame.is_dict:
+                    names = (*names, value)
+                frame.put(self, self.string(value, names))
+            else:
+                frame.put(self, value)
+
+
+class _Frame:
+    """A container being walked by ``Redactor``."""
+
+    __slots__ = ("src", "is_dict", "items", "pos", "out")
+
+    def __init__(self, src: Any) -> None:
+        """Start walking a dict or list."""
+        self.src = src
+        self.is_dict = isinstance(src, dict)
+        self.items: List[Tuple[Any, Any]] = (
+            list(src.items()) if self.is_dict else list(enumerate(src))
+        )
+        self.pos = 0
+        self.out: Any = None
+
+    def put(self, redactor: Redactor, value: Any) -> None:
+        """Record the redacted value of the current item and advance."""
+        key, old = self.items[self.pos]
+        new_key = redactor.key(key) if self.is_dict else key
+        if self.out is None and (value is not old or new_key != key):
+            done = self.items[: self.pos]
+            self.out = dict(done) if self.is_dict else [v for _, v in done]
+        if self.out is not None:
+            if self.is_dict:
+                self.out[new_key] = value
+            else:
+                self.out.append(value)
+        self.pos += 1
+
+
+@lru_cache(maxsize=16)
+def get_redactor(level: str, names: Tuple[str, ...] = ()) -> Redactor:
+    """Return the shared redactor for a level and set of known names."""
+    return Redactor(level, names)
 
 
 def redact(
@@ -55,6 +361,24 @@ def redact(
     """Redact PII from dictionary."""
     if level == "none":
         return data
-    patterns = BASIC_PATTERNS if level in {"basic", "strict"} else {}
-    names: Iterable[str] = known_names or []
-    return _redact_recursive(data, patterns, names)
+    return get_redactor(level, tuple(known_names or ()))(data)
+
+
+def redact_batch(
+    traces: List[Dict[str, Any]], level: str
+) -> Tuple[List[Dict[str, Any]], float, int, int]:
+    """Redact a batch of traces.
+
+    Returns the redacted traces, the seconds it took and the cache hits and
+    misses of the batch, which may have run in a worker process.
+    """
+    start = time.perf_counter()
+    hits, misses = CACHE.stats.hits, CACHE.stats.misses
+    redactor = get_redactor(level)
+    redacted = [redactor(trace) for trace in traces]
+    return (
+        redacted,
+        time.perf_counter() - start,
+        CACHE.stats.hits - hits,
+        CACHE.stats.misses - misses,
+    )
@@ -0,0 +1,213 @@
+"""Segment bookkeeping for partitioned NDJSON trace files."""
+
+from __future__ import annotations
+
+import os
+import zlib
+from threading import get_ident
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from .serialize import dumps, loads
+
+MANIFEST_NAME = "manifest.json"
+STATE_ACTIVE = "active"
+STATE_SEALED = "sealed"
+# Single file per partition written before segments and block indexes.
+LEGACY_SEGMENT = "part.jsonl.gz"
+_SCAN_CHUNK = 1 << 20
+
+
+def segment_name(index: int) -> str:
+    """Return the file name of the segment with the given index."""
+    return f"part-{index:05d}.jsonl.gz"
+
+
+def index_name(segment: str) -> str:
+    """Return the file name of the block index belonging to a segment."""
+    return segment.replace(".jsonl.gz", ".idx.jsonl")
+
+
+@dataclass
+class SegmentInfo:
+    """Row and size statistics for a single segment file."""
+
+    name: str
+    state: str = STATE_ACTIVE
+    rows: int = 0
+    bytes: int = 0
+    min_ts: Optional[str] = None
+    max_ts: Optional[str] = None
+    models: List[str] = field(default_factory=list)
+
+    @property
+    def sealed(self) -> bool:
+        """Return True once the segment will no longer be appended to."""
+        return self.state == STATE_SEALED
+
+    def record(self, ts: str, model: str) -> None:
+        """Account for one row written to the segment."""
+        self.rows += 1
+        if self.min_ts is None or ts < self.min_ts:
+            self.min_ts = ts
+        if self.max_ts is None or ts > self.max_ts:
+            self.max_ts = ts
+        if model not in self.models:
+            self.models.append(model)
+
+
+@dataclass
+class BlockInfo:
+    """Location and contents of one independently decodable gzip member."""
+
+    offset: int
+    length: int = 0
+    rows: int = 0
+    size: int = 0
+    min_ts: Optional[str] = None
+    max_ts: Optional[str] = None
+    trace_ids: List[str] = field(default_factory=list)
+    wal_pos: Optional[int] = None
+
+    def record(self, trace_id: str, ts: str, size: int) -> None:
+        """Account for one row written to the block."""
+        self.rows += 1
+        self.size += size
+        self.trace_ids.append(trace_id)
+        if self.min_ts is None or ts < self.min_ts:
+            self.min_ts = ts
+        if self.max_ts is None or ts > self.max_ts:
+            self.max_ts = ts
+
+    def overlaps(self, start: Optional[str], end: Optional[str]) -> bool:
+        """Return True if the block may hold rows with start <= ts < end."""
+        if self.min_ts is None or self.max_ts is None:
+            return False
+        if start is not None and self.max_ts < start:
+            return False
+        return end is None or self.min_ts < end
+
+
+def append_block_index(
+    directory: Path, segment: str, block: BlockInfo, fsync: bool = False
+) -> None:
+    """Append a finished block to the sidecar index of its segment."""
+    with open(directory / index_name(segment), "ab") as f:
+        f.write(dumps(asdict(block)) + b"\n")
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def read_block_index(directory: Path, segment: str) -> Iterator[BlockInfo]:
+    """Yield the indexed blocks of a segment in file order."""
+    path = directory / index_name(segment)
+    if not path.exists():
+        return
+    with open(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                yield BlockInfo(**loads(line))
+
+
+def index_legacy_segment(directory: Path) -> List[BlockInfo]:
+    """Return the blocks of a partition's legacy segment, indexing it once.
+
+    The legacy file is a series of gzip members, one per time it was
+    opened. It is decoded once to find each member and the result is saved
+    as a regular block index, so later reads only seek. A truncated final
+    member is left out.
+    """
+    blocks = list(read_block_index(directory, LEGACY_SEGMENT))
+    if blocks:
+        return blocks
+    offset = 0
+    with open(directory / LEGACY_SEGMENT, "rb") as f:
+        rest = b""
+        while True:
+            member = zlib.decompressobj(zlib.MAX_WBITS | 16)
+            data: List[bytes] = []
+            fed = 0
+            while not member.eof:
+                chunk = rest or f.read(_SCAN_CHUNK)
+                rest = b""
+                if not chunk:
+                    break
+                fed += len(chunk)
+                data.append(member.decompress(chunk))
+            if not member.eof:
+                break
+            rest = member.unused_data
+            block = BlockInfo(offset=offset, length=fed - len(rest))
+            for line in b"".join(data).splitlines():
+                if line:
+                    row = loads(line)
+                    block.record(
+                        str(row.get("trace_id")), str(row.get("ts")), len(line)
+                    )
+            blocks.append(block)
+            offset += block.length
+    # History workers may index the same partition at once.
+    tmp = directory / f"{index_name(LEGACY_SEGMENT)}.{os.getpid()}-{get_ident()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.writelines(dumps(asdict(block)) + b"\n" for block in blocks)
+        os.replace(tmp, directory / index_name(LEGACY_SEGMENT))
+    except OSError:
+        pass
+    return blocks
+
+
+class PartitionManifest:
+    """Manifest describing the segments of one partition directory."""
+
+    def __init__(self, directory: Path, segments: List[SegmentInfo]) -> None:
+        """Initialize the manifest for a directory."""
+        self.directory = directory
+        self.segments = segments
+
+    @classmethod
+    def load(cls, directory: Path) -> PartitionManifest:
+        """Load the manifest of a directory, or start an empty one."""
+        path = directory / MANIFEST_NAME
+        if not path.exists():
+            return cls(directory, [])
+        data: Dict[str, Any] = loads(path.read_bytes())
+        return cls(directory, [SegmentInfo(**seg) for seg in data["segments"]])
+
+    @property
+    def active(self) -> Optional[SegmentInfo]:
+        """Return the segment currently accepting writes, if any."""
+        if self.segments and not self.segments[-1].sealed:
+            return self.segments[-1]
+        return None
+
+    @property
+    def sealed(self) -> List[SegmentInfo]:
+        """Return segments that are complete and safe to read concurrently."""
+        return [seg for seg in self.segments if seg.sealed]
+
+    def new_segment(self) -> SegmentInfo:
+        """Start the next numbered segment and return it."""
+        segment = SegmentInfo(name=segment_name(len(self.segments)))
+        self.segments.append(segment)
+        return segment
+
+    def seal_active(self) -> bool:
+        """Seal the active segment, returning False if there was none."""
+        segment = self.active
+        if segment is None:
+            return False
+        path = self.directory / segment.name
+        if path.exists():
+            segment.bytes = path.stat().st_size
+        segment.state = STATE_SEALED
+        return True
+
+    def save(self) -> None:
+        """Atomically write the manifest next to its segments."""
+        path = self.directory / MANIFEST_NAME
+        tmp = path.with_suffix(".tmp")
+        tmp.write_bytes(dumps({"segments": [asdict(s) for s in self.segments]}))
+        os.replace(tmp, path)
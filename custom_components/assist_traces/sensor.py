@@ -2,18 +2,35 @@
 
 from __future__ import annotations
 
-from datetime import datetime, timedelta
-from typing import Callable, List
+import logging
+from datetime import timedelta
+from typing import Any, Callable, Iterable
 
+from homeassistant.helpers.debounce import Debouncer
 from homeassistant.helpers.entity import Entity
-from homeassistant.core import HomeAssistant
+from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.core import HomeAssistant, callback
 
-from .const import DATA_TRACES
+from .const import (
+    CONF_SENSOR_DEBOUNCE_S,
+    DATA_TRACES,
+    DEFAULT_SENSOR_DEBOUNCE_S,
+    DOMAIN,
+)
+from .quantiles import METRICS, QUANTILES
+from .record import TraceRecord
+
+_LOGGER = logging.getLogger(__name__)
+
+# The 24h windows slide even when no trace arrives.
+EXPIRY_INTERVAL = timedelta(seconds=60)
 
 
 class AssistTracesSensor(Entity):
     """Simple diagnostic sensor for trace statistics."""
 
+    _attr_should_poll = False
+
     def __init__(
         self, hass: HomeAssistant, name: str, func: Callable[[], float]
     ) -> None:
@@ -21,38 +38,93 @@ class AssistTracesSensor(Entity):
         self._hass = hass
         self._attr_name = name
         self._func = func
+        self._value: Any = func()
 
     @property
     def state(self):
         """Return current sensor state."""
-        return self._func()
+        return self._value
+
+    @callback
+    def async_refresh(self) -> bool:
+        """Recompute the value and write state only if it changed."""
+        value = self._func()
+        if value == self._value:
+            return False
+        self._value = value
+        if self.hass is not None:
+            self.async_write_ha_state()
+        return True
+
+
+class SensorRefresher:
+    """Refresh sensors after store changes, coalescing bursts of writes."""
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        sensors: Iterable[AssistTracesSensor],
+        debounce_s: float,
+    ) -> None:
+        """Initialize the refresher for a set of sensors."""
+        self.sensors = list(sensors)
+        self._debouncer = Debouncer(
+            hass,
+            _LOGGER,
+            cooldown=debounce_s,
+            immediate=False,
+            function=self.async_refresh,
+        )
+
+    @callback
+    def async_refresh(self, *_args: Any) -> None:
+        """Refresh every sensor now."""
+        for sensor in self.sensors:
+            sensor.async_refresh()
+
+    @callback
+    def on_change(self, trace_id: str, record: TraceRecord) -> None:
+        """Schedule a refresh once the store has been quiet for the debounce."""
+        self._debouncer.async_schedule_call()
+
+    @callback
+    def async_cancel(self) -> None:
+        """Drop any pending refresh."""
+        self._debouncer.async_cancel()
 
 
 async def async_setup_entry(hass: HomeAssistant, entry, async_add_entities) -> None:
     """Set up assist_traces diagnostic sensors."""
+    aggregates = hass.data[DOMAIN]["aggregates"]
+    quantiles = hass.data[DOMAIN]["quantiles"]
 
-    def recent_traces() -> List[dict]:
-        """Return traces from the last 24 hours."""
-        traces = list(hass.data.get(DATA_TRACES, {}).values())
-        cutoff = datetime.utcnow() - timedelta(hours=24)
-        return [t for t in traces if datetime.fromisoformat(t["ts"]) >= cutoff]
+    def quantile_sensor(metric: str, q: float) -> AssistTracesSensor:
+        """Return a sensor reporting one latency quantile over 24h."""
+        name = f"assist_traces_{metric[:-3]}_p{round(q * 100)}_ms"
+        return AssistTracesSensor(hass, name, lambda: quantiles.quantile(metric, q))
 
-    async_add_entities(
+    sensors = [
+        AssistTracesSensor(hass, "assist_traces_count_24h", lambda: aggregates.count),
+        AssistTracesSensor(
+            hass, "assist_traces_fail_rate_24h", lambda: aggregates.fail_rate
+        ),
+        AssistTracesSensor(
+            hass,
+            "assist_traces_mean_latency_ms",
+            lambda: aggregates.mean_latency_ms,
+        ),
+        *(quantile_sensor(metric, q) for metric in METRICS for q in QUANTILES),
+    ]
+    refresher = SensorRefresher(
+        hass,
+        sensors,
+        entry.options.get(CONF_SENSOR_DEBOUNCE_S, DEFAULT_SENSOR_DEBOUNCE_S),
+    )
+    hass.data[DOMAIN]["unsubs"].extend(
         [
-            AssistTracesSensor(
-                hass, "assist_traces_count_24h", lambda: len(recent_traces())
-            ),
-            AssistTracesSensor(
-                hass,
-                "assist_traces_fail_rate_24h",
-                lambda: sum(1 for t in recent_traces() if t.get("result") == "fail")
-                / max(len(recent_traces()), 1),
-            ),
-            AssistTracesSensor(
-                hass,
-                "assist_traces_mean_latency_ms",
-                lambda: sum(t.get("latency_ms", 0) for t in recent_traces())
-                / max(len(recent_traces()), 1),
-            ),
+            hass.data[DATA_TRACES].add_listener(refresher.on_change),
+            async_track_time_interval(hass, refresher.async_refresh, EXPIRY_INTERVAL),
+            refresher.async_cancel,
         ]
     )
+    async_add_entities(sensors)
@@ -0,0 +1,62 @@
+"""JSON serialization helpers shared by the writer, exports and WebSocket API."""
+
+from __future__ import annotations
+
+import json
+from datetime import date, datetime, time
+from enum import Enum
+from typing import Any
+
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - exercised only without orjson
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+
+def _default(obj: Any) -> Any:
+    """Convert values the JSON backends cannot encode natively."""
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    if isinstance(obj, (bytes, bytearray)):
+        return obj.decode("utf-8", "replace")
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj: Any) -> bytes:
+        """Serialize an object to compact UTF-8 JSON bytes."""
+        return orjson.dumps(obj, default=_default, option=_OPTIONS)
+
+    def dumps_line(obj: Any) -> bytes:
+        """Serialize an object to a newline-terminated JSON line."""
+        return orjson.dumps(
+            obj, default=_default, option=_OPTIONS | orjson.OPT_APPEND_NEWLINE
+        )
+
+    loads = orjson.loads
+
+else:  # pragma: no cover - exercised only without orjson
+
+    def dumps(obj: Any) -> bytes:
+        """Serialize an object to compact UTF-8 JSON bytes."""
+        return json.dumps(
+            obj, default=_default, ensure_ascii=False, separators=(",", ":")
+        ).encode("utf-8")
+
+    def dumps_line(obj: Any) -> bytes:
+        """Serialize an object to a newline-terminated JSON line."""
+        return dumps(obj) + b"\n"
+
+    loads = json.loads
@@ -2,17 +2,15 @@
 
 from __future__ import annotations
 
-import gzip
-import json
 from datetime import datetime
 from typing import Any, Dict
 
 from homeassistant.core import HomeAssistant, ServiceCall
 
-from .const import DATA_TRACES, DATA_WRITER, DOMAIN
-from .helpers import dedup_simhash, summarize_context
+from .const import DATA_COLD, DATA_TRACES, DOMAIN
+from .helpers import target_entity_ids
 from .models import AssistTrace
-from .redact import redact
+from .simhash import DEFAULT_MAX_DISTANCE
 
 
 def _merge(existing: Dict[str, Any], update: Dict[str, Any]) -> None:
@@ -26,6 +24,17 @@ def _merge(existing: Dict[str, Any], update: Dict[str, Any]) -> None:
             existing[k] = v
 
 
+def _output_path(call: ServiceCall, kind: str) -> str:
+    """Return the requested export path or a dated one in the datasets folder.
+
+    Sharded exports write a directory, single-file exports a ``.jsonl.gz``.
+    """
+    if call.data.get("output_path"):
+        return call.data["output_path"]
+    suffix = "" if call.data.get("shards") else ".jsonl.gz"
+    return f"/config/assist_traces/datasets/{kind}-{datetime.utcnow():%Y%m%d}{suffix}"
+
+
 async def async_setup_services(hass: HomeAssistant) -> None:
     """Register Home Assistant services for assist_traces."""
 
@@ -33,91 +42,69 @@ async def async_setup_services(hass: HomeAssistant) -> None:
         """Handle assist_traces.log_event service."""
         payload: Dict[str, Any] = call.data.get("trace", {})
         trace = AssistTrace.model_validate(payload).model_dump(mode="json")
-        traces = hass.data.setdefault(DATA_TRACES, {})
+        traces = hass.data[DATA_TRACES]
         existing = traces.get(trace["trace_id"])
         if existing:
-            _merge(existing, trace)
-            merged = existing
+            merged = existing.to_dict()
+            _merge(merged, trace)
         else:
-            traces[trace["trace_id"]] = trace
             merged = trace
-        redacted = redact(dict(merged), hass.data[DOMAIN]["redaction_level"])  # type: ignore[index]
-        await hass.data[DATA_WRITER].enqueue(redacted)
-        pa = merged.get("parsed_action") or {}
-        entity_ids = []
-        target = pa.get("target") or {}
-        if isinstance(target, dict) and target.get("entity_id"):
-            eids = target.get("entity_id")
-            if isinstance(eids, list):
-                entity_ids.extend(eids)
-            else:
-                entity_ids.append(eids)
+        traces[trace["trace_id"]] = merged
+        await hass.data[DOMAIN]["redaction"].enqueue(merged)
+        entity_ids = target_entity_ids(merged.get("parsed_action"))
         if entity_ids:
             await hass.data[DOMAIN]["correlator"].add_trace(
-                trace["trace_id"], entity_ids
+                trace["trace_id"], entity_ids, action=merged.get("parsed_action")
             )  # type: ignore[index]
 
     async def set_feedback(call: ServiceCall) -> None:
         """Handle assist_traces.set_feedback service."""
         trace_id = call.data["trace_id"]
-        trace = hass.data[DATA_TRACES].get(trace_id)
-        if trace:
-            trace["user_feedback"] = call.data.get("feedback")
-            trace["repair_text"] = call.data.get("repair_text")
-            trace["gold_action"] = call.data.get("gold_action")
+        fields = {
+            "user_feedback": call.data.get("feedback"),
+            "repair_text": call.data.get("repair_text"),
+            "gold_action": call.data.get("gold_action"),
+        }
+        hass.data[DATA_TRACES].set_fields(trace_id, fields)
+        cold = hass.data.get(DATA_COLD)
+        if cold is not None:
+            await hass.async_add_executor_job(cold.set_feedback, trace_id, fields)
 
     async def export_sft(call: ServiceCall) -> None:
         """Handle assist_traces.export_sft service."""
-        output_path = (
-            call.data.get("output_path")
-            or f"/config/assist_traces/datasets/sft-{datetime.utcnow():%Y%m%d}.jsonl.gz"
+        dedup_distance = None
+        if call.data.get("dedup") == "simhash":
+            dedup_distance = call.data.get("dedup_distance", DEFAULT_MAX_DISTANCE)
+        await hass.data[DOMAIN]["exports"].run(
+            "sft",
+            _output_path(call, "sft"),
+            dedup_distance=dedup_distance,
+            export_id=call.data.get("export_id"),
+            shards=call.data.get("shards", 0),
+            validation=call.data.get("validation", 0.0),
         )
-        traces = list(hass.data[DATA_TRACES].values())
-        rows = []
-        for tr in traces:
-            rows.append(
-                {
-                    "instruction": tr.get("user_text", ""),
-                    "context": summarize_context(tr.get("context", {})),
-                    "output": tr.get("gold_action") or tr.get("parsed_action"),
-                    "source": "gold" if tr.get("gold_action") else "implicit_success",
-                    "trace_id": tr.get("trace_id"),
-                }
-            )
-        texts = [json.dumps(r) for r in rows]
-        deduped = dedup_simhash(texts) if call.data.get("dedup") == "simhash" else texts
-        with gzip.open(output_path, "wb") as f:
-            for line in deduped:
-                f.write(line.encode() + b"\n")
 
     async def export_prefs(call: ServiceCall) -> None:
         """Handle assist_traces.export_prefs service."""
-        output_path = (
-            call.data.get("output_path")
-            or f"/config/assist_traces/datasets/prefs-{datetime.utcnow():%Y%m%d}.jsonl.gz"
+        await hass.data[DOMAIN]["exports"].run(
+            "prefs",
+            _output_path(call, "prefs"),
+            export_id=call.data.get("export_id"),
+            shards=call.data.get("shards", 0),
+            validation=call.data.get("validation", 0.0),
         )
-        traces = list(hass.data[DATA_TRACES].values())
-        rows = []
-        for tr in traces:
-            rows.append(
-                {
-                    "prompt": tr.get("user_text", ""),
-                    "context": summarize_context(tr.get("context", {})),
-                    "chosen": tr.get("gold_action") or tr.get("parsed_action"),
-                    "rejected": tr.get("parsed_action"),
-                    "trace_id": tr.get("trace_id"),
-                }
-            )
-        with gzip.open(output_path, "wb") as f:
-            for line in rows:
-                f.write(json.dumps(line).encode() + b"\n")
+
+    async def cancel_export(call: ServiceCall) -> None:
+        """Handle assist_traces.cancel_export service."""
+        hass.data[DOMAIN]["exports"].cancel(call.data.get("export_id"))
 
     async def flush(call: ServiceCall) -> None:
         """Handle assist_traces.flush service."""
-        await hass.data[DATA_WRITER].flush()
+        await hass.data[DOMAIN]["redaction"].flush()
 
     hass.services.async_register(DOMAIN, "log_event", log_event)
     hass.services.async_register(DOMAIN, "set_feedback", set_feedback)
     hass.services.async_register(DOMAIN, "export_sft", export_sft)
     hass.services.async_register(DOMAIN, "export_prefs", export_prefs)
+    hass.services.async_register(DOMAIN, "cancel_export", cancel_export)
     hass.services.async_register(DOMAIN, "flush", flush)
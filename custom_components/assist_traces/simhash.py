@@ -0,0 +1,223 @@
+"""SimHash near-duplicate detection for dataset rows."""
+
+from __future__ import annotations
+
+import hashlib
+import re
+from collections import deque
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+BITS = 64
+# Counts of a bit position are summed in 16-bit lanes of one integer.
+LANE = 16
+DEFAULT_MAX_DISTANCE = 3
+DEFAULT_WINDOW = 1024
+DEFAULT_MAX_INDEX = 100_000
+# Preferred sources sort first when choosing a cluster's representative.
+SOURCE_RANK = {"gold": 0, "implicit_success": 1}
+_WORDS = re.compile(r"\w+")
+# _SPREAD[k][b]: the bits of byte b at big-endian position k, one per lane.
+_SPREAD = [
+    [
+        sum(1 << (LANE * (8 * (7 - k) + j)) for j in range(8) if b >> j & 1)
+        for b in range(256)
+    ]
+    for k in range(8)
+]
+
+
+def row_features(row: Dict[str, Any]) -> List[str]:
+    """Return the normalized word and bigram features of a row's text.
+
+    The instruction (or prompt) is case-folded and stripped of punctuation;
+    summarized context values add ``key=value`` features.
+    """
+    text = row.get("instruction") or row.get("prompt") or ""
+    words = _WORDS.findall(str(text).casefold())
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    context = row.get("context")
+    if isinstance(context, dict):
+        for key, value in context.items():
+            value = " ".join(_WORDS.findall(str(value).casefold()))
+            features.append(f"{key}={value}")
+    return features
+
+
+@lru_cache(maxsize=65536)
+def _spread(feature: str) -> int:
+    """Return the feature hash with each bit moved into its own lane."""
+    digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+    return sum(table[b] for table, b in zip(_SPREAD, digest))
+
+
+def simhash(features: Iterable[str]) -> int:
+    """Return the 64-bit SimHash of a bag of features.
+
+    Each bit is set if it is set in the hashes of more than half of the
+    features. Instead of counting per bit, the hashes are spread into
+    16-bit lanes and summed, so a feature costs one addition.
+    """
+    total = 0
+    count = 0
+    for feature in features:
+        total += _spread(feature)
+        count += 1
+        if count == (1 << LANE) - 1:
+            break
+    lanes = memoryview(total.to_bytes(BITS * LANE // 8, "little")).cast("H")
+    sig = 0
+    for bit, ones in enumerate(lanes):
+        if 2 * ones > count:
+            sig |= 1 << bit
+    return sig
+
+
+def bands(max_distance: int) -> List[Tuple[int, int]]:
+    """Return (shift, mask) of the LSH bands for a maximum Hamming distance.
+
+    Signatures within ``max_distance`` bits agree on at least one of
+    ``max_distance + 1`` disjoint bands, so comparing only signatures that
+    share a band finds every near-duplicate.
+    """
+    if not 0 <= max_distance < BITS // 2:
+        raise ValueError(f"max_distance must be between 0 and {BITS // 2 - 1}")
+    count = max_distance + 1
+    out = []
+    shift = 0
+    for i in range(count):
+        width = BITS // count + (1 if i < BITS % count else 0)
+        out.append((shift, (1 << width) - 1))
+        shift += width
+    return out
+
+
+def _rank(row: Dict[str, Any]) -> int:
+    """Return the preference of a row as a representative, lower first."""
+    return SOURCE_RANK.get(row.get("source"), len(SOURCE_RANK))
+
+
+@dataclass
+class DedupStats:
+    """Counters describing a near-duplicate filter run."""
+
+    rows: int = 0
+    kept: int = 0
+    duplicates: int = 0
+    replaced: int = 0
+    promoted: int = 0
+    evicted: int = 0
+
+
+class _Entry:
+    """A cluster in the index: its signature and pending representative."""
+
+    __slots__ = ("sig", "rank", "row")
+
+    def __init__(self, sig: int, rank: int, row: Optional[Dict[str, Any]]) -> None:
+        """Initialize the entry."""
+        self.sig = sig
+        self.rank = rank
+        self.row = row
+
+
+class NearDuplicateFilter:
+    """Drop rows whose SimHash is near that of an earlier row.
+
+    Signatures are indexed in ``max_distance + 1`` LSH band tables. A row
+    joins the earliest indexed cluster within ``max_distance`` bits, or
+    starts a new one. Representatives wait in a window of ``window``
+    clusters, where a better-ranked duplicate (gold over implicit success)
+    replaces them; a better-ranked row arriving after its cluster was
+    written is kept as well, so no gold row is ever dropped for an implicit
+    one. The index holds at most ``max_index`` clusters, forgetting the
+    oldest, so memory is bounded however many rows stream through.
+    """
+
+    def __init__(
+        self,
+        max_distance: int = DEFAULT_MAX_DISTANCE,
+        window: int = DEFAULT_WINDOW,
+        max_index: int = DEFAULT_MAX_INDEX,
+    ) -> None:
+        """Initialize an empty filter."""
+        self.max_distance = max_distance
+        self.window = window
+        self.max_index = max(max_index, window)
+        self.stats = DedupStats()
+        self._bands = bands(max_distance)
+        self._tables: List[Dict[int, Set[int]]] = [{} for _ in self._bands]
+        self._entries: Dict[int, _Entry] = {}
+        self._pending: Deque[int] = deque()
+        self._seq = 0
+
+    def filter(self, rows: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Yield the representative rows of a stream in first-seen order."""
+        for row in rows:
+            yield from self.add(row)
+        while self._pending:
+            yield self._emit()
+
+    def add(self, row: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Add a row and return the representatives leaving the window."""
+        self.stats.rows += 1
+        sig = simhash(row_features(row))
+        rank = _rank(row)
+        match = self._match(sig)
+        if match is not None:
+            if rank >= match.rank:
+                self.stats.duplicates += 1
+                return []
+            match.rank = rank
+            if match.row is not None:
+                match.row = row
+                self.stats.duplicates += 1
+                self.stats.replaced += 1
+                return []
+            self.stats.promoted += 1
+            self.stats.kept += 1
+            return [row]
+        seq = self._seq
+        self._seq += 1
+        self._entries[seq] = _Entry(sig, rank, row)
+        for table, (shift, mask) in zip(self._tables, self._bands):
+            table.setdefault(sig >> shift & mask, set()).add(seq)
+        self._pending.append(seq)
+        out = []
+        while len(self._pending) > self.window:
+            out.append(self._emit())
+        while len(self._entries) > self.max_index:
+            self._evict()
+        return out
+
+    def _match(self, sig: int) -> Optional[_Entry]:
+        """Return the earliest indexed cluster within max_distance of sig."""
+        best: Optional[int] = None
+        for table, (shift, mask) in zip(self._tables, self._bands):
+            for seq in table.get(sig >> shift & mask, ()):
+                if (best is None or seq < best) and (
+                    self._entries[seq].sig ^ sig
+                ).bit_count() <= self.max_distance:
+                    best = seq
+        return None if best is None else self._entries[best]
+
+    def _emit(self) -> Dict[str, Any]:
+        """Release the oldest pending representative."""
+        entry = self._entries[self._pending.popleft()]
+        row, entry.row = entry.row, None
+        self.stats.kept += 1
+        assert row is not None
+        return row
+
+    def _evict(self) -> None:
+        """Forget the oldest cluster."""
+        seq = next(iter(self._entries))
+        entry = self._entries.pop(seq)
+        for table, (shift, mask) in zip(self._tables, self._bands):
+            key = entry.sig >> shift & mask
+            members = table[key]
+            members.discard(seq)
+            if not members:
+                del table[key]
+        self.stats.evicted += 1
@@ -0,0 +1,197 @@
+"""Compressed snapshots of the in-memory trace store for warm restarts."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import struct
+import time
+import zlib
+from dataclasses import asdict, dataclass
+from datetime import timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.event import async_track_time_interval
+
+from .const import DATA_TRACES, DOMAIN
+from .record import TraceRecord
+from .serialize import dumps, loads
+
+_LOGGER = logging.getLogger(__name__)
+
+MAGIC = b"ATSNAP01"
+_HEADER = struct.Struct(">QQ")
+# Records handled per event loop iteration while packing or restoring.
+CHUNK = 1000
+
+SnapshotRow = Tuple[str, List[Any], bytes]
+
+
+def write_snapshot(
+    path: Path, rows: List[SnapshotRow], pending: Dict[str, Dict[str, Any]]
+) -> int:
+    """Atomically write packed records and return the snapshot size in bytes.
+
+    The file holds a zlib-compressed JSON section with every record's light
+    fields followed by the already compressed heavy blobs back to back.
+    """
+    meta = {
+        "saved_at": time.time(),
+        "pending": pending,
+        "rows": [[trace_id, *row, len(heavy)] for trace_id, row, heavy in rows],
+    }
+    packed = zlib.compress(dumps(meta), 1)
+    heavy_len = sum(len(heavy) for _, _, heavy in rows)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + _HEADER.pack(len(packed), heavy_len))
+        f.write(packed)
+        f.writelines(heavy for _, _, heavy in rows)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return len(MAGIC) + _HEADER.size + len(packed) + heavy_len
+
+
+def read_snapshot(
+    path: Path,
+) -> Tuple[List[Tuple[str, TraceRecord]], Dict[str, Dict[str, Any]]]:
+    """Return the records, oldest write first, and correlator state of a snapshot."""
+    data = path.read_bytes()
+    if not data.startswith(MAGIC):
+        raise ValueError(f"{path} is not a trace store snapshot")
+    meta_len, heavy_len = _HEADER.unpack_from(data, len(MAGIC))
+    offset = len(MAGIC) + _HEADER.size
+    meta = loads(zlib.decompress(data[offset : offset + meta_len]))
+    offset += meta_len
+    if len(data) - offset != heavy_len:
+        raise ValueError(f"{path} is truncated")
+    records = []
+    for trace_id, *row, heavy_size in meta["rows"]:
+        heavy = data[offset : offset + heavy_size]
+        offset += heavy_size
+        records.append((trace_id, TraceRecord.unpack(row, heavy)))
+    return records, meta["pending"]
+
+
+@dataclass
+class SnapshotStats:
+    """Counters describing snapshot saves and the startup load."""
+
+    saves: int = 0
+    last_size: int = 0
+    last_save_ms: float = 0
+    loaded: int = 0
+    load_ms: float = 0
+    load_error: Optional[str] = None
+
+
+class StoreSnapshotter:
+    """Periodically snapshot the trace store and reload it in the background."""
+
+    def __init__(self, hass: HomeAssistant, path: Path, interval_s: float) -> None:
+        """Initialize the snapshotter for a snapshot path."""
+        self.hass = hass
+        self.path = path
+        self.interval_s = interval_s
+        self.stats = SnapshotStats()
+        self._lock = asyncio.Lock()
+        self._loaded = asyncio.Event()
+        self._load_task: Optional[asyncio.Task] = None
+        self._unsub: Optional[Callable[[], None]] = None
+
+    def start(self) -> None:
+        """Start the background load and, if enabled, periodic saves."""
+        self._load_task = self.hass.async_create_background_task(
+            self._load(), f"{DOMAIN} snapshot load"
+        )
+        if self.interval_s:
+            self._unsub = async_track_time_interval(
+                self.hass, self._periodic, timedelta(seconds=self.interval_s)
+            )
+
+    async def stop(self) -> None:
+        """Stop periodic saves and write a final snapshot."""
+        if self._unsub is not None:
+            self._unsub()
+            self._unsub = None
+        if self._load_task is not None and not self._load_task.done():
+            self._load_task.cancel()
+        await self.save()
+
+    async def wait_loaded(self) -> None:
+        """Wait until the startup load has finished."""
+        await self._loaded.wait()
+
+    async def save(self) -> None:
+        """Snapshot the store, packing on the loop and writing in the executor."""
+        # Saving before the load finished would overwrite the old snapshot
+        # with a partial store.
+        if not self._loaded.is_set():
+            return
+        async with self._lock:
+            start = time.monotonic()
+            store = self.hass.data[DATA_TRACES]
+            items = list(store.items())
+            rows: List[SnapshotRow] = []
+            for i in range(0, len(items), CHUNK):
+                for trace_id, record in items[i : i + CHUNK]:
+                    rows.append((trace_id, *record.pack()))
+                await asyncio.sleep(0)
+            correlator = self.hass.data[DOMAIN].get("correlator")
+            pending = correlator.snapshot() if correlator is not None else {}
+            self.stats.last_size = await self.hass.async_add_executor_job(
+                write_snapshot, self.path, rows, pending
+            )
+            self.stats.saves += 1
+            self.stats.last_save_ms = (time.monotonic() - start) * 1000
+
+    def diagnostics(self) -> Dict[str, Any]:
+        """Return snapshot counters."""
+        return {"loading": not self._loaded.is_set(), **asdict(self.stats)}
+
+    async def _periodic(self, _now) -> None:
+        """Save a snapshot on the configured interval."""
+        await self.save()
+
+    async def _load(self) -> None:
+        """Restore the latest snapshot without blocking setup.
+
+        A missing or unreadable snapshot leaves the store empty. The load
+        always ends marked as finished unless it was cancelled, so later
+        saves and ``wait_loaded`` callers are never stuck behind it.
+        """
+        start = time.monotonic()
+        try:
+            try:
+                records, pending = await self.hass.async_add_executor_job(
+                    read_snapshot, self.path
+                )
+            except FileNotFoundError:
+                records, pending = [], {}
+            store = self.hass.data[DATA_TRACES]
+            records.reverse()
+            for i in range(0, len(records), CHUNK):
+                self.stats.loaded += store.restore(records[i : i + CHUNK])
+                if store.full:
+                    break
+                await asyncio.sleep(0)
+            correlator = self.hass.data[DOMAIN].get("correlator")
+            if correlator is not None:
+                await correlator.restore(pending)
+        except asyncio.CancelledError:
+            # Stopped mid-load: keep saves off so the snapshot on disk is
+            # not replaced by a partial store.
+            raise
+        except Exception as err:
+            # A truncated or corrupt file fails in struct, zlib or JSON
+            # decoding alike.
+            _LOGGER.warning("Could not restore the trace store snapshot: %r", err)
+            self.stats.load_error = f"{type(err).__name__}: {err}"
+        finally:
+            self.stats.load_ms = (time.monotonic() - start) * 1000
+        self._loaded.set()
@@ -0,0 +1,246 @@
+"""Batched redaction stage between trace capture and the writer."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import multiprocessing
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from .const import (
+    DEFAULT_BATCH_MS,
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_QUEUE_SIZE,
+    OVERFLOW_DROP_NEWEST,
+    OVERFLOW_DROP_OLDEST,
+    OVERFLOW_SPILL,
+)
+from .redact import CACHE, redact_batch
+from .writer import TraceWriter, collect_batch
+
+_LOGGER = logging.getLogger(__name__)
+
+
+@dataclass
+class StageStats:
+    """Counters and cumulative timings of the redaction stage."""
+
+    batches: int = 0
+    traces: int = 0
+    max_batch: int = 0
+    wait_s: float = 0.0
+    redact_s: float = 0.0
+    handoff_s: float = 0.0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    failed_batches: int = 0
+    dropped: int = 0
+    dropped_newest: int = 0
+    dropped_oldest: int = 0
+    inline: int = 0
+
+
+class RedactionStage:
+    """Redact captured traces in batches off the event loop before writing.
+
+    Every capture path enqueues raw traces here. Batches are collected the
+    way the writer collects them and redacted in the default executor, or
+    in a pool of ``processes`` worker processes so the regex work does not
+    compete with the event loop for the GIL. Redacted traces are handed to
+    the writer in capture order, so neither the WAL nor the spill files
+    ever hold unredacted text.
+
+    The stage queue is the first to fill under load, so the writer's
+    overflow policy is applied here too. With ``spill`` an overflowing
+    trace is redacted on its own and handed straight to the writer, which
+    spills it if its queue is full as well.
+    """
+
+    def __init__(
+        self,
+        writer: TraceWriter,
+        level: str,
+        processes: int = 0,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        batch_ms: int = DEFAULT_BATCH_MS,
+    ) -> None:
+        """Initialize the stage in front of a writer."""
+        self.writer = writer
+        self.level = level
+        self.processes = processes
+        self.batch_size = batch_size
+        self.batch_ms = batch_ms
+        self.queue: asyncio.Queue[Optional[Tuple[float, Dict[str, Any]]]] = (
+            asyncio.Queue(maxsize=max(queue_size, 0))
+        )
+        self.stats = StageStats()
+        self._executor: Optional[Executor] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        """Start the worker task, and the process pool if configured."""
+        if self.level == "none" or self._task is not None:
+            return
+        if self.processes > 0:
+            # Spawned workers start a fresh interpreter that imports this
+            # package to unpickle the job, rather than forking a copy of
+            # the Home Assistant process.
+            self._executor = ProcessPoolExecutor(
+                self.processes, mp_context=multiprocessing.get_context("spawn")
+            )
+        self._task = asyncio.create_task(self._worker())
+
+    async def stop(self) -> None:
+        """Redact and hand off queued traces, then stop the worker."""
+        if self._task is not None:
+            await self.queue.put(None)
+            await self._task
+            self._task = None
+        if self._executor is not None:
+            await asyncio.get_running_loop().run_in_executor(
+                None, self._executor.shutdown
+            )
+            self._executor = None
+
+    async def enqueue(self, trace: Dict[str, Any]) -> None:
+        """Queue a captured trace, applying the overflow policy when full."""
+        if self._task is None:
+            await self.writer.enqueue(trace)
+            return
+        item = (time.monotonic(), trace)
+        if not self.queue.full():
+            self.queue.put_nowait(item)
+            return
+        policy = self.writer.config.overflow
+        if policy == OVERFLOW_DROP_NEWEST:
+            self.stats.dropped_newest += 1
+        elif policy == OVERFLOW_DROP_OLDEST:
+            self.queue.get_nowait()
+            self.queue.task_done()
+            self.stats.dropped_oldest += 1
+            self.queue.put_nowait(item)
+        elif policy == OVERFLOW_SPILL:
+            self.stats.inline += 1
+            redacted, *_ = await asyncio.get_running_loop().run_in_executor(
+                None, redact_batch, [trace], self.level
+            )
+            await self.writer.enqueue(redacted[0])
+        else:
+            await self.queue.put(item)
+
+    async def flush(self) -> None:
+        """Hand every queued trace to the writer and flush it."""
+        if self._task is not None:
+            await self.queue.join()
+        await self.writer.flush()
+
+    def diagnostics(self) -> Dict[str, Any]:
+        """Return queue depth, counters, timings in milliseconds and cache use."""
+        stats = self.stats
+        lookups = stats.cache_hits + stats.cache_misses
+        cache: Dict[str, Any] = {
+            "hits": stats.cache_hits,
+            "misses": stats.cache_misses,
+            "hit_rate": round(stats.cache_hits / lookups, 3) if lookups else None,
+        }
+        if self._executor is None:
+            # Worker processes hold their own caches.
+            info = CACHE.diagnostics()
+            cache.update(
+                entries=info["entries"],
+                chars=info["chars"],
+                evictions=info["evictions"],
+            )
+        return {
+            "level": self.level,
+            "processes": self.processes,
+            "queue_size": self.queue.qsize(),
+            "overflow": self.writer.config.overflow,
+            "batches": stats.batches,
+            "traces": stats.traces,
+            "max_batch": stats.max_batch,
+            "wait_ms": round(stats.wait_s * 1000, 1),
+            "redact_ms": round(stats.redact_s * 1000, 1),
+            "handoff_ms": round(stats.handoff_s * 1000, 1),
+            "redact_ms_per_trace": round(
+                stats.redact_s * 1000 / stats.traces if stats.traces else 0.0, 3
+            ),
+            "failed_batches": stats.failed_batches,
+            "dropped": stats.dropped,
+            "dropped_newest": stats.dropped_newest,
+            "dropped_oldest": stats.dropped_oldest,
+            "inline": stats.inline,
+            "cache": cache,
+        }
+
+    async def _worker(self) -> None:
+        """Consume batches from the queue, redact them and feed the writer."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await collect_batch(
+                self.queue, await self.queue.get(), self.batch_size, self.batch_ms
+            )
+            items: List[Tuple[float, Dict[str, Any]]] = [
+                item for item in batch if item is not None
+            ]
+            try:
+                if items:
+                    await self._process(loop, items)
+            except Exception:
+                # Never hand unredacted traces on; drop the batch and keep
+                # the queue draining so flush and enqueue cannot block.
+                _LOGGER.exception(
+                    "Dropping %d traces that failed redaction", len(items)
+                )
+                self.stats.failed_batches += 1
+                self.stats.dropped += len(items)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+            if batch[-1] is None:
+                break
+
+    async def _process(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        items: List[Tuple[float, Dict[str, Any]]],
+    ) -> None:
+        """Redact one batch in the executor and enqueue it on the writer."""
+        started = time.monotonic()
+        raw = [trace for _, trace in items]
+        try:
+            traces, elapsed, hits, misses = await loop.run_in_executor(
+                self._executor, redact_batch, raw, self.level
+            )
+        except BrokenProcessPool:
+            # A killed worker breaks the pool for good; keep redacting in
+            # threads rather than losing the queue.
+            self._executor = None
+            traces, elapsed, hits, misses = await loop.run_in_executor(
+                None, redact_batch, raw, self.level
+            )
+        except Exception:
+            if self._executor is None:
+                raise
+            # Traces that cannot be pickled for a worker process are
+            # redacted in a thread instead.
+            traces, elapsed, hits, misses = await loop.run_in_executor(
+                None, redact_batch, raw, self.level
+            )
+        handoff = time.monotonic()
+        for trace in traces:
+            await self.writer.enqueue(trace)
+        stats = self.stats
+        stats.batches += 1
+        stats.traces += len(items)
+        stats.max_batch = max(stats.max_batch, len(items))
+        stats.wait_s += sum(started - queued for queued, _ in items)
+        stats.redact_s += elapsed
+        stats.handoff_s += time.monotonic() - handoff
+        stats.cache_hits += hits
+        stats.cache_misses += misses
@@ -0,0 +1,240 @@
+"""Bounded in-memory trace store."""
+
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from itertools import islice
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from .const import DEFAULT_MAX_STORE_MB, DEFAULT_MAX_TRACES
+from .index import Cursor, TraceIndex
+from .record import TraceRecord
+
+
+class TraceStore(MutableMapping):
+    """Mapping of trace_id to TraceRecord with count, byte and age limits.
+
+    Trace dicts are packed into records on insert. Records are kept in
+    least-recently-written order; inserting past a limit evicts from the
+    cold end, skipping traces that are protected because the correlator is
+    still waiting on them. A TraceIndex is kept in step with every change.
+    """
+
+    def __init__(
+        self,
+        max_traces: int = DEFAULT_MAX_TRACES,
+        max_bytes: int = DEFAULT_MAX_STORE_MB * 1024 * 1024,
+        max_age_s: Optional[float] = None,
+    ) -> None:
+        """Initialize an empty store with the given limits."""
+        self.max_traces = max_traces
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        self.bytes = 0
+        self.evicted = 0
+        self._traces: OrderedDict[str, TraceRecord] = OrderedDict()
+        self._meta: Dict[str, Tuple[int, float]] = {}
+        self._protected: Set[str] = set()
+        self.index = TraceIndex()
+        self._listeners: List[Callable[[str, TraceRecord], None]] = []
+
+    def __getitem__(self, trace_id: str) -> TraceRecord:
+        """Return a trace without changing its eviction order."""
+        return self._traces[trace_id]
+
+    def __setitem__(self, trace_id: str, trace: Dict[str, Any] | TraceRecord) -> None:
+        """Insert or replace a trace and enforce the limits."""
+        if not isinstance(trace, TraceRecord):
+            trace = TraceRecord.from_dict(trace)
+        self._account(trace_id, trace)
+        self._traces[trace_id] = trace
+        self._traces.move_to_end(trace_id)
+        self.index.add(trace_id, trace)
+        for listener in self._listeners:
+            listener(trace_id, trace)
+        self._evict()
+
+    def __delitem__(self, trace_id: str) -> None:
+        """Remove a trace."""
+        del self._traces[trace_id]
+        self.bytes -= self._meta.pop(trace_id)[0]
+        self.index.remove(trace_id)
+        self._protected.discard(trace_id)
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate trace IDs from least to most recently written."""
+        return iter(self._traces)
+
+    def __len__(self) -> int:
+        """Return the number of stored traces."""
+        return len(self._traces)
+
+    def values(self):
+        """Return a view of the stored traces."""
+        return self._traces.values()
+
+    def items(self):
+        """Return a view of (trace_id, trace) pairs."""
+        return self._traces.items()
+
+    def set_fields(
+        self, trace_id: str, fields: Dict[str, Any]
+    ) -> Optional[TraceRecord]:
+        """Update top-level fields of a stored trace and return it."""
+        trace = self._traces.get(trace_id)
+        if trace is None:
+            return None
+        trace.update(fields)
+        self[trace_id] = trace
+        return trace
+
+    def query(
+        self,
+        start_us: Optional[int] = None,
+        end_us: Optional[int] = None,
+        filters: Optional[Dict[str, str]] = None,
+        newest_first: bool = False,
+        limit: Optional[int] = None,
+        after: Optional[Cursor] = None,
+        before: Optional[Cursor] = None,
+        match: Optional[Callable[[TraceRecord], bool]] = None,
+    ) -> List[TraceRecord]:
+        """Return records with start_us <= ts < end_us matching field filters.
+
+        Filters map an indexed field (result, model, user_id, session_id or
+        entity_id) to the value it must equal. ``after`` and ``before`` are
+        exclusive (ts_us, trace_id) cursors and ``match`` is an extra
+        predicate applied lazily until ``limit`` records are found.
+        """
+        if filters:
+            ids: Iterable[str] = self.index.query(
+                start_us, end_us, filters, newest_first, after, before
+            )
+        else:
+            ids = self.index.range(start_us, end_us, newest_first, after, before)
+        records = (self._traces[trace_id] for trace_id in ids)
+        if match is not None:
+            records = filter(match, records)
+        return list(islice(records, limit))
+
+    def count(
+        self,
+        start_us: Optional[int] = None,
+        end_us: Optional[int] = None,
+        filters: Optional[Dict[str, str]] = None,
+    ) -> int:
+        """Return the number of records a query would return."""
+        if filters:
+            return len(self.index.query(start_us, end_us, filters))
+        return self.index.count(start_us, end_us)
+
+    def add_listener(
+        self, listener: Callable[[str, TraceRecord], None]
+    ) -> Callable[[], None]:
+        """Call listener(trace_id, record) on every insert, update and restore.
+
+        Evictions are not reported; listeners keep their own view of traces
+        that leave the store. Returns a function removing the listener.
+        """
+        self._listeners.append(listener)
+        return lambda: self._listeners.remove(listener)
+
+    @property
+    def full(self) -> bool:
+        """Return True once the count or byte limit has been reached."""
+        return len(self._traces) >= self.max_traces or self.bytes >= self.max_bytes
+
+    def restore(self, records: Iterable[Tuple[str, TraceRecord]]) -> int:
+        """Insert records at the cold end, most recently written first.
+
+        Used to reload a snapshot while new traces may already be arriving:
+        traces already present win, expired ones are skipped, and restoring
+        stops once the store is full so it never evicts newer traces.
+        """
+        restored = 0
+        now = time.time()
+        for trace_id, record in records:
+            if self.full:
+                break
+            if trace_id in self._traces:
+                continue
+            age = max(now - record.epoch, 0.0) if record.epoch is not None else 0.0
+            if self.max_age_s is not None and age > self.max_age_s:
+                continue
+            size = record.nbytes()
+            self._meta[trace_id] = (size, time.monotonic() - age)
+            self.bytes += size
+            self._traces[trace_id] = record
+            self._traces.move_to_end(trace_id, last=False)
+            self.index.add(trace_id, record, ordered=False)
+            for listener in self._listeners:
+                listener(trace_id, record)
+            restored += 1
+        self.index.sort()
+        return restored
+
+    def protect(self, trace_id: str) -> None:
+        """Exempt a trace from eviction until released."""
+        self._protected.add(trace_id)
+
+    def release(self, trace_id: str) -> None:
+        """Make a protected trace evictable again."""
+        self._protected.discard(trace_id)
+
+    def diagnostics(self) -> Dict[str, Any]:
+        """Return size and eviction counters."""
+        return {
+            "traces": len(self._traces),
+            "bytes": self.bytes,
+            "max_traces": self.max_traces,
+            "max_bytes": self.max_bytes,
+            "max_age_s": self.max_age_s,
+            "protected": len(self._protected),
+            "evicted": self.evicted,
+        }
+
+    def _account(self, trace_id: str, trace: TraceRecord) -> None:
+        """Record the size and write time of a trace."""
+        size = trace.nbytes()
+        previous = self._meta.get(trace_id)
+        if previous is not None:
+            self.bytes -= previous[0]
+        self._meta[trace_id] = (size, time.monotonic())
+        self.bytes += size
+
+    def _over_limit(self, trace_id: str) -> bool:
+        """Return True if the store exceeds a limit with trace_id at the cold end."""
+        if len(self._traces) > self.max_traces or self.bytes > self.max_bytes:
+            return True
+        if self.max_age_s is None:
+            return False
+        return time.monotonic() - self._meta[trace_id][1] > self.max_age_s
+
+    def _evict(self) -> None:
+        """Evict cold, unprotected traces until every limit is met."""
+        skipped = []
+        while self._traces:
+            trace_id = next(iter(self._traces))
+            if not self._over_limit(trace_id):
+                break
+            if trace_id in self._protected:
+                # Park protected traces at the warm end; stop once only they remain.
+                if len(skipped) == len(self._protected):
+                    break
+                skipped.append(trace_id)
+                self._traces.move_to_end(trace_id)
+                continue
+            del self[trace_id]
+            self.evicted += 1
@@ -0,0 +1,147 @@
+"""Batched push of trace store changes to WebSocket subscribers."""
+
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from homeassistant.components import websocket_api
+from homeassistant.core import HomeAssistant, callback
+
+from .record import TraceRecord
+from .serialize import dumps
+
+DEFAULT_BATCH_MS = 250
+DEFAULT_MAX_BATCH = 500
+# Home Assistant drops a connection whose send queue stays above 1024
+# messages for a few seconds; stop pushing well before that.
+DEFAULT_MAX_LAG = 256
+
+
+def pending_messages(connection) -> Optional[int]:
+    """Return how many messages wait in the connection's send queue.
+
+    ``send_message`` is bound to Home Assistant's WebSocket handler, which
+    keeps unsent messages in ``_message_queue``. Returns ``None`` when the
+    queue cannot be read, in which case lag is not tracked.
+    """
+    handler = getattr(connection.send_message, "__self__", None)
+    queue = getattr(handler, "_message_queue", None)
+    return None if queue is None else len(queue)
+
+
+@dataclass
+class SubscriptionStats:
+    """Counters describing what a subscription has pushed."""
+
+    batches: int = 0
+    traces: int = 0
+    resyncs: int = 0
+    lagged: int = 0
+
+
+class TraceSubscription:
+    """Push matching store changes to one connection in coalesced batches.
+
+    Changes are collected per trace ID for ``batch_s`` and projected when the
+    batch is sent, so a trace updated several times in a window is sent once
+    in its latest state. ``max_batch`` caps the traces collected in a single
+    window: past it the window's buffer is dropped and the batch becomes a
+    ``resync`` marker telling the client to reload with ``preview_recent``.
+
+    Before each batch the connection's send queue is checked. If more than
+    ``max_lag`` messages have not been written to the client, it is behind:
+    buffering stops and the queue is polled every window until it is down
+    to half of ``max_lag``, when a single ``resync`` marker is sent. A slow
+    client therefore costs one marker instead of an ever longer queue that
+    ends with Home Assistant closing the connection.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        connection,
+        msg_id: int,
+        match: Optional[Callable[[TraceRecord], bool]] = None,
+        fields: Optional[List[str]] = None,
+        batch_s: float = DEFAULT_BATCH_MS / 1000,
+        max_batch: int = DEFAULT_MAX_BATCH,
+        max_lag: int = DEFAULT_MAX_LAG,
+    ) -> None:
+        """Initialize a subscription for a connection and command ID."""
+        self.hass = hass
+        self.connection = connection
+        self.msg_id = msg_id
+        self.match = match
+        self.fields = fields
+        self.batch_s = batch_s
+        self.max_batch = max_batch
+        self.max_lag = max_lag
+        self.stats = SubscriptionStats()
+        self._pending: Dict[str, TraceRecord] = {}
+        self._resync = False
+        self._lagging = False
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    @callback
+    def on_change(self, trace_id: str, record: TraceRecord) -> None:
+        """Queue an inserted or updated trace for the next batch."""
+        if self.match is not None and not self.match(record):
+            return
+        if not self._resync:
+            self._pending[trace_id] = record
+            if len(self._pending) > self.max_batch:
+                self._pending.clear()
+                self._resync = True
+        if self._timer is None:
+            self._timer = self.hass.loop.call_later(self.batch_s, self.flush)
+
+    @callback
+    def flush(self) -> None:
+        """Send the buffered traces, or a resync marker after an overflow."""
+        self._timer = None
+        pending = pending_messages(self.connection)
+        if self._lagging:
+            if pending is not None and pending > self.max_lag // 2:
+                self._timer = self.hass.loop.call_later(self.batch_s, self.flush)
+                return
+            self._lagging = False
+        elif pending is not None and pending > self.max_lag:
+            self._lagging = self._resync = True
+            self._pending.clear()
+            self.stats.lagged += 1
+            self._timer = self.hass.loop.call_later(self.batch_s, self.flush)
+            return
+        if self._resync:
+            self._resync = False
+            self.stats.resyncs += 1
+            self._send({"resync": True})
+            return
+        if not self._pending:
+            return
+        records, self._pending = list(self._pending.values()), {}
+        self.stats.batches += 1
+        self.stats.traces += len(records)
+        self._send(
+            {
+                "traces": [
+                    record.project(self.fields) if self.fields else record.to_dict()
+                    for record in records
+                ]
+            }
+        )
+
+    @callback
+    def cancel(self) -> None:
+        """Stop pushing and drop anything buffered."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._pending.clear()
+
+    def _send(self, event: Dict[str, Any]) -> None:
+        """Send an event message on the subscription."""
+        self.connection.send_message(
+            dumps(websocket_api.messages.event_message(self.msg_id, event))
+        )
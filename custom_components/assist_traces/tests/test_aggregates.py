@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+from custom_components.assist_traces.aggregates import RollingAggregates
+from custom_components.assist_traces.store import TraceStore
+
+T0 = 1717200000  # 2024-06-01T00:00:00Z
+
+
+def _trace(trace_id: str, offset_s: int, **fields) -> dict:
+    ts = datetime.fromtimestamp(T0 + offset_s, timezone.utc).isoformat()
+    return {"trace_id": trace_id, "ts": ts, **fields}
+
+
+def _store(aggregates: RollingAggregates, **kwargs) -> TraceStore:
+    store = TraceStore(**kwargs)
+    store.add_listener(aggregates.update)
+    return store
+
+
+def test_aggregates_follow_inserts_and_result_changes():
+    now = [T0 + 600]
+    aggregates = RollingAggregates(window_s=3600, clock=lambda: now[0])
+    store = _store(aggregates)
+    store["a"] = _trace("a", 0, latency_ms=100)
+    store["b"] = _trace("b", 120, latency_ms=300)
+    assert (aggregates.count, aggregates.fails) == (2, 0)
+    assert aggregates.mean_latency_ms == 200
+    store.set_fields("b", {"result": "fail"})
+    store.set_fields("b", {"result": "fail"})
+    assert (aggregates.count, aggregates.fails) == (2, 1)
+    assert aggregates.fail_rate == 0.5
+
+    now[0] = T0 + 3600 + 60
+    assert aggregates.count == 1
+    now[0] = T0 + 3600 + 180
+    assert (aggregates.count, aggregates.fails) == (0, 0)
+    assert aggregates.diagnostics()["buckets"] == 0
+    store["c"] = _trace("c", 0, latency_ms=50)
+    assert aggregates.count == 0
+
+
+def test_aggregates_ignore_eviction():
+    aggregates = RollingAggregates(clock=lambda: T0 + 60)
+    store = _store(aggregates, max_traces=1)
+    for trace_id in ("a", "b", "c"):
+        store[trace_id] = _trace(trace_id, 30, result="fail")
+    assert len(store) == 1
+    assert (aggregates.count, aggregates.fails) == (3, 3)
@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import pytest
+
+from custom_components.assist_traces.cold import ColdIndex
+from custom_components.assist_traces.reader import TraceReader
+from custom_components.assist_traces.writer import TraceWriter, WriterConfig
+
+
+@pytest.mark.asyncio
+async def test_cold_index_points_at_written_blocks(tmp_path):
+    cold = ColdIndex(tmp_path / "index.sqlite3")
+    cold.open()
+    writer = TraceWriter(
+        WriterConfig(directory=str(tmp_path), batch_ms=0, block_rows=3),
+        cold_index=cold,
+    )
+    await writer.start()
+    for i in range(7):
+        await writer.enqueue(
+            {
+                "trace_id": f"t{i}",
+                "ts": f"2024-06-01T{i:02d}:00:00",
+                "model": "m",
+                "result": "fail" if i % 2 else "success",
+            }
+        )
+    await writer.flush()
+    await writer.stop()
+
+    entry = cold.lookup("t4")
+    assert entry.partition == "2024/06/01/model=m"
+    assert (entry.ts, entry.model, entry.result) == (
+        "2024-06-01T04:00:00",
+        "m",
+        "success",
+    )
+    trace = TraceReader(str(tmp_path)).read_entry(entry)
+    assert trace["trace_id"] == "t4"
+    assert cold.lookup("missing") is None
+    assert cold.diagnostics() == {"traces": 7, "feedback": 0}
+    cold.close()
+
+
+def test_cold_index_feedback_side_table(tmp_path):
+    cold = ColdIndex(tmp_path / "index.sqlite3")
+    cold.open()
+    gold = {"service": "light.turn_on", "target": {"entity_id": ["light.a"]}}
+    cold.set_feedback("old", {"user_feedback": "down", "gold_action": gold})
+    cold.set_feedback("other", {"user_feedback": "up"})
+    assert cold.feedback(["old"]) == {
+        "old": {"user_feedback": "down", "repair_text": None, "gold_action": gold}
+    }
+    assert set(cold.feedback()) == {"old", "other"}
+    cold.close()
+    reopened = ColdIndex(tmp_path / "index.sqlite3")
+    reopened.open()
+    assert reopened.feedback(["other"])["other"]["user_feedback"] == "up"
+    reopened.close()
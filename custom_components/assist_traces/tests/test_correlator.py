@@ -5,36 +5,107 @@ import pytest
 
 from custom_components.assist_traces.const import DATA_TRACES
 from custom_components.assist_traces.correlator import Correlator
+from custom_components.assist_traces.store import TraceStore
 
 
 @pytest.mark.asyncio
 async def test_correlator_success(hass):
-    hass.data[DATA_TRACES] = {
-        "1": {
-            "trace_id": "1",
-            "ts": "2024-06-01T00:00:00",
-            "model": "m",
-            "result": "unknown",
-        }
+    hass.data[DATA_TRACES] = TraceStore()
+    hass.data[DATA_TRACES]["1"] = {
+        "trace_id": "1",
+        "ts": "2024-06-01T00:00:00",
+        "model": "m",
+        "result": "unknown",
     }
     correlator = Correlator(hass, window=1)
     await correlator.add_trace("1", ["light.kitchen"])
-    hass.bus.async_fire("state_changed", {"entity_id": "light.kitchen"})
+    hass.states.async_set("light.kitchen", "on")
     await asyncio.sleep(0.1)
     assert hass.data[DATA_TRACES]["1"]["result"] == "success"
 
 
 @pytest.mark.asyncio
 async def test_correlator_fail(hass):
-    hass.data[DATA_TRACES] = {
-        "2": {
-            "trace_id": "2",
-            "ts": "2024-06-01T00:00:00",
-            "model": "m",
-            "result": "unknown",
-        }
+    hass.data[DATA_TRACES] = TraceStore()
+    hass.data[DATA_TRACES]["2"] = {
+        "trace_id": "2",
+        "ts": "2024-06-01T00:00:00",
+        "model": "m",
+        "result": "unknown",
     }
     correlator = Correlator(hass, window=0.1)
     await correlator.add_trace("2", ["light.kitchen"])
-    await correlator._timeout("2")
+    await asyncio.sleep(0.2)
     assert hass.data[DATA_TRACES]["2"]["result"] == "fail"
+
+
+@pytest.mark.asyncio
+async def test_correlator_tracks_only_watched_entities_with_one_timer(hass):
+    store = hass.data[DATA_TRACES] = TraceStore()
+    for i in range(4):
+        store[f"t{i}"] = {"trace_id": f"t{i}", "ts": "2024-06-01T00:00:00"}
+    correlator = Correlator(hass, window=0.1)
+    await correlator.add_trace("t0", ["light.a", "light.b"])
+    await correlator.add_trace("t1", ["light.b"])
+    await correlator.add_trace("t2", ["light.c"], delay=0.3)
+    await correlator.add_trace("t3", ["light.d"], delay=0.05)
+    assert set(correlator._tracking) == {"light.a", "light.b", "light.c", "light.d"}
+
+    hass.states.async_set("sensor.noise", "1")
+    hass.states.async_set("light.b", "on")
+    await asyncio.sleep(0)
+    assert "result" not in store["t0"]
+    assert store["t1"]["result"] == "success"
+    assert set(correlator._tracking) == {"light.a", "light.b", "light.c", "light.d"}
+
+    await asyncio.sleep(0.15)
+    assert (store["t0"]["result"], store["t3"]["result"]) == ("partial", "fail")
+    assert "result" not in store["t2"]
+    assert set(correlator._tracking) == {"light.c"}
+    hass.states.async_set("light.c", "on")
+    await asyncio.sleep(0)
+    assert store["t2"]["result"] == "success"
+    assert correlator.pending == {} and correlator._tracking == {}
+    correlator.stop()
+
+
+@pytest.mark.asyncio
+async def test_correlator_matches_expected_state(hass):
+    store = hass.data[DATA_TRACES] = TraceStore()
+    for i in range(4):
+        store[f"t{i}"] = {"trace_id": f"t{i}", "ts": "2024-06-01T00:00:00"}
+    hass.states.async_set("light.desk", "on", {"brightness": 255})
+    hass.states.async_set("climate.hall", "heat", {"temperature": 19})
+    hass.states.async_set("light.porch", "on")
+    correlator = Correlator(hass, window=0.1)
+    await correlator.add_trace(
+        "t0", ["light.desk"], action={"service": "light.turn_off"}
+    )
+    await correlator.add_trace(
+        "t1",
+        ["climate.hall"],
+        action={"service": "climate.set_temperature", "data": {"temperature": 21.5}},
+    )
+    await correlator.add_trace(
+        "t2",
+        ["light.desk"],
+        action={"service": "light.turn_on", "data": {"brightness_pct": 50}},
+    )
+    await correlator.add_trace(
+        "t3", ["light.porch"], action={"service": "light.turn_on"}
+    )
+
+    hass.states.async_set("light.desk", "on", {"brightness": 128})
+    hass.states.async_set("climate.hall", "heat", {"temperature": 19, "current": 20})
+    await asyncio.sleep(0)
+    assert store["t2"]["result"] == "success"
+    assert "result" not in store["t0"] and "result" not in store["t1"]
+    hass.states.async_set("light.desk", "off")
+    hass.states.async_set("climate.hall", "heat", {"temperature": 21.5})
+    await asyncio.sleep(0)
+    assert (store["t0"]["result"], store["t1"]["result"]) == ("success", "success")
+
+    # The porch light was already on, so turning it on succeeds at the deadline.
+    await asyncio.sleep(0.15)
+    assert store["t3"]["result"] == "success"
+    correlator.stop()
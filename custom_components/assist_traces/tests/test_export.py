@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+
+import pytest
+
+from custom_components.assist_traces.cold import ColdIndex
+from custom_components.assist_traces.const import DATA_COLD, DATA_TRACES
+from custom_components.assist_traces.export import (
+    EVENT_EXPORT,
+    ExportCancelled,
+    ExportManager,
+    ExportProgress,
+    INDEX_NAME,
+    WRITE_ROWS,
+    split_of,
+    write_export,
+)
+from custom_components.assist_traces.reader import TraceReader
+from custom_components.assist_traces.store import TraceStore
+from custom_components.assist_traces.writer import TraceWriter, WriterConfig
+
+
+@pytest.mark.asyncio
+async def test_export_streams_latest_versions_from_disk_and_store(hass, tmp_path):
+    sink = tmp_path / "sink"
+    cold = ColdIndex(sink / "index.sqlite3")
+    cold.open()
+    writer = TraceWriter(
+        WriterConfig(directory=str(sink), batch_ms=0, block_rows=4), cold_index=cold
+    )
+    await writer.start()
+    for i in range(10):
+        await writer.enqueue(
+            {"trace_id": f"t{i}", "ts": "2024-06-01T00:00:00", "model": "m"}
+        )
+    # Later versions of t1 land in another block; t2 is still in memory.
+    await writer.enqueue(
+        {"trace_id": "t1", "ts": "2024-06-01T00:00:00", "model": "m", "user_text": "x"}
+    )
+    await writer.flush()
+    await writer.stop()
+    store = hass.data[DATA_TRACES] = TraceStore()
+    store["t2"] = {"trace_id": "t2", "ts": "2024-06-01T00:00:00", "user_text": "a@b.io"}
+    cold.set_feedback("t3", {"gold_action": {"service": "light.turn_on"}})
+    hass.data[DATA_COLD] = cold
+
+    events = []
+    hass.bus.async_listen(EVENT_EXPORT, lambda event: events.append(event.data))
+    manager = ExportManager(hass, TraceReader(str(sink)), "basic")
+    out = tmp_path / "datasets" / "sft.jsonl.gz"
+    result = await manager.run("sft", str(out), export_id="e1")
+    await hass.async_block_till_done()
+    cold.close()
+
+    with gzip.open(out, "rb") as f:
+        rows = {row["trace_id"]: row for row in map(json.loads, f)}
+    assert sorted(rows) == sorted(f"t{i}" for i in range(10))
+    assert rows["t1"]["instruction"] == "x"
+    assert rows["t2"]["instruction"] == "<EMAIL>"
+    assert rows["t3"]["source"] == "gold"
+    assert result["state"] == "done"
+    assert (result["rows"], result["scanned"], result["superseded"]) == (10, 11, 1)
+    assert [e["state"] for e in events][0] == "running"
+    assert events[-1] == result
+    assert manager.running == {}
+
+    manager.running["e2"] = ExportProgress("e2", "sft", "")
+    with pytest.raises(ValueError):
+        await manager.run("sft", str(tmp_path / "dup.jsonl.gz"), export_id="e2")
+    assert not (tmp_path / "dup.jsonl.gz").exists()
+    assert list(manager.running) == ["e2"]
+
+
+def test_cancelled_export_leaves_no_file(tmp_path):
+    progress = ExportProgress("e1", "prefs", str(tmp_path / "out.jsonl.gz"))
+    progress.cancel.set()
+    traces = ({"trace_id": str(i)} for i in range(2000))
+    with pytest.raises(ExportCancelled):
+        write_export(tmp_path / "out.jsonl.gz", "prefs", traces, {}, None, progress)
+    assert list(tmp_path.iterdir()) == []
+    assert progress.rows == WRITE_ROWS
+
+
+@pytest.mark.asyncio
+async def test_sharded_export_writes_indexed_splits(hass, tmp_path):
+    sink = tmp_path / "sink"
+    writer = TraceWriter(WriterConfig(directory=str(sink), batch_ms=0, block_rows=8))
+    await writer.start()
+    for i in range(60):
+        await writer.enqueue(
+            {
+                "trace_id": f"t{i}",
+                "ts": f"2024-06-{i % 3 + 1:02d}T00:00:00",
+                "model": "m",
+                "user_text": f"command {i}",
+            }
+        )
+    await writer.flush()
+    await writer.stop()
+    store = hass.data[DATA_TRACES] = TraceStore()
+    store["t60"] = {"trace_id": "t60", "ts": "2024-06-01T00:00:00"}
+
+    manager = ExportManager(hass, TraceReader(str(sink)), "basic", processes=2)
+    out = tmp_path / "sft"
+    result = await manager.run("sft", str(out), shards=2, validation=0.25)
+
+    index = json.loads((out / INDEX_NAME).read_bytes())
+    seen = {}
+    for split, info in index["splits"].items():
+        assert [f["path"] for f in info["files"]] == [
+            f"{split}/sft-00000-of-00002.jsonl.gz",
+            f"{split}/sft-00001-of-00002.jsonl.gz",
+        ]
+        for entry in info["files"]:
+            data = (out / entry["path"]).read_bytes()
+            assert hashlib.sha256(data).hexdigest() == entry["sha256"]
+            rows = [json.loads(line) for line in gzip.decompress(data).splitlines()]
+            assert len(rows) == entry["rows"]
+            seen.update((row["trace_id"], split) for row in rows)
+    assert seen == {f"t{i}": split_of(f"t{i}", 0.25) for i in range(61)}
+    assert 0 < index["splits"]["validation"]["rows"] < 30
+    assert (result["state"], result["rows"], result["shards_done"]) == ("done", 61, 2)
+    assert result["partitions_done"] == 3
+    assert not list(out.rglob("*.tmp"))
@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import gzip
+import json
+from datetime import datetime
+
+import pytest
+
+from custom_components.assist_traces.cold import ColdIndex
+from custom_components.assist_traces.history import HistoryEngine, HistoryQuery
+from custom_components.assist_traces.reader import TraceReader
+from custom_components.assist_traces.redact import pseudonym, redact
+from custom_components.assist_traces.writer import TraceWriter, WriterConfig
+
+
+async def _engine(hass, tmp_path) -> HistoryEngine:
+    writer = TraceWriter(
+        WriterConfig(directory=str(tmp_path), batch_ms=0, block_rows=5)
+    )
+    await writer.start()
+    for day in (1, 2, 3):
+        for i in range(20):
+            await writer.enqueue(
+                {
+                    "trace_id": f"d{day}-{i}",
+                    "ts": f"2024-06-0{day}T{i:02d}:00:00",
+                    "model": "a" if i % 2 else "b",
+                    "result": "fail" if i % 5 == 0 else "success",
+                    "latency_ms": 100 * (i + 1),
+                    "user_text": f"turn on lamp {i}",
+                    "prompt_rendered": "x" * 200,
+                }
+            )
+    await writer.flush()
+    await writer.stop()
+    return HistoryEngine(hass, TraceReader(str(tmp_path)), workers=3)
+
+
+@pytest.mark.asyncio
+async def test_history_scan_prunes_filters_and_streams_chunks(hass, tmp_path):
+    engine = await _engine(hass, tmp_path)
+    query = HistoryQuery(
+        start=datetime(2024, 6, 2),
+        end=datetime(2024, 6, 3, 10),
+        model="a",
+        fields=["result"],
+    )
+    chunks = [chunk async for chunk in engine.scan(query, limit=100, chunk_size=4)]
+    rows = [row for chunk in chunks for row in chunk]
+    assert [len(chunk) for chunk in chunks] == [4, 4, 4, 3]
+    assert [row["trace_id"] for row in rows[:3]] == ["d2-1", "d2-3", "d2-5"]
+    assert rows[-1]["trace_id"] == "d3-9"
+    assert set(rows[0]) == {"trace_id", "ts", "result"}
+
+    text = HistoryQuery(result="fail", text="LAMP 10")
+    rows = [row async for chunk in engine.scan(text, 100, 100) for row in chunk]
+    assert sorted(row["trace_id"] for row in rows) == ["d1-10", "d2-10", "d3-10"]
+
+    limited = [c async for c in engine.scan(HistoryQuery(), limit=7, chunk_size=5)]
+    assert [len(chunk) for chunk in limited] == [5, 2]
+
+
+@pytest.mark.asyncio
+async def test_history_aggregate_counts_and_quantiles(hass, tmp_path):
+    engine = await _engine(hass, tmp_path)
+    summary = await engine.aggregate(HistoryQuery(start=datetime(2024, 6, 3)))
+    assert summary["count"] == 20
+    assert summary["counts"] == {"fail": 4, "success": 16}
+    latency = summary["latency_ms"]
+    assert latency["count"] == 20
+    assert abs(latency["p50"] - 1000) <= 20
+    assert abs(latency["p99"] - 1900) <= 40
+    empty = await engine.aggregate(HistoryQuery(model="missing"))
+    assert empty["count"] == 0 and empty["latency_ms"]["p50"] is None
+
+
+@pytest.mark.asyncio
+async def test_history_counts_rewritten_traces_once(hass, tmp_path):
+    cold = ColdIndex(tmp_path / "index.sqlite3")
+    cold.open()
+    writer = TraceWriter(
+        WriterConfig(directory=str(tmp_path), batch_ms=0, block_rows=3),
+        cold_index=cold,
+    )
+    await writer.start()
+    trace = {"ts": "2024-06-01T00:00:00", "model": "m", "latency_ms": 100}
+    for i in range(4):
+        await writer.enqueue({**trace, "trace_id": f"t{i}", "result": "unknown"})
+    # t0 resolves in a later block, t3 twice within the same block.
+    for trace_id, result in (("t0", "success"), ("t3", "fail"), ("t3", "success")):
+        await writer.enqueue({**trace, "trace_id": trace_id, "result": result})
+    await writer.flush()
+    await writer.stop()
+    engine = HistoryEngine(hass, TraceReader(str(tmp_path)), workers=2, cold=cold)
+
+    summary = await engine.aggregate(HistoryQuery())
+    assert summary["counts"] == {"success": 2, "unknown": 2}
+    assert summary["latency_ms"]["count"] == 4
+    rows = [
+        row async for chunk in engine.scan(HistoryQuery(), 100, 100) for row in chunk
+    ]
+    assert sorted((row["trace_id"], row["result"]) for row in rows) == [
+        ("t0", "success"),
+        ("t1", "unknown"),
+        ("t2", "unknown"),
+        ("t3", "success"),
+    ]
+    cold.close()
+
+
+@pytest.mark.asyncio
+async def test_history_reads_legacy_files_and_filters_pseudonymous_users(
+    hass, tmp_path
+):
+    def trace(i, user):
+        return redact(
+            {"trace_id": f"t{i}", "ts": f"2024-06-01T0{i}:00:00", "model": "m"}
+            | {"user_id": user, "result": "success"},
+            "basic",
+        )
+
+    partition = tmp_path / "2024" / "06" / "01" / "model=m"
+    partition.mkdir(parents=True)
+    # Written before segments: one gzip member per time the file was opened.
+    for rows in ([trace(0, "u1"), trace(1, "u2")], [trace(2, "u1")]):
+        with gzip.open(partition / "part.jsonl.gz", "ab") as f:
+            f.writelines(json.dumps(row).encode() + b"\n" for row in rows)
+    writer = TraceWriter(WriterConfig(directory=str(tmp_path), batch_ms=0))
+    await writer.start()
+    await writer.enqueue(trace(3, "u1"))
+    await writer.flush()
+    await writer.stop()
+
+    engine = HistoryEngine(hass, TraceReader(str(tmp_path)), workers=2)
+    query = HistoryQuery(user_id=pseudonym("u1"))
+    rows = [row async for chunk in engine.scan(query, 100, 100) for row in chunk]
+    assert sorted(row["trace_id"] for row in rows) == ["t0", "t2", "t3"]
+    assert (partition / "part.idx.jsonl").exists()
+    summary = await engine.aggregate(HistoryQuery())
+    assert summary["count"] == 4
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import random
+from datetime import datetime, timedelta, timezone
+
+from custom_components.assist_traces.quantiles import (
+    DDSketch,
+    LatencyQuantiles,
+    stage_durations,
+)
+from custom_components.assist_traces.store import TraceStore
+
+T0 = 1717200000  # 2024-06-01T00:00:00Z
+
+
+def _ts(offset_s: float) -> str:
+    return datetime.fromtimestamp(T0 + offset_s, timezone.utc).isoformat()
+
+
+def _events(pipeline: str, stt_ms: int, tts_ms: int) -> list:
+    start = datetime.fromtimestamp(T0, timezone.utc)
+    at = lambda ms: (start + timedelta(milliseconds=ms)).isoformat()  # noqa: E731
+    return [
+        {"type": "run-start", "timestamp": at(0), "data": {"pipeline": pipeline}},
+        {"type": "stt-start", "timestamp": at(0)},
+        {"type": "stt-end", "timestamp": at(stt_ms)},
+        {"type": "tts-start", "timestamp": at(stt_ms)},
+        {"type": "tts-end", "timestamp": at(stt_ms + tts_ms)},
+    ]
+
+
+def test_sketch_quantiles_within_relative_error():
+    rng = random.Random(7)
+    values = sorted(rng.lognormvariate(6, 1) for _ in range(20000))
+    sketch = DDSketch(alpha=0.01)
+    for value in values:
+        sketch.add(value)
+    for q in (0.5, 0.9, 0.99):
+        exact = values[int(q * (len(values) - 1))]
+        assert abs(sketch.quantile(q) - exact) <= 0.011 * exact
+
+
+def test_sketch_merge_and_bounded_buckets():
+    left, right = DDSketch(), DDSketch()
+    for value in range(1, 1001):
+        (left if value % 2 else right).add(value)
+    left.merge(right)
+    assert left.count == 1000
+    assert abs(left.quantile(0.5) - 500) <= 10
+
+    small = DDSketch(max_buckets=16)
+    for value in range(1, 100000, 7):
+        small.add(value)
+    assert len(small.bins) <= 16
+    assert abs(small.quantile(0.99) - 99000) <= 0.011 * 99000
+    assert DDSketch().quantile(0.5) is None
+
+
+def test_stage_durations_from_pipeline_events():
+    assert stage_durations(_events("p1", 250, 400)) == {
+        "stt_ms": 250.0,
+        "tts_ms": 400.0,
+    }
+
+
+def test_quantiles_by_model_pipeline_and_window():
+    now = [T0 + 600]
+    quantiles = LatencyQuantiles(window_s=7200, clock=lambda: now[0])
+    store = TraceStore()
+    store.add_listener(quantiles.update)
+    for i in range(100):
+        store[f"a{i}"] = {
+            "trace_id": f"a{i}",
+            "ts": _ts(i),
+            "model": "fast",
+            "latency_ms": 100 + i,
+            "events": _events("p1", 200, 300),
+        }
+    store["b"] = {
+        "trace_id": "b",
+        "ts": _ts(3700),
+        "model": "slow",
+        "latency_ms": 5000,
+    }
+    store.set_fields("a1", {"latency_ms": 99999})
+
+    # a1 was observed once, so its later latency change is ignored.
+    assert abs(quantiles.quantile("latency_ms", 0.5, "model:fast") - 150) <= 2
+    assert abs(quantiles.quantile("latency_ms", 0.99, "model:slow") - 5000) <= 50
+    assert abs(quantiles.quantile("stt_ms", 0.9, "pipeline:p1") - 200) <= 2
+    summary = quantiles.summary()
+    assert summary["latency_ms"]["all"]["count"] == 101
+    assert summary["tts_ms"]["pipeline:p1"]["count"] == 100
+
+    now[0] = T0 + 7200 + 60
+    assert quantiles.quantile("latency_ms", 0.5, "model:fast") is None
+    assert quantiles.summary()["latency_ms"]["all"]["count"] == 1
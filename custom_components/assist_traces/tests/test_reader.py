@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import gzip
+from datetime import datetime
+
+import pytest
+
+from custom_components.assist_traces.reader import TraceReader
+from custom_components.assist_traces.segments import read_block_index
+from custom_components.assist_traces.writer import TraceWriter, WriterConfig
+
+
+async def _write(tmp_path, traces, **kwargs):
+    writer = TraceWriter(WriterConfig(directory=str(tmp_path), batch_ms=0, **kwargs))
+    await writer.start()
+    for trace in traces:
+        await writer.enqueue(trace)
+    await writer.flush()
+    await writer.stop()
+    return writer
+
+
+@pytest.mark.asyncio
+async def test_blocks_are_independent_gzip_members(tmp_path):
+    traces = [
+        {"trace_id": f"t{i}", "ts": f"2024-06-01T{i:02d}:00:00", "model": "m"}
+        for i in range(10)
+    ]
+    writer = await _write(tmp_path, traces, block_rows=4)
+    assert writer.stats.blocks == 3
+    partition = tmp_path / "2024" / "06" / "01" / "model=m"
+    blocks = list(read_block_index(partition, "part-00000.jsonl.gz"))
+    assert [b.rows for b in blocks] == [4, 4, 2]
+    assert blocks[1].trace_ids == ["t4", "t5", "t6", "t7"]
+    assert (blocks[1].min_ts, blocks[1].max_ts) == (
+        "2024-06-01T04:00:00",
+        "2024-06-01T07:00:00",
+    )
+    with open(partition / "part-00000.jsonl.gz", "rb") as f:
+        f.seek(blocks[1].offset)
+        member = f.read(blocks[1].length)
+    assert gzip.decompress(member).count(b"\n") == 4
+    with gzip.open(partition / "part-00000.jsonl.gz", "rb") as f:
+        assert len(f.readlines()) == 10
+
+
+@pytest.mark.asyncio
+async def test_reader_finds_trace_and_time_slice(tmp_path):
+    traces = [
+        {"trace_id": f"t{i}", "ts": f"2024-06-0{1 + i % 3}T{i:02d}:00:00", "model": m}
+        for i in range(12)
+        for m in ("a", "b")
+    ]
+    await _write(tmp_path, traces, block_rows=2)
+    reader = TraceReader(str(tmp_path))
+    assert reader.find_trace("t7")["ts"] == "2024-06-02T07:00:00"
+    assert reader.find_trace("t7", ts="2024-06-02T07:00:00")["trace_id"] == "t7"
+    assert reader.find_trace("t7", ts="2024-06-03T07:00:00") is None
+    assert reader.find_trace("missing") is None
+    rows = list(
+        reader.read_range(datetime(2024, 6, 2, 4), datetime(2024, 6, 2, 10), "a")
+    )
+    assert sorted(r["trace_id"] for r in rows) == ["t4", "t7"]
@@ -1,6 +1,11 @@
 from __future__ import annotations
 
-from custom_components.assist_traces.redact import redact
+from custom_components.assist_traces.redact import (
+    RedactionCache,
+    Redactor,
+    pseudonym,
+    redact,
+)
 
 
 def test_basic_redaction():
@@ -15,3 +20,54 @@ def test_strict_redaction_names():
     out = redact(data, "strict", ["Teagan"])
     assert out["user"] == "<NAME_0>"
     assert out["msg"] == "<NAME_0> did it"
+
+
+def test_user_ids_get_stable_pseudonyms():
+    out = redact({"user_id": "abc123", "context": {"user_id": "abc123"}}, "strict")
+    assert out["user_id"] == out["context"]["user_id"] == pseudonym("abc123")
+    assert out["user_id"].startswith("<USER_")
+    assert pseudonym(out["user_id"]) == out["user_id"]
+    assert pseudonym("other") != out["user_id"]
+
+
+def test_redaction_all_patterns_and_unchanged_containers():
+    data = {
+        "msg": "Mail a@b.io from 10.0.0.1 at 00:11:22:33:44:55 via ssid-Home",
+        "events": [{"type": "intent-start", "data": {"language": "en"}}],
+        "names": ["Living Room lamp", "Living room"],
+    }
+    out = redact(data, "strict", ["Living", "Living Room"])
+    assert out["msg"] == "Mail <EMAIL> from <IP> at <MAC> via <SSID>"
+    assert out["events"] is data["events"]
+    assert out["names"] == ["<NAME_1> lamp", "<NAME_1>"]
+    assert redact(data, "none") is data
+
+
+def test_specific_patterns_win_over_addresses():
+    assert redact("see 3 https://foo.com/user/alice?q=1", "basic") == "see 3 <URL>"
+    assert redact("10 john.doe@gmail.com", "basic") == "10 <EMAIL>"
+    # The IP is replaced before the address pattern sees "12 at ".
+    assert redact("room 12 at 192.168.1.20 now", "basic") == "room <ADDR><IP> now"
+    assert redact("7 aa:bb:cc:dd:ee:ff", "basic") == "7 <MAC>"
+
+
+def test_redaction_cache_reuses_lines_of_long_strings():
+    cache = RedactionCache()
+    cached = Redactor("strict", ("Teagan",), cache=cache)
+    uncached = Redactor("strict", ("Teagan",), cache=None)
+    devices = "".join(f"light.lamp_{i} 'Lamp {i}' = on\n" for i in range(40))
+    prompts = [
+        f"Time: 2024-06-0{day}T10:00:00\nCall 555 123 4567\n{devices}Ask Teagan"
+        for day in range(1, 4)
+    ]
+    for prompt in prompts:
+        assert cached.string(prompt, cached.names) == uncached.string(
+            prompt, uncached.names
+        )
+    info = cache.diagnostics()
+    assert info["misses"] == 43 + 2
+    assert info["hits"] == 2 * (40 + 2)
+    assert cached.string("no pii here", ()) == "no pii here"
+    assert cached.string("mail a@b.io", ()) == "mail <EMAIL>"
+    assert cached.string("mail a@b.io", ()) == "mail <EMAIL>"
+    assert cache.diagnostics()["hits"] == 2 * (40 + 2) + 1
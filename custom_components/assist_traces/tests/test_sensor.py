@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+from custom_components.assist_traces.aggregates import RollingAggregates
+from custom_components.assist_traces.sensor import AssistTracesSensor, SensorRefresher
+from custom_components.assist_traces.store import TraceStore
+
+
+def _trace(trace_id: str, **fields) -> dict:
+    ts = datetime.now(timezone.utc).isoformat()
+    return {"trace_id": trace_id, "ts": ts, **fields}
+
+
+@pytest.mark.asyncio
+async def test_sensors_refresh_debounced_and_only_on_change(hass):
+    store = TraceStore()
+    aggregates = RollingAggregates()
+    store.add_listener(aggregates.update)
+    count = AssistTracesSensor(hass, "count", lambda: aggregates.count)
+    fails = AssistTracesSensor(hass, "fails", lambda: aggregates.fails)
+    writes = []
+    for sensor in (count, fails):
+        sensor.hass = hass
+        sensor.async_write_ha_state = lambda s=sensor: writes.append(s.name)
+    refresher = SensorRefresher(hass, [count, fails], debounce_s=0.05)
+    store.add_listener(refresher.on_change)
+
+    for i in range(50):
+        store[f"t{i}"] = _trace(f"t{i}", latency_ms=10)
+    assert count.state == 0
+    await asyncio.sleep(0.15)
+    assert (count.state, fails.state) == (50, 0)
+    assert writes == ["count"]
+
+    store.set_fields("t1", {"latency_ms": 20})
+    await asyncio.sleep(0.15)
+    assert writes == ["count"]
+
+    store.set_fields("t2", {"result": "fail"})
+    await asyncio.sleep(0.15)
+    assert fails.state == 1
+    assert writes == ["count", "fails"]
+    refresher.async_cancel()
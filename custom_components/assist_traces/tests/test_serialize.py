@@ -0,0 +1,24 @@
+from __future__ import annotations
+
+import json
+from datetime import datetime
+
+from custom_components.assist_traces.models import AssistTrace
+from custom_components.assist_traces.serialize import dumps, dumps_line, loads
+
+
+def test_dumps_handles_datetimes_and_models():
+    trace = AssistTrace(trace_id="1", ts=datetime(2024, 6, 1, 12, 30))
+    out = dumps({"ts": datetime(2024, 6, 1), "trace": trace, "tags": {"a"}})
+    assert isinstance(out, bytes)
+    obj = json.loads(out)
+    assert obj["ts"] == "2024-06-01T00:00:00"
+    assert obj["trace"]["ts"] == "2024-06-01T12:30:00"
+    assert obj["tags"] == ["a"]
+
+
+def test_dumps_line_round_trip():
+    row = {"instruction": "Turn on the lights ✓", "output": {"service": "light.on"}}
+    line = dumps_line(row)
+    assert line.endswith(b"\n") and line.count(b"\n") == 1
+    assert loads(line) == row
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import random
+
+import pytest
+
+from custom_components.assist_traces.simhash import (
+    NearDuplicateFilter,
+    bands,
+    row_features,
+    simhash,
+)
+
+
+def _row(text, source="implicit_success", **extra):
+    return {
+        "instruction": text,
+        "context": {"area": "Kitchen"},
+        "source": source,
+        **extra,
+    }
+
+
+def test_simhash_ignores_case_and_punctuation():
+    a = simhash(row_features(_row("Turn on the kitchen light!")))
+    b = simhash(row_features(_row("turn on   the kitchen light")))
+    c = simhash(row_features(_row("what is the weather like in paris tomorrow")))
+    assert a == b
+    assert (a ^ c).bit_count() > 10
+
+
+def test_bands_find_every_signature_within_distance():
+    rng = random.Random(0)
+    for distance in (0, 3, 7):
+        layout = bands(distance)
+        assert sum(mask.bit_length() for _, mask in layout) == 64
+        for _ in range(200):
+            sig = rng.getrandbits(64)
+            other = sig
+            for bit in rng.sample(range(64), distance):
+                other ^= 1 << bit
+            assert any(
+                sig >> shift & mask == other >> shift & mask for shift, mask in layout
+            )
+    with pytest.raises(ValueError):
+        bands(32)
+
+
+def test_filter_keeps_first_seen_order_and_prefers_gold():
+    dedup = NearDuplicateFilter(max_distance=3, window=2)
+    rows = [
+        _row("Turn on the kitchen light", trace_id="1"),
+        _row("what is the weather like in paris tomorrow", trace_id="2"),
+        _row("turn on the kitchen light.", "gold", trace_id="3"),
+        _row("tell me a joke about cats and dogs", trace_id="4"),
+        _row("set a timer for ten minutes please", trace_id="5"),
+        _row("What is the weather like in Paris tomorrow?", "gold", trace_id="6"),
+        _row("turn on the kitchen light", trace_id="7"),
+    ]
+    kept = [row["trace_id"] for row in dedup.filter(rows)]
+    # 3 replaces 1 while pending; 6 arrives after 2 was written and is kept
+    # straight away.
+    assert kept == ["3", "2", "6", "4", "5"]
+    assert dedup.stats.duplicates == 2
+    assert (dedup.stats.replaced, dedup.stats.promoted) == (1, 1)
+
+
+def test_filter_bounds_its_index():
+    dedup = NearDuplicateFilter(window=4, max_index=8)
+    rows = [_row(f"unique command number {i} " * 3) for i in range(50)]
+    assert len(list(dedup.filter(rows))) == 50
+    assert len(dedup._entries) == 8
+    assert dedup.stats.evicted == 42
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+import pytest
+
+from custom_components.assist_traces.const import DATA_TRACES, DOMAIN
+from custom_components.assist_traces.correlator import Correlator
+from custom_components.assist_traces.snapshot import (
+    StoreSnapshotter,
+    read_snapshot,
+    write_snapshot,
+)
+from custom_components.assist_traces.store import TraceStore
+
+
+def _trace(i: int) -> dict:
+    return {
+        "trace_id": f"t{i}",
+        "ts": f"2024-06-01T00:{i:02d}:00",
+        "model": "m",
+        "result": "unknown",
+        "user_text": f"turn on light {i}",
+        "prompt_rendered": "devices: " * 50,
+    }
+
+
+def test_snapshot_round_trip(tmp_path):
+    store = TraceStore()
+    for i in range(3):
+        store[f"t{i}"] = _trace(i)
+    rows = [(trace_id, *record.pack()) for trace_id, record in store.items()]
+    pending = {"t2": {"entities": ["light.a"], "deadline": 1.0}}
+    size = write_snapshot(tmp_path / "store.snapshot", rows, pending)
+    assert size == (tmp_path / "store.snapshot").stat().st_size
+    records, restored_pending = read_snapshot(tmp_path / "store.snapshot")
+    assert [trace_id for trace_id, _ in records] == ["t0", "t1", "t2"]
+    assert [r.to_dict() for _, r in records] == [r.to_dict() for r in store.values()]
+    assert restored_pending == pending
+
+
+@pytest.mark.asyncio
+async def test_snapshotter_restores_store_and_pending(hass, tmp_path):
+    path = tmp_path / "store.snapshot"
+    hass.data[DATA_TRACES] = TraceStore()
+    hass.data.setdefault(DOMAIN, {})
+    for i in range(5):
+        hass.data[DATA_TRACES][f"t{i}"] = _trace(i)
+    correlator = Correlator(hass, window=60)
+    await correlator.add_trace("t4", ["light.kitchen"])
+    hass.data[DOMAIN]["correlator"] = correlator
+    first = StoreSnapshotter(hass, path, 0)
+    first.start()
+    await first.wait_loaded()
+    await first.stop()
+    assert first.stats.saves == 1
+
+    # Simulate a restart: a new trace arrives before the snapshot is loaded.
+    hass.data[DATA_TRACES] = TraceStore(max_traces=4)
+    hass.data[DATA_TRACES]["new"] = _trace(9)
+    hass.data[DOMAIN]["correlator"] = restarted = Correlator(hass, window=60)
+    second = StoreSnapshotter(hass, path, 0)
+    second.start()
+    await second.wait_loaded()
+    assert list(hass.data[DATA_TRACES]) == ["t2", "t3", "t4", "new"]
+    assert second.stats.loaded == 3
+    assert hass.data[DATA_TRACES].query()[0]["trace_id"] == "t2"
+    assert restarted.pending["t4"]["deadline"] > time.time()
+    restarted.stop()
+    correlator.stop()
+
+
+@pytest.mark.asyncio
+async def test_snapshotter_survives_truncated_snapshot(hass, tmp_path):
+    path = tmp_path / "store.snapshot"
+    hass.data[DATA_TRACES] = TraceStore()
+    hass.data.setdefault(DOMAIN, {})
+    hass.data[DATA_TRACES]["t1"] = _trace(1)
+    write_snapshot(path, [("t1", *hass.data[DATA_TRACES]["t1"].pack())], {})
+    path.write_bytes(path.read_bytes()[:12])
+
+    hass.data[DATA_TRACES] = TraceStore()
+    snapshotter = StoreSnapshotter(hass, path, 0)
+    snapshotter.start()
+    await asyncio.wait_for(snapshotter.wait_loaded(), 5)
+    assert snapshotter.stats.load_error.startswith("error")
+    await snapshotter.stop()
+    assert snapshotter.stats.saves == 1
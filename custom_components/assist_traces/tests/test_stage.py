@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import asyncio
+import gzip
+import json
+
+import pytest
+
+from custom_components.assist_traces import stage as stage_module
+from custom_components.assist_traces.stage import RedactionStage
+from custom_components.assist_traces.writer import TraceWriter, WriterConfig
+
+
+@pytest.mark.asyncio
+async def test_stage_redacts_batches_before_writing(tmp_path):
+    writer = TraceWriter(WriterConfig(directory=str(tmp_path), batch_ms=0))
+    await writer.start()
+    stage = RedactionStage(writer, "basic", batch_size=8, batch_ms=10)
+    await stage.start()
+    trace = {"trace_id": "", "ts": "2024-06-01T00:00:00", "model": "m"}
+    for i in range(10):
+        await stage.enqueue({**trace, "trace_id": str(i), "user_text": "a@b.io"})
+    await stage.stop()
+    await writer.stop()
+
+    path = tmp_path / "2024" / "06" / "01" / "model=m" / "part-00000.jsonl.gz"
+    with gzip.open(path, "rb") as f:
+        rows = [json.loads(line) for line in f]
+    assert [row["trace_id"] for row in rows] == [str(i) for i in range(10)]
+    assert {row["user_text"] for row in rows} == {"<EMAIL>"}
+    info = stage.diagnostics()
+    assert info["traces"] == 10
+    assert info["batches"] == 2
+    assert info["max_batch"] == 8
+
+
+@pytest.mark.asyncio
+async def test_stage_without_redaction_passes_through(tmp_path):
+    writer = TraceWriter(WriterConfig(directory=str(tmp_path)))
+    stage = RedactionStage(writer, "none")
+    await stage.start()
+    trace = {"trace_id": "1", "ts": "2024-06-01T00:00:00", "user_text": "a@b.io"}
+    await stage.enqueue(trace)
+    assert writer.queue.get_nowait() is trace
+    assert stage.diagnostics()["batches"] == 0
+
+
+@pytest.mark.asyncio
+async def test_stage_drops_failed_batch_and_keeps_draining(tmp_path, monkeypatch):
+    redact_batch = stage_module.redact_batch
+
+    def flaky(traces, level):
+        if any(trace.get("user_text") == "boom" for trace in traces):
+            raise TypeError("boom")
+        return redact_batch(traces, level)
+
+    monkeypatch.setattr(stage_module, "redact_batch", flaky)
+    writer = TraceWriter(WriterConfig(directory=str(tmp_path), batch_ms=0))
+    await writer.start()
+    stage = RedactionStage(writer, "basic", queue_size=2, batch_size=1, batch_ms=0)
+    await stage.start()
+    trace = {"ts": "2024-06-01T00:00:00", "model": "m"}
+    await stage.enqueue({**trace, "trace_id": "1", "user_text": "boom"})
+    for i in range(2, 6):
+        await stage.enqueue({**trace, "trace_id": str(i), "user_text": "a@b.io"})
+    await asyncio.wait_for(stage.flush(), 5)
+    await stage.stop()
+    await writer.stop()
+
+    path = tmp_path / "2024" / "06" / "01" / "model=m" / "part-00000.jsonl.gz"
+    with gzip.open(path, "rb") as f:
+        ids = [json.loads(line)["trace_id"] for line in f]
+    assert ids == ["2", "3", "4", "5"]
+    info = stage.diagnostics()
+    assert (info["failed_batches"], info["dropped"]) == (1, 1)
+
+
+@pytest.mark.asyncio
+async def test_stage_applies_writer_drop_policies(tmp_path):
+    for policy, counter in (
+        ("drop_newest", "dropped_newest"),
+        ("drop_oldest", "dropped_oldest"),
+    ):
+        writer = TraceWriter(WriterConfig(directory=str(tmp_path), overflow=policy))
+        stage = RedactionStage(writer, "basic", queue_size=2)
+        await stage.start()
+        # Nothing yields between these, so the worker cannot drain the queue.
+        for i in range(5):
+            await stage.enqueue({"trace_id": str(i), "ts": "2024-06-01T00:00:00"})
+        info = stage.diagnostics()
+        assert (info["overflow"], info[counter]) == (policy, 3)
+        kept = [stage.queue.get_nowait()[1]["trace_id"] for _ in range(2)]
+        assert kept == (["0", "1"] if policy == "drop_newest" else ["3", "4"])
+        for _ in kept:
+            stage.queue.task_done()
+        await stage.stop()
+
+
+@pytest.mark.asyncio
+async def test_stage_spills_only_redacted_traces(tmp_path):
+    config = WriterConfig(directory=str(tmp_path), queue_size=1, overflow="spill")
+    writer = TraceWriter(config)
+    stage = RedactionStage(writer, "basic", queue_size=1, batch_size=1, batch_ms=0)
+    await stage.start()
+    for i in range(6):
+        await stage.enqueue(
+            {"trace_id": str(i), "ts": "2024-06-01T00:00:00", "user_text": "a@b.io"}
+        )
+    await stage.stop()
+    assert stage.diagnostics()["inline"] >= 1
+    spilled = writer._detach_spill().read_bytes()
+    assert b"<EMAIL>" in spilled and b"a@b.io" not in spilled
+    await writer.start()
+    await writer.stop()
+    path = tmp_path / "2024" / "06" / "01" / "model=unknown" / "part-00000.jsonl.gz"
+    with gzip.open(path, "rb") as f:
+        rows = [json.loads(line) for line in f]
+    assert sorted(row["trace_id"] for row in rows) == [str(i) for i in range(6)]
+    assert {row["user_text"] for row in rows} == {"<EMAIL>"}
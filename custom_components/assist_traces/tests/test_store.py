@@ -0,0 +1,138 @@
+"""Trace store tests."""
+
+from __future__ import annotations
+
+import time
+
+from custom_components.assist_traces.record import TraceRecord
+from custom_components.assist_traces.store import TraceStore
+
+
+def _trace(trace_id: str, text: str = "") -> dict:
+    return {"trace_id": trace_id, "ts": "2024-06-01T00:00:00", "user_text": text}
+
+
+def test_store_evicts_least_recently_written():
+    store = TraceStore(max_traces=2)
+    store["a"] = _trace("a")
+    store["b"] = _trace("b")
+    store["a"] = _trace("a", "again")
+    store["c"] = _trace("c")
+    assert list(store) == ["a", "c"]
+    assert store.evicted == 1
+
+
+def test_store_enforces_byte_budget():
+    size = TraceRecord.from_dict(_trace("a", "x" * 100)).nbytes()
+    store = TraceStore(max_bytes=size * 3)
+    for i in range(10):
+        store[str(i)] = _trace(str(i), "x" * 100)
+    assert len(store) == 3
+    assert store.bytes <= store.max_bytes
+    del store["9"]
+    assert store.bytes == 2 * size
+
+
+def test_store_skips_protected_traces():
+    store = TraceStore(max_traces=2)
+    store["a"] = _trace("a")
+    store.protect("a")
+    store["b"] = _trace("b")
+    store["c"] = _trace("c")
+    assert "a" in store and "b" not in store
+    store.set_fields("a", {"result": "success"})
+    store.release("a")
+    store["d"] = _trace("d")
+    assert list(store) == ["a", "d"]
+    assert store["a"]["result"] == "success"
+    assert store.diagnostics()["protected"] == 0
+
+
+def test_store_only_protected_traces_exceed_limit():
+    store = TraceStore(max_traces=2)
+    for trace_id in ("a", "b"):
+        store[trace_id] = _trace(trace_id)
+        store.protect(trace_id)
+    store["c"] = _trace("c")
+    assert set(store) == {"a", "b"}
+    store.max_traces = 1
+    store.set_fields("a", {"result": "success"})
+    assert set(store) == {"a", "b"}
+
+
+def test_store_expires_by_age():
+    store = TraceStore(max_age_s=0.01)
+    store["a"] = _trace("a")
+    time.sleep(0.02)
+    store["b"] = _trace("b")
+    assert list(store) == ["b"]
+    assert store.diagnostics()["evicted"] == 1
+
+
+def test_record_round_trips_trace_dict():
+    trace = {
+        "trace_id": "a",
+        "ts": "2024-06-01T12:30:00.123456+00:00",
+        "model": "m",
+        "result": "unknown",
+        "user_text": "turn on the light",
+        "prompt_rendered": "x" * 500,
+        "events": [{"type": "run-end"}],
+    }
+    record = TraceRecord.from_dict(trace)
+    assert record.to_dict() == trace
+    assert record["prompt_rendered"] == "x" * 500
+    assert record.ts_us == 1717245000123456
+    record.update({"result": "success", "events": []})
+    assert record["result"] == "success" and record["events"] == []
+    assert record.get("gold_action") is None
+    assert TraceRecord.from_dict(_trace("b"))["ts"] == "2024-06-01T00:00:00"
+
+
+def test_record_interns_labels():
+    a = TraceRecord.from_dict({"trace_id": "a", "model": "".join(["lla", "ma"])})
+    b = TraceRecord.from_dict({"trace_id": "b", "model": "".join(["ll", "ama"])})
+    assert a.model is b.model
+
+
+def _indexed(trace_id: str, minute: int, **fields) -> dict:
+    trace = _trace(trace_id)
+    trace["ts"] = f"2024-06-01T00:{minute:02d}:00"
+    trace.update(fields)
+    return trace
+
+
+def test_store_index_range_and_filters():
+    store = TraceStore()
+    store["c"] = _indexed("c", 3, result="fail", model="m1")
+    store["a"] = _indexed("a", 1, result="success", model="m1")
+    store["b"] = _indexed(
+        "b",
+        2,
+        result="fail",
+        model="m2",
+        parsed_action={"target": {"entity_id": ["light.kitchen"]}},
+    )
+    ids = [tr["trace_id"] for tr in store.query()]
+    assert ids == ["a", "b", "c"]
+    newest = store.query(newest_first=True, limit=2)
+    assert [tr["trace_id"] for tr in newest] == ["c", "b"]
+    start = store["b"].ts_us
+    assert [tr["trace_id"] for tr in store.query(start_us=start)] == ["b", "c"]
+    fails = store.query(filters={"result": "fail", "model": "m1"})
+    assert [tr["trace_id"] for tr in fails] == ["c"]
+    assert store.index.lookup("entity_id", "light.kitchen") == {"b"}
+    assert store.count(filters={"result": "fail"}) == 2
+    assert (store.count(), store.count(start_us=start)) == (3, 2)
+
+
+def test_store_index_follows_updates_and_eviction():
+    store = TraceStore(max_traces=2)
+    store["a"] = _indexed("a", 1, result="unknown")
+    store.set_fields("a", {"result": "success"})
+    assert store.index.counts("result") == {"success": 1}
+    store["b"] = _indexed("b", 2, result="fail")
+    store["c"] = _indexed("c", 3, result="fail", latency_ms=50)
+    assert store.index.counts("result") == {"fail": 2}
+    assert store.index.latency_sum == 50
+    assert [tr["trace_id"] for tr in store.query()] == ["b", "c"]
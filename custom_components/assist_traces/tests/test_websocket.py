@@ -4,6 +4,8 @@ from __future__ import annotations
 
 # ruff: noqa: E402
 
+import asyncio
+from collections import deque
 import pytest
 import sys
 import types
@@ -12,17 +14,32 @@ import types
 sys.modules.setdefault("hass_nabucasa", types.ModuleType("hass_nabucasa"))
 sys.modules.setdefault("hass_nabucasa.remote", types.ModuleType("remote"))
 
+from custom_components.assist_traces.aggregates import RollingAggregates
+from custom_components.assist_traces.cold import ColdIndex
 from custom_components.assist_traces.const import DATA_TRACES, DOMAIN
-from custom_components.assist_traces.websocket import async_setup_ws
+from custom_components.assist_traces.reader import TraceReader
+from custom_components.assist_traces.serialize import loads
+from custom_components.assist_traces.store import TraceStore
+from custom_components.assist_traces.websocket import _find_cold_trace, async_setup_ws
+from custom_components.assist_traces.writer import TraceWriter, WriterConfig
 
 
 class DummyConnection:
     def __init__(self):
         self.result = None
+        self.events = []
+        self.subscriptions = {}
 
-    def send_result(self, msg_id, result):
+    def send_result(self, msg_id, result=None):
         self.result = result
 
+    def send_message(self, message):
+        message = loads(message)
+        if message["type"] == "event":
+            self.events.append(message["event"])
+        else:
+            self.result = message["result"]
+
     def send_error(self, *args, **kwargs):
         self.result = {"error": args}
 
@@ -30,10 +47,191 @@ class DummyConnection:
 @pytest.mark.asyncio
 async def test_preview_recent(hass):
     await async_setup_ws(hass)
-    hass.data[DATA_TRACES] = {
-        "1": {"trace_id": "1", "ts": "2024-06-01T00:00:00", "model": "m"}
+    hass.data[DATA_TRACES] = TraceStore()
+    hass.data[DATA_TRACES]["1"] = {
+        "trace_id": "1",
+        "ts": "2024-06-01T00:00:00",
+        "model": "m",
     }
     handler = hass.data["websocket_api"][f"{DOMAIN}/preview_recent"][0]
     conn = DummyConnection()
     await handler(hass, conn, {"id": 1, "type": f"{DOMAIN}/preview_recent", "limit": 1})
-    assert conn.result[0]["trace_id"] == "1"
+    assert conn.result["traces"][0]["trace_id"] == "1"
+    assert conn.result["more"] is False
+
+
+@pytest.mark.asyncio
+async def test_preview_recent_pages_filters_and_projects(hass):
+    await async_setup_ws(hass)
+    store = hass.data[DATA_TRACES] = TraceStore()
+    for i in range(10):
+        store[f"t{i}"] = {
+            "trace_id": f"t{i}",
+            # t4 and t5 share a timestamp so the cursor must break the tie.
+            "ts": f"2024-06-01T00:00:{min(i, 4) if i < 6 else i:02d}",
+            "model": "a" if i % 2 else "b",
+            "user_text": f"Turn on lamp {i}",
+            "prompt_rendered": "x" * 1000,
+        }
+    handler = hass.data["websocket_api"][f"{DOMAIN}/preview_recent"][0]
+    conn = DummyConnection()
+
+    async def page(**kwargs):
+        await handler(hass, conn, {"id": 1, "limit": 3, **kwargs})
+        return conn.result
+
+    first = await page(fields=["model"])
+    assert [tr["trace_id"] for tr in first["traces"]] == ["t7", "t8", "t9"]
+    assert set(first["traces"][0]) == {"trace_id", "ts", "model"}
+    assert first["more"] is True
+    second = await page(before=first["before"])
+    assert [tr["trace_id"] for tr in second["traces"]] == ["t4", "t5", "t6"]
+    third = await page(before=second["before"])
+    assert [tr["trace_id"] for tr in third["traces"]] == ["t1", "t2", "t3"]
+    newer = await page(after=third["after"])
+    assert [tr["trace_id"] for tr in newer["traces"]] == ["t4", "t5", "t6"]
+
+    odd = await page(model="a", text="LAMP", end="2024-06-01T00:00:08")
+    assert [tr["trace_id"] for tr in odd["traces"]] == ["t3", "t5", "t7"]
+    assert odd["more"] is True
+    none = await page(text="garage")
+    assert none == {"traces": [], "before": None, "after": None, "more": False}
+
+
+@pytest.mark.asyncio
+async def test_subscribe_batches_filters_and_resyncs(hass):
+    await async_setup_ws(hass)
+    store = hass.data[DATA_TRACES] = TraceStore()
+    handler = hass.data["websocket_api"][f"{DOMAIN}/subscribe"][0]
+    conn = DummyConnection()
+    handler(
+        hass,
+        conn,
+        {"id": 5, "model": "a", "fields": ["result"], "batch_ms": 20, "max_batch": 3},
+    )
+
+    def trace(i, **fields):
+        return {"trace_id": f"t{i}", "ts": "2024-06-01T00:00:00", **fields}
+
+    store["t1"] = trace(1, model="a")
+    store["t2"] = trace(2, model="b")
+    store.set_fields("t1", {"result": "success"})
+    await asyncio.sleep(0.05)
+    assert conn.events == [
+        {
+            "traces": [
+                {"trace_id": "t1", "ts": "2024-06-01T00:00:00", "result": "success"}
+            ]
+        }
+    ]
+
+    for i in range(10, 15):
+        store[f"t{i}"] = trace(i, model="a")
+    await asyncio.sleep(0.05)
+    assert conn.events[-1] == {"resync": True}
+    store["t20"] = trace(20, model="a")
+    await asyncio.sleep(0.05)
+    assert [tr["trace_id"] for tr in conn.events[-1]["traces"]] == ["t20"]
+
+    conn.subscriptions.pop(5)()
+    store["t21"] = trace(21, model="a")
+    await asyncio.sleep(0.05)
+    assert len(conn.events) == 3
+
+
+@pytest.mark.asyncio
+async def test_subscribe_resyncs_once_a_lagging_client_catches_up(hass):
+    await async_setup_ws(hass)
+    store = hass.data[DATA_TRACES] = TraceStore()
+    handler = hass.data["websocket_api"][f"{DOMAIN}/subscribe"][0]
+    conn = DummyConnection()
+    # Stands in for the unsent messages of Home Assistant's WebSocket handler.
+    conn._message_queue = deque()
+    handler(hass, conn, {"id": 6, "batch_ms": 20, "max_lag": 4})
+
+    def trace(i):
+        return {"trace_id": f"t{i}", "ts": "2024-06-01T00:00:00"}
+
+    store["t1"] = trace(1)
+    await asyncio.sleep(0.05)
+    assert [tr["trace_id"] for tr in conn.events[-1]["traces"]] == ["t1"]
+
+    conn._message_queue.extend([b"{}"] * 5)
+    for i in range(2, 6):
+        store[f"t{i}"] = trace(i)
+        await asyncio.sleep(0.03)
+    assert len(conn.events) == 1
+
+    conn._message_queue.clear()
+    await asyncio.sleep(0.05)
+    assert conn.events[1:] == [{"resync": True}]
+    store["t6"] = trace(6)
+    await asyncio.sleep(0.05)
+    assert [tr["trace_id"] for tr in conn.events[-1]["traces"]] == ["t6"]
+    conn.subscriptions.pop(6)()
+
+
+@pytest.mark.asyncio
+async def test_query_stream_reports_scan_errors(hass):
+    await async_setup_ws(hass)
+
+    class FailingEngine:
+        async def scan(self, query, limit, chunk_size):
+            yield [{"trace_id": "1"}]
+            raise OSError("segment vanished")
+
+    hass.data.setdefault(DOMAIN, {})["history"] = FailingEngine()
+    handler = hass.data["websocket_api"][f"{DOMAIN}/query"][0]
+    conn = DummyConnection()
+    await handler(hass, conn, {"id": 7, "type": f"{DOMAIN}/query"})
+    await hass.async_block_till_done()
+    assert conn.events == [
+        {"rows": [{"trace_id": "1"}]},
+        {"error": "segment vanished", "count": 1},
+    ]
+    assert conn.subscriptions == {}
+
+
+@pytest.mark.asyncio
+async def test_cold_lookup_only_scans_hinted_partition(tmp_path):
+    writer = TraceWriter(WriterConfig(directory=str(tmp_path), batch_ms=0))
+    await writer.start()
+    await writer.enqueue({"trace_id": "t1", "ts": "2024-06-01T00:00:00", "model": "m"})
+    await writer.flush()
+    await writer.stop()
+    cold = ColdIndex(tmp_path / "index.sqlite3")
+    cold.open()
+    reader = TraceReader(str(tmp_path))
+    searched = []
+    find_trace = reader.find_trace
+    reader.find_trace = lambda *args: searched.append(args) or find_trace(*args)
+
+    assert _find_cold_trace(cold, reader, "t1", None) is None
+    assert searched == []
+    trace = _find_cold_trace(cold, reader, "t1", "2024-06-01T00:00:00")
+    assert trace["trace_id"] == "t1"
+    assert searched == [("t1", "2024-06-01T00:00:00")]
+    cold.close()
+
+
+@pytest.mark.asyncio
+async def test_stats_come_from_indexes_and_aggregates(hass):
+    await async_setup_ws(hass)
+    store = hass.data[DATA_TRACES] = TraceStore()
+    aggregates = RollingAggregates(clock=lambda: 1_717_200_000)
+    hass.data.setdefault(DOMAIN, {})["aggregates"] = aggregates
+    store.add_listener(aggregates.update)
+    for i, result in enumerate(("success", "fail", None)):
+        store[str(i)] = {
+            "trace_id": str(i),
+            "ts": "2024-06-01T00:00:00+00:00",
+            "result": result,
+            "latency_ms": 100 * (i + 1),
+        }
+    store["0"] = {**store["0"].to_dict(), "latency_ms": 400}
+    handler = hass.data["websocket_api"][f"{DOMAIN}/stats"][0]
+    conn = DummyConnection()
+    await handler(hass, conn, {"id": 1, "type": f"{DOMAIN}/stats"})
+    assert conn.result["counts"] == {"success": 1, "fail": 1, "unknown": 1}
+    assert conn.result["mean_latency_ms"] == 300
+    assert conn.result["window"]["count"] == 3
@@ -3,8 +3,10 @@ from __future__ import annotations
 import asyncio
 import gzip
 import json
+import os
 import pytest
 
+from custom_components.assist_traces.segments import PartitionManifest
 from custom_components.assist_traces.writer import TraceWriter, WriterConfig
 
 
@@ -17,9 +19,186 @@ async def test_writer_creates_partition(tmp_path):
     await writer.enqueue(trace)
     await asyncio.sleep(0.1)
     await writer.stop()
-    path = tmp_path / "2024" / "06" / "01" / "model=m" / "part.jsonl.gz"
+    path = tmp_path / "2024" / "06" / "01" / "model=m" / "part-00000.jsonl.gz"
     assert path.exists()
     with gzip.open(path, "rb") as f:
         line = f.readline()
         obj = json.loads(line)
     assert obj["trace_id"] == "1"
+
+
+@pytest.mark.asyncio
+async def test_writer_batches_burst(tmp_path):
+    config = WriterConfig(directory=str(tmp_path), batch_size=64, batch_ms=20)
+    writer = TraceWriter(config)
+    await writer.start()
+    for i in range(10):
+        await writer.enqueue({"trace_id": str(i), "ts": "2024-06-01T00:00:00"})
+    await writer.queue.join()
+    await writer.stop()
+    assert writer.stats.written == 10
+    assert writer.stats.batches == 1
+    path = tmp_path / "2024" / "06" / "01" / "model=unknown" / "part-00000.jsonl.gz"
+    with gzip.open(path, "rb") as f:
+        ids = [json.loads(line)["trace_id"] for line in f]
+    assert ids == [str(i) for i in range(10)]
+
+
+@pytest.mark.asyncio
+async def test_writer_flush_and_idle_close_do_not_race(tmp_path):
+    config = WriterConfig(
+        directory=str(tmp_path), batch_ms=0, idle_close_s=0.001, overflow="spill"
+    )
+    config.queue_size = 4
+    writer = TraceWriter(config)
+    await writer.start()
+    for round_ in range(20):
+        for i in range(8):
+            await writer.enqueue(
+                {"trace_id": f"{round_}-{i}", "ts": f"2024-06-{i + 1:02d}T00:00:00"}
+            )
+        await asyncio.gather(writer.flush(), asyncio.sleep(0.002))
+    await writer.stop()
+    ids = set()
+    for path in tmp_path.glob("2024/06/*/model=unknown/part-*.jsonl.gz"):
+        with gzip.open(path, "rb") as f:
+            ids.update(json.loads(line)["trace_id"] for line in f)
+    assert len(ids) == 160
+
+
+@pytest.mark.asyncio
+async def test_writer_overflow_drop_policies(tmp_path):
+    for policy, counter in (
+        ("drop_newest", "dropped_newest"),
+        ("drop_oldest", "dropped_oldest"),
+    ):
+        writer = TraceWriter(
+            WriterConfig(directory=str(tmp_path), queue_size=2, overflow=policy)
+        )
+        for i in range(5):
+            await writer.enqueue({"trace_id": str(i), "ts": "2024-06-01T00:00:00"})
+        assert writer.queue.qsize() == 2
+        assert writer.diagnostics()[counter] == 3
+        kept = [writer.queue.get_nowait()["trace_id"] for _ in range(2)]
+        assert kept == (["0", "1"] if policy == "drop_newest" else ["3", "4"])
+
+
+@pytest.mark.asyncio
+async def test_writer_overflow_spill_replayed(tmp_path):
+    config = WriterConfig(directory=str(tmp_path), queue_size=1, overflow="spill")
+    writer = TraceWriter(config)
+    for i in range(4):
+        await writer.enqueue({"trace_id": str(i), "ts": "2024-06-01T00:00:00"})
+    assert writer.stats.spilled == 3
+    await writer.start()
+    await writer.stop()
+    assert writer.stats.replayed == 3
+    assert not list((tmp_path / "_spill").glob("spill-*.jsonl"))
+    path = tmp_path / "2024" / "06" / "01" / "model=unknown" / "part-00000.jsonl.gz"
+    with gzip.open(path, "rb") as f:
+        ids = sorted(json.loads(line)["trace_id"] for line in f)
+    assert ids == ["0", "1", "2", "3"]
+
+
+@pytest.mark.asyncio
+async def test_writer_keeps_interleaved_partitions_open(tmp_path):
+    writer = TraceWriter(WriterConfig(directory=str(tmp_path), batch_ms=0))
+    await writer.start()
+    for i in range(6):
+        model = "a" if i % 2 else "b"
+        await writer.enqueue(
+            {"trace_id": str(i), "ts": "2024-06-01T00:00:00", "model": model}
+        )
+        await writer.queue.join()
+    assert writer.stats.opened == 2
+    assert writer.diagnostics()["open_files"] == 2
+    await writer.stop()
+    for model, expected in (("a", ["1", "3", "5"]), ("b", ["0", "2", "4"])):
+        path = (
+            tmp_path / "2024" / "06" / "01" / f"model={model}" / "part-00000.jsonl.gz"
+        )
+        with gzip.open(path, "rb") as f:
+            assert [json.loads(line)["trace_id"] for line in f] == expected
+
+
+@pytest.mark.asyncio
+async def test_writer_evicts_and_idle_closes_handles(tmp_path):
+    config = WriterConfig(
+        directory=str(tmp_path), batch_ms=0, max_open_files=1, idle_close_s=0.05
+    )
+    writer = TraceWriter(config)
+    await writer.start()
+    for model in ("a", "b"):
+        await writer.enqueue({"trace_id": model, "ts": "2024-06-01", "model": model})
+        await writer.queue.join()
+    assert writer.stats.evicted == 1
+    await asyncio.sleep(0.2)
+    assert writer.stats.idle_closed == 1
+    assert writer.diagnostics()["open_files"] == 0
+    await writer.stop()
+
+
+@pytest.mark.asyncio
+async def test_writer_idle_closes_under_steady_traffic(tmp_path):
+    config = WriterConfig(directory=str(tmp_path), batch_ms=0, idle_close_s=0.1)
+    writer = TraceWriter(config)
+    await writer.start()
+    await writer.enqueue({"trace_id": "a", "ts": "2024-06-01", "model": "a"})
+    # Traffic to model b never lets the queue sit idle for idle_close_s.
+    for i in range(20):
+        await writer.enqueue({"trace_id": f"b{i}", "ts": "2024-06-01", "model": "b"})
+        await asyncio.sleep(0.02)
+    assert writer.stats.idle_closed == 1
+    assert writer.diagnostics()["open_files"] == 1
+    await writer.stop()
+
+
+@pytest.mark.asyncio
+async def test_writer_rotates_segments_and_writes_manifest(tmp_path):
+    config = WriterConfig(directory=str(tmp_path), batch_ms=0, max_file_mb=0.05)
+    writer = TraceWriter(config)
+    await writer.start()
+    for i in range(4):
+        await writer.enqueue(
+            {
+                "trace_id": str(i),
+                "ts": f"2024-06-01T0{i}:00:00",
+                "model": "m",
+                "blob": os.urandom(100_000).hex(),
+            }
+        )
+        await writer.queue.join()
+    partition = tmp_path / "2024" / "06" / "01" / "model=m"
+    manifest = PartitionManifest.load(partition)
+    assert [s.name for s in manifest.sealed] == [
+        "part-00000.jsonl.gz",
+        "part-00001.jsonl.gz",
+        "part-00002.jsonl.gz",
+        "part-00003.jsonl.gz",
+    ]
+    assert manifest.active is None
+
+    await writer.enqueue({"trace_id": "4", "ts": "2024-06-01T05:00:00", "model": "m"})
+    await writer.flush()
+    await writer.stop()
+    manifest = PartitionManifest.load(partition)
+    assert len(manifest.sealed) == 5
+    assert sum(s.rows for s in manifest.segments) == 5
+    last = manifest.segments[-1]
+    assert (last.rows, last.min_ts, last.models) == (1, "2024-06-01T05:00:00", ["m"])
+    assert last.bytes == (partition / last.name).stat().st_size
+    with gzip.open(partition / last.name, "rb") as f:
+        assert json.loads(f.readline())["trace_id"] == "4"
+
+
+@pytest.mark.asyncio
+async def test_writer_reopens_active_segment_after_restart(tmp_path):
+    for trace_id in ("a", "b"):
+        writer = TraceWriter(WriterConfig(directory=str(tmp_path), batch_ms=0))
+        await writer.start()
+        await writer.enqueue({"trace_id": trace_id, "ts": "2999-01-01", "model": "m"})
+        await writer.stop()
+    partition = tmp_path / "2999" / "01" / "01" / "model=m"
+    manifest = PartitionManifest.load(partition)
+    assert [s.name for s in manifest.segments] == ["part-00000.jsonl.gz"]
+    assert manifest.active.rows == 2
@@ -0,0 +1,143 @@
+"""Write-ahead log backing the trace writer in durable mode."""
+
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from typing import IO, Any, Dict, Iterator, List, Optional, Tuple
+
+from .serialize import dumps, dumps_line, loads
+
+CHECKPOINT_NAME = "checkpoint.json"
+
+
+def _log_name(start: int) -> str:
+    """Return the file name of a log file starting at a global position."""
+    return f"wal-{start:020d}.log"
+
+
+class WriteAheadLog:
+    """Uncompressed append-only log with group-committed fsync.
+
+    Positions are global byte offsets across all log files; each file is
+    named after the position of its first byte, so files below the
+    checkpoint can be deleted without renumbering the rest.
+    """
+
+    def __init__(self, directory: Path, segment_mb: float = 64) -> None:
+        """Initialize the log in a directory."""
+        self.directory = directory
+        self.segment_bytes = int(segment_mb * 1024 * 1024)
+        self.checkpoint = 0
+        self.committed = 0
+        self.commits = 0
+        self._pending: List[bytes] = []
+        self._file: Optional[IO[bytes]] = None
+        self._file_start = 0
+
+    def open(self) -> None:
+        """Load the checkpoint and position the log after its last record."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / CHECKPOINT_NAME
+        if path.exists():
+            self.checkpoint = loads(path.read_bytes())["position"]
+        files = self._files()
+        if files:
+            self._file_start, last = files[-1]
+            self.committed = self._file_start + self._truncate_torn(last)
+        else:
+            self._file_start = self.committed = self.checkpoint
+
+    def append(self, trace: Dict[str, Any]) -> None:
+        """Buffer a trace for the next group commit."""
+        self._pending.append(dumps_line(trace))
+
+    @property
+    def pending(self) -> int:
+        """Return the number of traces waiting for the next commit."""
+        return len(self._pending)
+
+    def commit(self) -> int:
+        """Write buffered traces, fsync once, and return the committed position."""
+        pending, self._pending = self._pending, []
+        if not pending:
+            return self.committed
+        if self._file is None:
+            self._file = open(self.directory / _log_name(self._file_start), "ab")
+        data = b"".join(pending)
+        self._file.write(data)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.committed += len(data)
+        self.commits += 1
+        if self.committed - self._file_start >= self.segment_bytes:
+            self._file.close()
+            self._file = None
+            self._file_start = self.committed
+        return self.committed
+
+    def read(self, position: int) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """Yield (end position, trace) for committed records after a position."""
+        end = self.committed
+        for start, path in self._files():
+            size = path.stat().st_size
+            if start + size <= position or start >= end:
+                continue
+            with open(path, "rb") as f:
+                offset = max(position - start, 0)
+                f.seek(offset)
+                for line in f:
+                    offset += len(line)
+                    if start + offset > end or not line.endswith(b"\n"):
+                        return
+                    yield start + offset, loads(line)
+
+    def set_checkpoint(self, position: int) -> None:
+        """Persist the materialized position and drop fully materialized files."""
+        if position == self.checkpoint:
+            return
+        path = self.directory / CHECKPOINT_NAME
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            f.write(dumps({"position": position}))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        self.checkpoint = position
+        files = self._files()
+        for (_, path), (next_start, _) in zip(files, files[1:]):
+            if next_start <= position:
+                path.unlink()
+
+    def close(self) -> None:
+        """Commit anything pending and close the active log file."""
+        self.commit()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    @staticmethod
+    def _truncate_torn(path: Path) -> int:
+        """Drop a partially written trailing record and return the file size."""
+        size = path.stat().st_size
+        with open(path, "r+b") as f:
+            end = size
+            while end > 0:
+                start = max(end - 65536, 0)
+                f.seek(start)
+                chunk = f.read(end - start)
+                newline = chunk.rfind(b"\n")
+                if newline >= 0:
+                    end = start + newline + 1
+                    break
+                end = start
+            if end != size:
+                f.truncate(end)
+        return end
+
+    def _files(self) -> List[Tuple[int, Path]]:
+        """Return (start position, path) of every log file in order."""
+        files = []
+        for path in self.directory.glob("wal-*.log"):
+            files.append((int(path.stem[4:]), path))
+        return sorted(files)
@@ -2,47 +2,393 @@
 
 from __future__ import annotations
 
-from typing import Dict
+import logging
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
 
+import voluptuous as vol
 from homeassistant.components import websocket_api
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 
-from .const import DATA_TRACES, DOMAIN
+from .cold import ColdIndex
+from .const import DATA_COLD, DATA_READER, DATA_TRACES, DEFAULT_REDACTION, DOMAIN
+from .history import HistoryQuery
+from .index import Cursor
+from .reader import TraceReader
+from .redact import pseudonym
+from .record import TraceRecord, to_epoch_us
+from .serialize import dumps
+from .store import TraceStore
+from .subscription import (
+    DEFAULT_BATCH_MS,
+    DEFAULT_MAX_BATCH,
+    DEFAULT_MAX_LAG,
+    TraceSubscription,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_PREVIEW_LIMIT = 25
+MAX_PREVIEW_LIMIT = 500
+DEFAULT_QUERY_LIMIT = 1000
+MAX_QUERY_LIMIT = 100_000
+DEFAULT_QUERY_CHUNK = 200
+# Message keys that filter on an indexed trace field.
+PREVIEW_FILTERS = ("result", "model", "user_id")
+# Fields searched by the preview_recent text filter.
+TEXT_FIELDS = ("user_text", "response_text")
+CURSOR_SCHEMA = vol.Schema({vol.Required("ts"): str, vol.Required("trace_id"): str})
+
+
+def send_result(connection, msg_id: int, result: Any) -> None:
+    """Send a result message serialized with the integration's fast encoder."""
+    connection.send_message(
+        websocket_api.messages.construct_result_message(msg_id, dumps(result))
+    )
+
+
+def send_event(connection, msg_id: int, event: Any) -> None:
+    """Send an event message serialized with the integration's fast encoder."""
+    connection.send_message(dumps(websocket_api.messages.event_message(msg_id, event)))
+
+
+def _find_cold_trace(
+    cold: Optional[ColdIndex],
+    reader: Optional[TraceReader],
+    trace_id: str,
+    ts: Optional[str],
+) -> Optional[Dict[str, Any]]:
+    """Load a trace that is no longer in memory, with its recorded feedback.
+
+    The cold index is authoritative: partitions are only searched when it
+    has no usable entry and a ``ts`` hint narrows the search to the
+    partition holding that time, never across the whole history.
+    """
+    if reader is None:
+        return None
+    trace = None
+    entry = cold.lookup(trace_id) if cold is not None else None
+    if entry is not None:
+        trace = reader.read_entry(entry)
+    if trace is None and ts:
+        trace = reader.find_trace(trace_id, ts)
+    if trace is not None and cold is not None:
+        trace.update(cold.feedback([trace_id]).get(trace_id, {}))
+    return trace
+
+
+def _ts_us(value: Optional[str]) -> Optional[int]:
+    """Return an ISO timestamp from a message as epoch microseconds."""
+    if value is None:
+        return None
+    ts_us = to_epoch_us(value)
+    if ts_us is None:
+        raise vol.Invalid(f"invalid timestamp {value}")
+    return ts_us
+
+
+def _cursor(value: Optional[Dict[str, str]]) -> Optional[Cursor]:
+    """Return a cursor message as an index position."""
+    if value is None:
+        return None
+    return _ts_us(value["ts"]), value["trace_id"]  # type: ignore[return-value]
+
+
+def _text_match(text: str) -> Callable[[TraceRecord], bool]:
+    """Return a predicate for records whose text fields contain text."""
+    needle = text.casefold()
+
+    def match(record: TraceRecord) -> bool:
+        return any(
+            needle in str(record.get(field) or "").casefold() for field in TEXT_FIELDS
+        )
+
+    return match
+
+
+def _naive_utc(value: Optional[str]) -> Optional[datetime]:
+    """Return an ISO timestamp as a naive UTC datetime like the partitions."""
+    if value is None:
+        return None
+    try:
+        ts = datetime.fromisoformat(value)
+    except ValueError as err:
+        raise vol.Invalid(f"invalid timestamp {value}") from err
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def _history_query(msg: Dict[str, Any], level: str) -> HistoryQuery:
+    """Return the history query described by a message.
+
+    History is written redacted at ``level``, so a user ID filter is
+    matched against the pseudonym written in its place.
+    """
+    user_id = msg.get("user_id")
+    if user_id is not None and level != "none":
+        user_id = pseudonym(user_id)
+    return HistoryQuery(
+        start=_naive_utc(msg.get("start")),
+        end=_naive_utc(msg.get("end")),
+        model=msg.get("model"),
+        result=msg.get("result"),
+        user_id=user_id,
+        text=msg.get("text") or None,
+        fields=msg.get("fields"),
+    )
+
+
+def _record_match(msg: Dict[str, Any]) -> Optional[Callable[[TraceRecord], bool]]:
+    """Return a predicate for the field and text filters of a message."""
+    filters = {key: msg[key] for key in PREVIEW_FILTERS if key in msg}
+    text = _text_match(msg["text"]) if msg.get("text") else None
+    if not filters and text is None:
+        return None
+
+    def match(record: TraceRecord) -> bool:
+        if any(record.get(key) != value for key, value in filters.items()):
+            return False
+        return text is None or text(record)
+
+    return match
+
+
+def _projection(fields: Optional[List[str]]) -> Optional[List[str]]:
+    """Return the projected fields, always leading with the cursor fields."""
+    if not fields:
+        return None
+    return ["trace_id", "ts", *(f for f in fields if f not in ("trace_id", "ts"))]
+
+
+def _page_cursor(record: TraceRecord) -> Dict[str, str]:
+    """Return the cursor of a record for the next page request."""
+    return {"ts": record["ts"], "trace_id": record["trace_id"]}
+
+
+def preview_page(store: TraceStore, msg: Dict[str, Any]) -> Dict[str, Any]:
+    """Return one page of the preview_recent query, oldest trace first.
+
+    Without ``after`` the newest matching traces (before the ``before``
+    cursor, if any) are returned; with only ``after`` the traces right
+    after it are. The page carries cursors to continue in either direction
+    and whether more traces exist past the end it was cut at.
+    """
+    limit = msg.get("limit", DEFAULT_PREVIEW_LIMIT)
+    after = _cursor(msg.get("after"))
+    before = _cursor(msg.get("before"))
+    backwards = after is None or before is not None
+    records = store.query(
+        start_us=_ts_us(msg.get("start")),
+        end_us=_ts_us(msg.get("end")),
+        filters={key: msg[key] for key in PREVIEW_FILTERS if key in msg},
+        newest_first=backwards,
+        limit=limit + 1,
+        after=after,
+        before=before,
+        match=_text_match(msg["text"]) if msg.get("text") else None,
+    )
+    more = len(records) > limit
+    records = records[:limit]
+    if backwards:
+        records.reverse()
+    fields = _projection(msg.get("fields"))
+    traces: List[Dict[str, Any]] = [
+        record.project(fields) if fields else record.to_dict() for record in records
+    ]
+    return {
+        "traces": traces,
+        "before": _page_cursor(records[0]) if records else None,
+        "after": _page_cursor(records[-1]) if records else None,
+        "more": more,
+    }
 
 
 async def async_setup_ws(hass: HomeAssistant) -> None:
     """Register WS commands."""
 
-    @websocket_api.websocket_command({"type": f"{DOMAIN}/preview_recent", "limit": int})
+    @websocket_api.websocket_command(
+        {
+            "type": f"{DOMAIN}/preview_recent",
+            vol.Optional("limit", default=DEFAULT_PREVIEW_LIMIT): vol.All(
+                int, vol.Range(min=1, max=MAX_PREVIEW_LIMIT)
+            ),
+            vol.Optional("before"): CURSOR_SCHEMA,
+            vol.Optional("after"): CURSOR_SCHEMA,
+            vol.Optional("result"): str,
+            vol.Optional("model"): str,
+            vol.Optional("user_id"): str,
+            vol.Optional("start"): str,
+            vol.Optional("end"): str,
+            vol.Optional("text"): str,
+            vol.Optional("fields"): [str],
+        }
+    )
     async def preview_recent(hass: HomeAssistant, connection, msg):
-        """Return the most recent traces."""
-        limit = msg.get("limit", 25)
-        traces = list(hass.data[DATA_TRACES].values())[-limit:]
-        connection.send_result(msg["id"], traces)
+        """Return a filtered, projected page of recent traces."""
+        try:
+            page = preview_page(hass.data[DATA_TRACES], msg)
+        except vol.Invalid as err:
+            connection.send_error(msg["id"], websocket_api.ERR_INVALID_FORMAT, str(err))
+            return
+        send_result(connection, msg["id"], page)
+
+    @websocket_api.websocket_command(
+        {
+            "type": f"{DOMAIN}/subscribe",
+            vol.Optional("result"): str,
+            vol.Optional("model"): str,
+            vol.Optional("user_id"): str,
+            vol.Optional("text"): str,
+            vol.Optional("fields"): [str],
+            vol.Optional("batch_ms", default=DEFAULT_BATCH_MS): vol.All(
+                int, vol.Range(min=0, max=10000)
+            ),
+            vol.Optional("max_batch", default=DEFAULT_MAX_BATCH): vol.All(
+                int, vol.Range(min=1, max=10000)
+            ),
+            vol.Optional("max_lag", default=DEFAULT_MAX_LAG): vol.All(
+                int, vol.Range(min=1, max=1000)
+            ),
+        }
+    )
+    @callback
+    def subscribe(hass: HomeAssistant, connection, msg):
+        """Push new and updated traces matching the filters in batches."""
+        subscription = TraceSubscription(
+            hass,
+            connection,
+            msg["id"],
+            match=_record_match(msg),
+            fields=_projection(msg.get("fields")),
+            batch_s=msg.get("batch_ms", DEFAULT_BATCH_MS) / 1000,
+            max_batch=msg.get("max_batch", DEFAULT_MAX_BATCH),
+            max_lag=msg.get("max_lag", DEFAULT_MAX_LAG),
+        )
+        unsub = hass.data[DATA_TRACES].add_listener(subscription.on_change)
 
-    @websocket_api.websocket_command({"type": f"{DOMAIN}/trace_by_id", "trace_id": str})
+        @callback
+        def unsubscribe() -> None:
+            unsub()
+            subscription.cancel()
+
+        connection.subscriptions[msg["id"]] = unsubscribe
+        connection.send_result(msg["id"])
+
+    @websocket_api.websocket_command(
+        {
+            "type": f"{DOMAIN}/query",
+            vol.Optional("start"): str,
+            vol.Optional("end"): str,
+            vol.Optional("result"): str,
+            vol.Optional("model"): str,
+            vol.Optional("user_id"): str,
+            vol.Optional("text"): str,
+            vol.Optional("fields"): [str],
+            vol.Optional("aggregate", default=False): bool,
+            vol.Optional("limit", default=DEFAULT_QUERY_LIMIT): vol.All(
+                int, vol.Range(min=1, max=MAX_QUERY_LIMIT)
+            ),
+            vol.Optional("chunk_size", default=DEFAULT_QUERY_CHUNK): vol.All(
+                int, vol.Range(min=1, max=MAX_PREVIEW_LIMIT)
+            ),
+        }
+    )
+    async def query(hass: HomeAssistant, connection, msg):
+        """Query the history on disk, streaming rows or returning aggregates.
+
+        Row queries are acknowledged right away and then stream ``rows``
+        events followed by a ``done`` event, or an ``error`` event if the
+        scan fails; unsubscribing cancels the scan.
+        """
+        try:
+            history_query = _history_query(
+                msg, hass.data[DOMAIN].get("redaction_level", DEFAULT_REDACTION)
+            )
+        except vol.Invalid as err:
+            connection.send_error(msg["id"], websocket_api.ERR_INVALID_FORMAT, str(err))
+            return
+        engine = hass.data[DOMAIN]["history"]
+        if msg.get("aggregate"):
+            send_result(connection, msg["id"], await engine.aggregate(history_query))
+            return
+
+        async def stream() -> None:
+            sent = 0
+            try:
+                async for rows in engine.scan(
+                    history_query,
+                    msg.get("limit", DEFAULT_QUERY_LIMIT),
+                    msg.get("chunk_size", DEFAULT_QUERY_CHUNK),
+                ):
+                    sent += len(rows)
+                    send_event(connection, msg["id"], {"rows": rows})
+            except Exception as err:
+                # The command was already acknowledged; end the stream with
+                # an error event so the client stops waiting.
+                _LOGGER.exception("History query %s failed", msg["id"])
+                send_event(connection, msg["id"], {"error": str(err), "count": sent})
+            else:
+                send_event(connection, msg["id"], {"done": True, "count": sent})
+            finally:
+                connection.subscriptions.pop(msg["id"], None)
+
+        task = hass.async_create_background_task(stream(), f"{DOMAIN} query")
+        connection.subscriptions[msg["id"]] = task.cancel
+        connection.send_result(msg["id"])
+
+    @websocket_api.websocket_command(
+        {
+            "type": f"{DOMAIN}/trace_by_id",
+            "trace_id": str,
+            vol.Optional("ts"): str,
+        }
+    )
     async def trace_by_id(hass: HomeAssistant, connection, msg):
-        """Return a single trace by its ID."""
-        trace = hass.data[DATA_TRACES].get(msg["trace_id"])  # type: ignore[index]
-        connection.send_result(msg["id"], trace)
+        """Return a single trace by its ID, falling back to the cold tier."""
+        record = hass.data[DATA_TRACES].get(msg["trace_id"])  # type: ignore[index]
+        trace = record.to_dict() if record is not None else None
+        if trace is None:
+            trace = await hass.async_add_executor_job(
+                _find_cold_trace,
+                hass.data.get(DATA_COLD),
+                hass.data.get(DATA_READER),
+                msg["trace_id"],
+                msg.get("ts"),
+            )
+        send_result(connection, msg["id"], trace)
 
     @websocket_api.websocket_command({"type": f"{DOMAIN}/stats"})
     async def stats(hass: HomeAssistant, connection, msg):
-        """Return statistics about recent traces."""
-        traces = list(hass.data[DATA_TRACES].values())
-        counts: Dict[str, int] = {}
-        latency = []
-        for tr in traces:
-            counts[tr.get("result", "unknown")] = (
-                counts.get(tr.get("result", "unknown"), 0) + 1
-            )
-            latency.append(tr.get("latency_ms", 0))
-        summary = {
+        """Return statistics about recent traces.
+
+        Everything comes from the store's indexes, the rolling aggregates
+        and the latency sketches, so no stored record is decoded.
+        """
+        store = hass.data[DATA_TRACES]
+        counts: Dict[str, int] = store.index.counts("result")
+        unlabelled = len(store) - sum(counts.values())
+        if unlabelled:
+            counts["unknown"] = counts.get("unknown", 0) + unlabelled
+        summary: Dict[str, Any] = {
             "counts": counts,
-            "mean_latency_ms": (sum(latency) / len(latency)) if latency else 0,
+            "mean_latency_ms": store.index.latency_sum / len(store) if store else 0,
         }
-        connection.send_result(msg["id"], summary)
+        aggregates = hass.data.get(DOMAIN, {}).get("aggregates")
+        if aggregates is not None:
+            summary["window"] = {
+                "window_s": aggregates.window_s,
+                "count": aggregates.count,
+                "fail_rate": aggregates.fail_rate,
+                "mean_latency_ms": aggregates.mean_latency_ms,
+            }
+        quantiles = hass.data.get(DOMAIN, {}).get("quantiles")
+        if quantiles is not None:
+            summary["latency_quantiles"] = quantiles.summary()
+        send_result(connection, msg["id"], summary)
 
     websocket_api.async_register_command(hass, preview_recent)
+    websocket_api.async_register_command(hass, subscribe)
+    websocket_api.async_register_command(hass, query)
     websocket_api.async_register_command(hass, trace_by_id)
     websocket_api.async_register_command(hass, stats)
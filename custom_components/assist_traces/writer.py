@@ -4,14 +4,44 @@ from __future__ import annotations
 
 import asyncio
 import gzip
-import json
 import os
-from dataclasses import dataclass
-from datetime import datetime
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import IO, Any, Dict, List, Optional, Tuple
 
-from .const import DEFAULT_MAX_FILE_MB, DEFAULT_PARTITIONING, PARTITION_HOURLY
+from .const import (
+    DEFAULT_BATCH_MS,
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_BLOCK_KB,
+    DEFAULT_BLOCK_ROWS,
+    DEFAULT_IDLE_CLOSE_S,
+    DEFAULT_MAX_FILE_MB,
+    DEFAULT_MAX_OPEN_FILES,
+    DEFAULT_OVERFLOW,
+    DEFAULT_PARTITIONING,
+    DEFAULT_QUEUE_SIZE,
+    DEFAULT_WAL_FSYNC_MS,
+    OVERFLOW_DROP_NEWEST,
+    OVERFLOW_DROP_OLDEST,
+    OVERFLOW_SPILL,
+    PARTITION_HOURLY,
+    SPILL_DIR,
+    WAL_DIR,
+)
+from .cold import ColdIndex
+from .segments import (
+    MANIFEST_NAME,
+    BlockInfo,
+    PartitionManifest,
+    SegmentInfo,
+    append_block_index,
+    read_block_index,
+)
+from .serialize import dumps_line, loads
+from .wal import WriteAheadLog
 
 
 @dataclass
@@ -20,60 +50,319 @@ class WriterConfig:
 
     directory: str
     partitioning: str = DEFAULT_PARTITIONING
-    max_file_mb: int = DEFAULT_MAX_FILE_MB
+    max_file_mb: float = DEFAULT_MAX_FILE_MB
+    queue_size: int = DEFAULT_QUEUE_SIZE
+    batch_size: int = DEFAULT_BATCH_SIZE
+    batch_ms: int = DEFAULT_BATCH_MS
+    overflow: str = DEFAULT_OVERFLOW
+    max_open_files: int = DEFAULT_MAX_OPEN_FILES
+    idle_close_s: float = DEFAULT_IDLE_CLOSE_S
+    block_rows: int = DEFAULT_BLOCK_ROWS
+    block_kb: int = DEFAULT_BLOCK_KB
+    wal: bool = False
+    wal_fsync_ms: int = DEFAULT_WAL_FSYNC_MS
+
+
+@dataclass
+class WriterStats:
+    """Counters describing writer throughput and overflow handling."""
+
+    written: int = 0
+    batches: int = 0
+    dropped_oldest: int = 0
+    dropped_newest: int = 0
+    spilled: int = 0
+    replayed: int = 0
+    opened: int = 0
+    evicted: int = 0
+    idle_closed: int = 0
+    sealed: int = 0
+    blocks: int = 0
+    write_ms: float = 0.0
+
+
+@dataclass
+class PartitionHandle:
+    """An open gzip writer for the active segment of a partition."""
+
+    directory: Path
+    manifest: PartitionManifest
+    segment: SegmentInfo
+    raw: IO[bytes]
+    window_end: datetime
+    last_used: float
+    file: Optional[gzip.GzipFile] = None
+    block: Optional[BlockInfo] = None
+    wal_start: Optional[int] = None
+    rows: List[Tuple[str, str, Optional[str], Optional[str]]] = field(
+        default_factory=list
+    )
+
+
+async def collect_batch(
+    queue: asyncio.Queue, first: Any, batch_size: int, batch_ms: int
+) -> List[Any]:
+    """Return a batch starting with an item already taken from a queue.
+
+    Unless a full batch is waiting, wait ``batch_ms`` so a burst shares one
+    executor hop, then take what is queued up to ``batch_size`` items. A
+    None item, the stop sentinel, ends the batch.
+    """
+    batch = [first]
+    if first is not None and batch_ms > 0 and queue.qsize() < batch_size - 1:
+        await asyncio.sleep(batch_ms / 1000)
+    while batch[-1] is not None and len(batch) < batch_size:
+        try:
+            batch.append(queue.get_nowait())
+        except asyncio.QueueEmpty:
+            break
+    return batch
 
 
 class TraceWriter:
     """Background writer writing traces to gzipped JSONL files."""
 
-    def __init__(self, config: WriterConfig) -> None:
-        """Initialize the writer with configuration."""
+    def __init__(
+        self, config: WriterConfig, cold_index: Optional[ColdIndex] = None
+    ) -> None:
+        """Initialize the writer with configuration and an optional cold index."""
         self.config = config
-        self.queue: asyncio.Queue[Dict[str, Any]] = asyncio.Queue()
+        self.cold_index = cold_index
+        self.queue: asyncio.Queue[Dict[str, Any]] = asyncio.Queue(
+            maxsize=max(config.queue_size, 0)
+        )
+        self.stats = WriterStats()
         self._task: Optional[asyncio.Task] = None
-        self._current_path: Optional[Path] = None
-        self._current_file: Optional[gzip.GzipFile] = None
-        self._current_size = 0
+        self._handles: OrderedDict[Path, PartitionHandle] = OrderedDict()
+        self._known_dirs: set[str] = set()
+        self._unsealed: Dict[Path, datetime] = {}
+        self._spill_dir = Path(config.directory) / SPILL_DIR
+        self._spill_path: Optional[Path] = None
+        self._spill_file: Optional[IO[bytes]] = None
+        self._wal: Optional[WriteAheadLog] = None
+        if config.wal:
+            self._wal = WriteAheadLog(Path(config.directory) / WAL_DIR)
+        self._wal_read_pos = 0
+        self._wal_marks: Dict[Path, int] = {}
+        # Held around every executor job touching partition handles, the
+        # spill file or the log, so no two of them run at once.
+        self._io_lock = asyncio.Lock()
+        self._stopping = asyncio.Event()
 
     async def start(self) -> None:
         """Start the background writer task."""
         if self._task is None:
-            self._task = asyncio.create_task(self._worker())
+            await asyncio.get_running_loop().run_in_executor(None, self._recover)
+            self._stopping.clear()
+            worker = self._wal_worker if self._wal is not None else self._worker
+            self._task = asyncio.create_task(worker())
 
     async def stop(self) -> None:
         """Stop the background writer and close files."""
+        if self._wal is not None:
+            self._stopping.set()
+            if self._task:
+                await self._task
+                self._task = None
+            async with self._io_lock:
+                await asyncio.get_running_loop().run_in_executor(
+                    None, self._wal_shutdown
+                )
+            return
         if self._task:
             await self.queue.put(None)  # type: ignore[arg-type]
             await self._task
             self._task = None
-        if self._current_file:
-            self._current_file.close()
+        async with self._io_lock:
+            loop = asyncio.get_running_loop()
+            if self._spill_file is not None:
+                await loop.run_in_executor(
+                    None, self._replay_spill, self._detach_spill()
+                )
+            await loop.run_in_executor(None, self._close_handles, False)
 
     async def enqueue(self, trace: Dict[str, Any]) -> None:
-        """Enqueue a trace for writing."""
-        await self.queue.put(trace)
+        """Enqueue a trace for writing, applying the overflow policy when full."""
+        if self._wal is not None:
+            self._wal.append(trace)
+            return
+        if not self.queue.full():
+            self.queue.put_nowait(trace)
+            return
+        policy = self.config.overflow
+        if policy == OVERFLOW_DROP_NEWEST:
+            self.stats.dropped_newest += 1
+        elif policy == OVERFLOW_DROP_OLDEST:
+            self.queue.get_nowait()
+            self.queue.task_done()
+            self.stats.dropped_oldest += 1
+            self.queue.put_nowait(trace)
+        elif policy == OVERFLOW_SPILL:
+            async with self._io_lock:
+                await asyncio.get_running_loop().run_in_executor(
+                    None, self._spill, trace
+                )
+        else:
+            await self.queue.put(trace)
 
     async def flush(self) -> None:
-        """Flush and rotate the current file if open."""
-        if self._current_file:
-            self._current_file.close()
-            self._current_file = None
-            self._current_size = 0
-            self._current_path = None
+        """Write out queued traces and seal every active segment."""
+        if self._wal is not None:
+            async with self._io_lock:
+                await asyncio.get_running_loop().run_in_executor(None, self._wal_flush)
+            return
+        if self._task:
+            await self.queue.join()
+        async with self._io_lock:
+            await asyncio.get_running_loop().run_in_executor(None, self._seal_all)
+
+    def diagnostics(self) -> Dict[str, Any]:
+        """Return queue depth and counters for diagnostics."""
+        info = {
+            "queue_size": self.queue.qsize(),
+            "queue_capacity": self.queue.maxsize,
+            "overflow": self.config.overflow,
+            "open_files": len(self._handles),
+            **asdict(self.stats),
+        }
+        if self._wal is not None:
+            info["wal"] = {
+                "pending": self._wal.pending,
+                "committed": self._wal.committed,
+                "checkpoint": self._wal.checkpoint,
+                "commits": self._wal.commits,
+            }
+        return info
 
     async def _worker(self) -> None:
-        """Consume items from the queue and write them to disk."""
+        """Consume batches from the queue and write them to disk."""
+        loop = asyncio.get_running_loop()
+        getter: Optional[asyncio.Future] = None
+        idle_s = self.config.idle_close_s
+        # Idle checks run on this schedule whether or not traces keep
+        # arriving, so steady traffic to one partition still closes the rest.
+        next_idle = time.monotonic() + idle_s
         while True:
-            item = await self.queue.get()
-            if item is None:
+            if getter is None:
+                getter = asyncio.ensure_future(self.queue.get())
+            timeout = max(next_idle - time.monotonic(), 0) if idle_s else None
+            done, _ = await asyncio.wait({getter}, timeout=timeout)
+            if not done:
+                async with self._io_lock:
+                    await loop.run_in_executor(None, self._close_idle)
+                next_idle = time.monotonic() + idle_s
+                continue
+            batch = await collect_batch(
+                self.queue,
+                getter.result(),
+                self.config.batch_size,
+                self.config.batch_ms,
+            )
+            getter = None
+            traces = [item for item in batch if item is not None]
+            async with self._io_lock:
+                if traces:
+                    await loop.run_in_executor(None, self._write_batch, traces)
+                if self._spill_file is not None and self.queue.empty():
+                    await loop.run_in_executor(
+                        None, self._replay_spill, self._detach_spill()
+                    )
+                if idle_s and time.monotonic() >= next_idle:
+                    await loop.run_in_executor(None, self._close_idle)
+                    next_idle = time.monotonic() + idle_s
+            for _ in batch:
+                self.queue.task_done()
+            if batch[-1] is None:
                 break
-            await asyncio.get_running_loop().run_in_executor(
-                None, self._write_line, item
+
+    async def _wal_worker(self) -> None:
+        """Periodically group-commit the log and materialize it to partitions."""
+        loop = asyncio.get_running_loop()
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(
+                    self._stopping.wait(), self.config.wal_fsync_ms / 1000
+                )
+            except asyncio.TimeoutError:
+                pass
+            async with self._io_lock:
+                await loop.run_in_executor(None, self._wal_cycle)
+
+    def _recover(self) -> None:
+        """Seal stale segments and replay spilled or logged traces."""
+        self._recover_unsealed()
+        self._replay_spill(None)
+        if self._wal is not None:
+            self._wal.open()
+            self._wal_read_pos = self._wal.checkpoint
+            self._wal_cycle()
+
+    def _wal_flush(self) -> None:
+        """Materialize the whole log and seal every active segment."""
+        self._wal_cycle()
+        self._seal_all()
+        self._wal_checkpoint()
+
+    def _wal_shutdown(self) -> None:
+        """Materialize the log, close every partition and the log itself."""
+        assert self._wal is not None
+        self._wal_cycle()
+        self._close_handles(seal=False)
+        self._wal_checkpoint()
+        self._wal.close()
+
+    def _spill(self, trace: Dict[str, Any]) -> None:
+        """Append an overflowing trace to the spill file for later replay."""
+        if self._spill_file is None:
+            self._spill_dir.mkdir(parents=True, exist_ok=True)
+            self._spill_path = self._spill_dir / f"spill-{time.time_ns()}.jsonl"
+            self._spill_file = open(self._spill_path, "ab")
+        self._spill_file.write(dumps_line(trace))
+        self.stats.spilled += 1
+
+    def _detach_spill(self) -> Optional[Path]:
+        """Close the active spill file and return its path for replay."""
+        path = self._spill_path
+        if self._spill_file is not None:
+            self._spill_file.close()
+        self._spill_file = None
+        self._spill_path = None
+        return path
+
+    def _replay_spill(self, path: Optional[Path]) -> None:
+        """Write spilled traces to their partitions and remove the spill files.
+
+        With no path, every inactive spill file (e.g. left behind by a previous
+        run) is replayed.
+        """
+        if path is not None:
+            paths = [path]
+        elif self._spill_dir.is_dir():
+            paths = sorted(
+                p
+                for p in self._spill_dir.glob("spill-*.jsonl")
+                if p != self._spill_path
             )
-            self.queue.task_done()
+        else:
+            paths = []
+        for spill_path in paths:
+            with open(spill_path, "rb") as f:
+                batch: List[Dict[str, Any]] = []
+                for line in f:
+                    if not line.strip():
+                        continue
+                    batch.append(loads(line))
+                    if len(batch) >= self.config.batch_size:
+                        self._write_batch(batch)
+                        self.stats.replayed += len(batch)
+                        batch = []
+                if batch:
+                    self._write_batch(batch)
+                    self.stats.replayed += len(batch)
+            spill_path.unlink()
 
-    def _partition_path(self, trace: Dict[str, Any]) -> Path:
-        """Return the partitioned path for a trace."""
+    def _partition(self, trace: Dict[str, Any]) -> Tuple[Path, datetime]:
+        """Return the partition directory for a trace and its parsed timestamp."""
         ts: datetime = datetime.fromisoformat(trace["ts"]).replace(tzinfo=None)
         parts = [
             self.config.directory,
@@ -85,28 +374,278 @@ class TraceWriter:
             parts.append(f"{ts.hour:02d}")
         model = trace.get("model", "unknown")
         parts.append(f"model={model}")
-        directory = Path(os.path.join(*parts))
-        directory.mkdir(parents=True, exist_ok=True)
-        return directory / "part.jsonl.gz"
-
-    def _open_file(self, path: Path) -> None:
-        """Open a gzip file for appending."""
-        self._current_file = gzip.open(path, "ab")
-        self._current_path = path
-        self._current_size = path.stat().st_size if path.exists() else 0
-
-    def _write_line(self, trace: Dict[str, Any]) -> None:
-        """Write a single trace line to the current partition."""
-        path = self._partition_path(trace)
-        if self._current_path != path or self._current_file is None:
-            if self._current_file:
-                self._current_file.close()
-            self._open_file(path)
-        line = json.dumps(trace, ensure_ascii=False).encode("utf-8") + b"\n"
-        self._current_file.write(line)
-        self._current_size += len(line)
-        if self._current_size > self.config.max_file_mb * 1024 * 1024:
-            self._current_file.close()
-            self._current_file = None
-            self._current_path = None
-            self._current_size = 0
+        directory = os.path.join(*parts)
+        if directory not in self._known_dirs:
+            os.makedirs(directory, exist_ok=True)
+            self._known_dirs.add(directory)
+        return Path(directory), ts
+
+    def _window_end(self, ts: datetime) -> datetime:
+        """Return the end of the time window of the partition containing ts."""
+        if self.config.partitioning == PARTITION_HOURLY:
+            return ts.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        return ts.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+
+    def _handle(self, directory: Path, ts: datetime) -> PartitionHandle:
+        """Return the open handle for a partition, opening it if needed."""
+        handle = self._handles.get(directory)
+        if handle is not None:
+            self._handles.move_to_end(directory)
+            return handle
+        while self._handles and len(self._handles) >= self.config.max_open_files:
+            self._close_handle(next(iter(self._handles)), seal=False)
+            self.stats.evicted += 1
+        manifest = PartitionManifest.load(directory)
+        segment = manifest.active
+        if segment is None:
+            segment = manifest.new_segment()
+            manifest.save()
+        elif self._wal is not None:
+            self._repair_segment(directory, segment)
+        raw = open(directory / segment.name, "ab")
+        handle = PartitionHandle(
+            directory=directory,
+            manifest=manifest,
+            segment=segment,
+            raw=raw,
+            window_end=self._window_end(ts),
+            last_used=time.monotonic(),
+        )
+        self._handles[directory] = handle
+        self._unsealed.pop(directory, None)
+        self.stats.opened += 1
+        return handle
+
+    def _close_handle(self, directory: Path, seal: bool) -> None:
+        """Close a partition's active segment, sealing it if requested."""
+        handle = self._handles.pop(directory)
+        self._end_block(handle)
+        handle.raw.close()
+        handle.segment.bytes = (directory / handle.segment.name).stat().st_size
+        if seal:
+            handle.manifest.seal_active()
+            self.stats.sealed += 1
+        else:
+            self._unsealed[directory] = handle.window_end
+        handle.manifest.save()
+
+    def _close_handles(self, seal: bool) -> None:
+        """Close every open partition file."""
+        while self._handles:
+            self._close_handle(next(iter(self._handles)), seal)
+
+    def _close_idle(self) -> None:
+        """Close idle partition files and seal partitions whose window ended."""
+        cutoff = time.monotonic() - self.config.idle_close_s
+        now = datetime.utcnow()
+        for directory, handle in list(self._handles.items()):
+            if handle.last_used <= cutoff:
+                self._close_handle(directory, seal=handle.window_end <= now)
+                self.stats.idle_closed += 1
+        self._seal_unsealed(now)
+
+    def _seal_unsealed(self, before: Optional[datetime]) -> None:
+        """Seal closed active segments whose window ended (all if before is None)."""
+        for directory, window_end in list(self._unsealed.items()):
+            if before is not None and window_end > before:
+                continue
+            del self._unsealed[directory]
+            manifest = PartitionManifest.load(directory)
+            if self._wal is not None and manifest.active is not None:
+                self._repair_segment(directory, manifest.active)
+            if manifest.seal_active():
+                manifest.save()
+                self.stats.sealed += 1
+
+    def _seal_all(self) -> None:
+        """Seal every active segment, open or closed."""
+        self._close_handles(seal=True)
+        self._seal_unsealed(None)
+
+    def _recover_unsealed(self) -> None:
+        """Register active segments left on disk by a previous run."""
+        now = datetime.utcnow()
+        for root, _, files in os.walk(self.config.directory):
+            if MANIFEST_NAME not in files:
+                continue
+            directory = Path(root)
+            segment = PartitionManifest.load(directory).active
+            if segment is None:
+                continue
+            ts = datetime.fromisoformat(segment.max_ts) if segment.max_ts else None
+            self._unsealed[directory] = self._window_end(ts) if ts else now
+        self._seal_unsealed(now)
+
+    def _write_batch(
+        self,
+        traces: List[Dict[str, Any]],
+        positions: Optional[List[Tuple[int, int]]] = None,
+    ) -> None:
+        """Write a batch of traces with one buffered write per partition block.
+
+        In WAL mode ``positions`` holds the log span of each trace; rows a
+        partition already materialized before a crash are skipped.
+        """
+        start = time.perf_counter()
+        groups: Dict[Path, Tuple[datetime, List[bytes], List[Tuple[Any, ...]]]] = {}
+        written = 0
+        for i, trace in enumerate(traces):
+            directory, ts = self._partition(trace)
+            wal_start, wal_end = positions[i] if positions else (None, None)
+            if wal_end is not None and wal_end <= self._wal_mark(directory):
+                continue
+            group = groups.get(directory)
+            if group is None:
+                group = groups[directory] = (ts, [], [])
+            group[1].append(dumps_line(trace))
+            group[2].append(
+                (
+                    str(trace.get("trace_id", "")),
+                    ts.isoformat(),
+                    trace.get("model", "unknown"),
+                    trace.get("result"),
+                    wal_start,
+                    wal_end,
+                )
+            )
+            written += 1
+        for directory, (ts, lines, rows) in groups.items():
+            self._write_lines(directory, ts, lines, rows)
+        self.stats.written += written
+        self.stats.batches += 1
+        self.stats.write_ms += (time.perf_counter() - start) * 1000
+
+    def _write_lines(
+        self,
+        directory: Path,
+        ts: datetime,
+        lines: List[bytes],
+        rows: List[Tuple[Any, ...]],
+    ) -> None:
+        """Write encoded lines to a partition, splitting blocks and segments."""
+        max_bytes = self.config.max_file_mb * 1024 * 1024
+        handle = self._handle(directory, ts)
+        start = 0
+        while start < len(lines):
+            if handle.file is None:
+                handle.block = BlockInfo(offset=handle.raw.tell())
+                handle.file = gzip.GzipFile(fileobj=handle.raw, mode="ab")
+            block = handle.block
+            end = min(len(lines), start + self.config.block_rows - block.rows)
+            handle.file.write(b"".join(lines[start:end]))
+            for line, (trace_id, row_ts, model, result, wal_start, wal_end) in zip(
+                lines[start:end], rows[start:end]
+            ):
+                block.record(trace_id, row_ts, len(line))
+                handle.segment.record(row_ts, model)
+                if self.cold_index is not None:
+                    handle.rows.append((trace_id, row_ts, model, result))
+                if wal_end is not None:
+                    if handle.wal_start is None:
+                        handle.wal_start = wal_start
+                    block.wal_pos = wal_end
+            start = end
+            segment_full = handle.raw.tell() >= max_bytes
+            if (
+                segment_full
+                or block.rows >= self.config.block_rows
+                or block.size >= self.config.block_kb * 1024
+            ):
+                self._end_block(handle)
+            if segment_full or handle.raw.tell() >= max_bytes:
+                self._close_handle(directory, seal=True)
+                if start < len(lines):
+                    handle = self._handle(directory, ts)
+        handle.last_used = time.monotonic()
+
+    def _end_block(self, handle: PartitionHandle) -> None:
+        """Finish the open gzip member of a segment and index it."""
+        if handle.file is None or handle.block is None:
+            return
+        handle.file.close()
+        handle.block.length = handle.raw.tell() - handle.block.offset
+        handle.raw.flush()
+        if self._wal is not None:
+            os.fsync(handle.raw.fileno())
+        append_block_index(
+            handle.directory,
+            handle.segment.name,
+            handle.block,
+            fsync=self._wal is not None,
+        )
+        if handle.block.wal_pos is not None:
+            self._wal_marks[handle.directory] = handle.block.wal_pos
+        if self.cold_index is not None and handle.rows:
+            self.cold_index.add_block(
+                handle.directory.relative_to(self.config.directory).as_posix(),
+                handle.segment.name,
+                handle.block,
+                handle.rows,
+            )
+        handle.rows = []
+        handle.file = None
+        handle.block = None
+        handle.wal_start = None
+        self.stats.blocks += 1
+
+    def _wal_mark(self, directory: Path) -> int:
+        """Return the last log position materialized into a partition."""
+        mark = self._wal_marks.get(directory)
+        if mark is None:
+            mark = -1
+            segments = PartitionManifest.load(directory).segments
+            for segment in reversed(segments):
+                positions = [
+                    block.wal_pos
+                    for block in read_block_index(directory, segment.name)
+                    if block.wal_pos is not None
+                ]
+                if positions:
+                    mark = positions[-1]
+                    break
+            self._wal_marks[directory] = mark
+        return mark
+
+    def _repair_segment(self, directory: Path, segment: SegmentInfo) -> None:
+        """Cut a torn trailing gzip member left by a crash off a segment."""
+        path = directory / segment.name
+        if not path.exists():
+            return
+        blocks = list(read_block_index(directory, segment.name))
+        end = blocks[-1].offset + blocks[-1].length if blocks else 0
+        if path.stat().st_size > end:
+            with open(path, "r+b") as f:
+                f.truncate(end)
+            segment.rows = sum(block.rows for block in blocks)
+            segment.min_ts = min((b.min_ts for b in blocks if b.min_ts), default=None)
+            segment.max_ts = max((b.max_ts for b in blocks if b.max_ts), default=None)
+
+    def _wal_cycle(self) -> None:
+        """Group-commit the log, materialize new records and checkpoint."""
+        assert self._wal is not None
+        self._wal.commit()
+        batch: List[Dict[str, Any]] = []
+        positions: List[Tuple[int, int]] = []
+        start = self._wal_read_pos
+        for end, trace in self._wal.read(start):
+            batch.append(trace)
+            positions.append((start, end))
+            start = end
+            if len(batch) >= self.config.batch_size:
+                self._write_batch(batch, positions)
+                batch, positions = [], []
+        if batch:
+            self._write_batch(batch, positions)
+        self._wal_read_pos = start
+        self._close_idle()
+        self._wal_checkpoint()
+
+    def _wal_checkpoint(self) -> None:
+        """Advance the checkpoint to the oldest record not yet in a closed block."""
+        assert self._wal is not None
+        open_starts = [
+            handle.wal_start
+            for handle in self._handles.values()
+            if handle.wal_start is not None
+        ]
+        self._wal.set_checkpoint(min(open_starts, default=self._wal_read_pos))